@@ -0,0 +1,263 @@
+# admission.py
+import os
+import time
+import uuid
+
+from state import connect
+
+# Ограничения на всю машину: все процессы main.py, воркеры и soft.py делят одну базу состояния
+DEFAULT_MAX_BROWSERS = 4
+DEFAULT_LAUNCHES_PER_MINUTE = 6
+# Через сколько секунд слот браузера считается брошенным (процесс умер, не освободив его)
+DEFAULT_SLOT_TTL = 1800
+# Ожидающий, не появлявшийся в очереди дольше этого, считается умершим
+QUEUE_STALE_SECONDS = 30
+POLL_INTERVAL = 0.5
+# Как часто во время ожидания вызывать keepalive (продление аренды профиля)
+KEEPALIVE_INTERVAL = 60
+# Слот, переданный открытым браузером профиля его публикации (см. hand_off), хранится
+# под этим владельцем и истекает, если публикация так его и не забрала
+HANDOFF_PREFIX = "handoff:"
+HANDOFF_TTL = 300
+
+
+class AdmissionTimeout(Exception):
+    """
+    Не дождались свободного слота браузера
+    """
+
+
+def _ensure_admission_tables(conn):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS browser_slots ("
+        "holder TEXT PRIMARY KEY, profile_id TEXT, pid INTEGER, acquired_at REAL, expires_at REAL)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS browser_queue ("
+        "holder TEXT PRIMARY KEY, profile_id TEXT, pid INTEGER, deadline REAL, enqueued_at REAL, seen_at REAL)"
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS browser_launches (ts REAL)")
+
+
+def get_limits():
+    return (
+        int(os.getenv("ADMISSION_MAX_BROWSERS", DEFAULT_MAX_BROWSERS)),
+        int(os.getenv("ADMISSION_LAUNCHES_PER_MINUTE", DEFAULT_LAUNCHES_PER_MINUTE)),
+    )
+
+
+class BrowserAdmission:
+    """
+    Слот на один запущенный браузер. Очередь общая для всей машины и упорядочена
+    по дедлайну слота публикации: пускается только голова очереди, когда есть
+    свободный браузер и не превышен лимит запусков в минуту.
+
+        with BrowserAdmission(profile_id, deadline):
+            ... запуск браузера и публикация ...
+
+    keepalive — функция, которая периодически вызывается, пока публикация ждёт в очереди
+    (например, lease.renew: аренда профиля не должна истечь за время ожидания)
+    """
+    def __init__(self, profile_id, deadline=None, timeout=None, log=print, keepalive=None):
+        self.profile_id = profile_id
+        self.deadline = deadline or time.time()
+        self.timeout = timeout
+        self.log = log
+        self.keepalive = keepalive
+        self.holder = uuid.uuid4().hex
+        self.acquired = False
+        self.max_browsers, self.launches_per_minute = get_limits()
+        self.slot_ttl = float(os.getenv("ADMISSION_SLOT_TTL", DEFAULT_SLOT_TTL))
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    def _try_admit(self, conn, now):
+        conn.execute("DELETE FROM browser_slots WHERE expires_at < ?", (now,))
+        conn.execute("DELETE FROM browser_queue WHERE seen_at < ?", (now - QUEUE_STALE_SECONDS,))
+        conn.execute("DELETE FROM browser_launches WHERE ts < ?", (now - 60,))
+        conn.execute("UPDATE browser_queue SET seen_at = ? WHERE holder = ?", (now, self.holder))
+        head = conn.execute(
+            "SELECT holder FROM browser_queue ORDER BY deadline, enqueued_at LIMIT 1"
+        ).fetchone()
+        if head is None or head["holder"] != self.holder:
+            return False
+        running = conn.execute("SELECT COUNT(*) FROM browser_slots").fetchone()[0]
+        launches = conn.execute("SELECT COUNT(*) FROM browser_launches").fetchone()[0]
+        if running >= self.max_browsers or launches >= self.launches_per_minute:
+            return False
+        conn.execute("DELETE FROM browser_queue WHERE holder = ?", (self.holder,))
+        conn.execute(
+            "INSERT INTO browser_slots (holder, profile_id, pid, acquired_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (self.holder, self.profile_id, os.getpid(), now, now + self.slot_ttl)
+        )
+        conn.execute("INSERT INTO browser_launches (ts) VALUES (?)", (now,))
+        return True
+
+    def _adopt(self, conn):
+        """
+        Забирает слот, переданный браузером этого профиля (прогрев), без очереди и без нового запуска
+        """
+        now = time.time()
+        cursor = conn.execute(
+            "UPDATE browser_slots SET holder = ?, pid = ?, acquired_at = ?, expires_at = ? "
+            "WHERE holder = ? AND expires_at >= ?",
+            (self.holder, os.getpid(), now, now + self.slot_ttl, HANDOFF_PREFIX + str(self.profile_id), now)
+        )
+        return cursor.rowcount > 0
+
+    def acquire(self):
+        conn = connect()
+        try:
+            _ensure_admission_tables(conn)
+            if self._adopt(conn):
+                self.acquired = True
+                self.log(f"Профиль {self.profile_id} получил слот уже открытого браузера")
+                return
+            now = time.time()
+            conn.execute(
+                "INSERT INTO browser_queue (holder, profile_id, pid, deadline, enqueued_at, seen_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.holder, self.profile_id, os.getpid(), self.deadline, now, now)
+            )
+            waited_from = time.monotonic()
+            kept_alive_at = waited_from
+            reported = False
+            while True:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    admitted = self._try_admit(conn, time.time())
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                if admitted:
+                    self.acquired = True
+                    if reported:
+                        self.log(f"Слот браузера для профиля {self.profile_id} получен "
+                                 f"через {time.monotonic() - waited_from:.0f} сек.")
+                    return
+                if not reported:
+                    self.log(f"Все слоты браузеров заняты ({self.max_browsers} браузеров, "
+                             f"{self.launches_per_minute} запусков в минуту), профиль {self.profile_id} ждёт в очереди")
+                    reported = True
+                if self.timeout is not None and time.monotonic() - waited_from > self.timeout:
+                    conn.execute("DELETE FROM browser_queue WHERE holder = ?", (self.holder,))
+                    raise AdmissionTimeout(f"Нет свободного слота браузера за {self.timeout:.0f} сек.")
+                if self.keepalive is not None and time.monotonic() - kept_alive_at > KEEPALIVE_INTERVAL:
+                    self.keepalive()
+                    kept_alive_at = time.monotonic()
+                time.sleep(POLL_INTERVAL)
+        except BaseException:
+            if not self.acquired:
+                conn.execute("DELETE FROM browser_queue WHERE holder = ?", (self.holder,))
+            raise
+        finally:
+            conn.close()
+
+    def renew(self):
+        """
+        Продлевает слот ещё на slot_ttl секунд (браузер остаётся открытым между постами)
+        """
+        if not self.acquired:
+            return
+        conn = connect()
+        try:
+            _ensure_admission_tables(conn)
+            conn.execute("UPDATE browser_slots SET expires_at = ? WHERE holder = ?",
+                         (time.time() + self.slot_ttl, self.holder))
+        finally:
+            conn.close()
+
+    def hand_off(self):
+        """
+        Оставляет слот за открытым браузером, пока его не заберёт следующая публикация профиля
+        (acquire с тем же profile_id). Браузер остаётся в лимите машины и во время передачи
+        """
+        if not self.acquired:
+            return
+        conn = connect()
+        try:
+            _ensure_admission_tables(conn)
+            conn.execute(
+                "UPDATE browser_slots SET holder = ?, pid = NULL, expires_at = ? WHERE holder = ?",
+                (HANDOFF_PREFIX + str(self.profile_id), time.time() + HANDOFF_TTL, self.holder)
+            )
+        finally:
+            conn.close()
+        self.acquired = False
+
+    def release(self):
+        if not self.acquired:
+            return
+        conn = connect()
+        try:
+            _ensure_admission_tables(conn)
+            conn.execute("DELETE FROM browser_slots WHERE holder = ?", (self.holder,))
+        finally:
+            conn.close()
+        self.acquired = False
+
+
+def release_process_slots(pid):
+    """
+    Освобождает слоты и место в очереди процесса, который был убит (зависание, падение воркера).
+    Возвращает профили, чьи слоты были освобождены: их браузеры могли остаться открытыми
+    """
+    conn = connect()
+    try:
+        _ensure_admission_tables(conn)
+        profiles = [row["profile_id"] for row in
+                    conn.execute("SELECT profile_id FROM browser_slots WHERE pid = ?", (pid,))]
+        conn.execute("DELETE FROM browser_slots WHERE pid = ?", (pid,))
+        conn.execute("DELETE FROM browser_queue WHERE pid = ?", (pid,))
+    finally:
+        conn.close()
+    return profiles
+
+
+def handoff_pending(profile_id):
+    """
+    Ждёт ли переданный слот браузера профиля свою публикацию
+    """
+    conn = connect()
+    try:
+        _ensure_admission_tables(conn)
+        return conn.execute(
+            "SELECT 1 FROM browser_slots WHERE holder = ?", (HANDOFF_PREFIX + str(profile_id),)
+        ).fetchone() is not None
+    finally:
+        conn.close()
+
+
+def reclaim_handoff(profile_id):
+    """
+    Снимает переданный слот, который никто не забрал. True, если слот был снят
+    """
+    conn = connect()
+    try:
+        _ensure_admission_tables(conn)
+        return conn.execute(
+            "DELETE FROM browser_slots WHERE holder = ?", (HANDOFF_PREFIX + str(profile_id),)
+        ).rowcount > 0
+    finally:
+        conn.close()
+
+
+def waiting_count():
+    """
+    Сколько публикаций сейчас ждут слот браузера
+    """
+    conn = connect()
+    try:
+        _ensure_admission_tables(conn)
+        return conn.execute(
+            "SELECT COUNT(*) FROM browser_queue WHERE seen_at >= ?", (time.time() - QUEUE_STALE_SECONDS,)
+        ).fetchone()[0]
+    finally:
+        conn.close()
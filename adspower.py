@@ -0,0 +1,290 @@
+# adspower.py
+import os
+import json
+import time
+import threading
+from dotenv import load_dotenv
+
+from http_client import HttpClient, get_http
+from errors import TransientPostError
+from state import connect
+
+load_dotenv()
+
+# Локальный API AdsPower. Для проверки без AdsPower можно указать адрес своей заглушки
+ADSPOWER_API_URL = os.getenv("ADSPOWER_API_URL", "http://localhost:50325")
+# Локальный API AdsPower отклоняет запросы чаще, чем раз в секунду ("Too many request per second")
+DEFAULT_RATE_LIMIT = 1.0
+DEFAULT_BURST = 1
+# Сколько раз повторить запрос, отклонённый из-за частоты
+RATE_LIMIT_RETRIES = 3
+
+# Профили запуска браузера. standard — обычное окно, как раньше.
+# lean — для серверов без монитора: headless (если AdsPower его поддерживает), маленькое окно,
+# без GPU и композитора, без замедления фоновых вкладок и без служебных вкладок AdsPower
+LAUNCH_PROFILES = ("standard", "lean")
+DEFAULT_LEAN_WINDOW_SIZE = "1280,800"
+LEAN_LAUNCH_ARGS = [
+    "--disable-gpu",
+    "--disable-gpu-compositing",
+    "--disable-features=CalculateNativeWinOcclusion,PaintHolding",
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--disable-backgrounding-occluded-windows",
+    "--mute-audio",
+]
+
+
+def get_launch_profile(env_name=None):
+    """
+    Имя профиля запуска для точки входа: из её переменной env_name,
+    иначе из общей LAUNCH_PROFILE, иначе standard
+    """
+    name = (os.getenv(env_name) if env_name else None) or os.getenv("LAUNCH_PROFILE", "standard")
+    if name not in LAUNCH_PROFILES:
+        raise ValueError(f"Неизвестный профиль запуска: {name}. Допустимо: {', '.join(LAUNCH_PROFILES)}")
+    return name
+
+
+def launch_params(launch_profile):
+    """
+    Дополнительные параметры /browser/start для профиля запуска
+    """
+    if launch_profile != "lean":
+        return {}
+    window_size = os.getenv("LEAN_WINDOW_SIZE", DEFAULT_LEAN_WINDOW_SIZE)
+    params = {
+        "launch_args": json.dumps(LEAN_LAUNCH_ARGS + [f"--window-size={window_size}"]),
+        # Не открывать страницу проверки IP и стартовые вкладки платформ
+        "ip_tab": "0",
+        "open_tabs": "1",
+    }
+    if os.getenv("LEAN_HEADLESS", "1") == "1":
+        params["headless"] = "1"
+    return params
+
+
+class AdsPowerError(TransientPostError):
+    """
+    Ошибка локального API AdsPower: что вызывали, код ответа API или HTTP и текст.
+    rate_limited — запрос отклонён из-за частоты, unavailable — AdsPower не ответил
+    """
+    def __init__(self, endpoint, message, code=None, http_status=None, rate_limited=False, unavailable=False):
+        self.endpoint = endpoint
+        self.message = message
+        self.code = code
+        self.http_status = http_status
+        self.rate_limited = rate_limited
+        self.unavailable = unavailable
+        details = []
+        if code is not None:
+            details.append(f"code={code}")
+        if http_status is not None:
+            details.append(f"HTTP {http_status}")
+        suffix = f" ({', '.join(details)})" if details else ""
+        super().__init__(f"AdsPower {endpoint}: {message}{suffix}")
+
+
+def _ensure_rate_bucket_table(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS rate_buckets (name TEXT PRIMARY KEY, tokens REAL, updated_at REAL)")
+
+
+class TokenBucket:
+    """
+    Ведро токенов в базе состояния: rate запросов в секунду с запасом burst,
+    общее для всех процессов машины с тем же name. acquire ждёт токен
+    """
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+
+    def _take(self, conn, now):
+        """
+        Забирает токен, если он есть. Возвращает 0 или сколько секунд ждать следующего
+        """
+        row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE name = ?", (self.name,)).fetchone()
+        if row is None:
+            tokens = float(self.burst)
+        else:
+            tokens = min(self.burst, row["tokens"] + max(0.0, now - row["updated_at"]) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        conn.execute(
+            "INSERT INTO rate_buckets (name, tokens, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+            (self.name, tokens, now)
+        )
+        return wait
+
+    def acquire(self, timeout=None):
+        """
+        Забирает токен, при необходимости дожидаясь его. False, если не дождались за timeout
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        conn = connect()
+        try:
+            _ensure_rate_bucket_table(conn)
+            while True:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    wait = self._take(conn, time.time())
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                if not wait:
+                    return True
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    wait = min(wait, remaining)
+                time.sleep(wait)
+        finally:
+            conn.close()
+
+
+class AdsPowerClient:
+    """
+    Клиент локального API AdsPower: общий на машину лимит частоты запросов,
+    переиспользование уже открытого браузера профиля, проверка доступности сервиса
+    и ошибки AdsPowerError вместо сырых ответов
+    """
+    def __init__(self, base_url=None, rate_limit=None, burst=None):
+        self.base_url = (base_url or ADSPOWER_API_URL).rstrip("/")
+        rate_limit = rate_limit or float(os.getenv("ADSPOWER_RATE_LIMIT", DEFAULT_RATE_LIMIT))
+        burst = burst or int(os.getenv("ADSPOWER_BURST", DEFAULT_BURST))
+        self.bucket = TokenBucket(f"adspower:{self.base_url}", rate_limit, burst)
+        # start и stop не идемпотентны: повтор после таймаута чтения запустил бы браузер второй раз
+        self.once = HttpClient(retries=0)
+
+    def _call(self, endpoint, params=None, timeout=15, retry=True):
+        """
+        GET к API с учётом лимита частоты. Возвращает поле data ответа или бросает AdsPowerError.
+        retry=False — без повторов HTTP-клиента (запросы, меняющие состояние браузера)
+        """
+        url = f"{self.base_url}{endpoint}"
+        http = get_http() if retry else self.once
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            self.bucket.acquire()
+            try:
+                response = http.get(url, params=params, timeout=timeout)
+            except Exception as e:
+                raise AdsPowerError(endpoint, f"{type(e).__name__}: {e}", unavailable=True) from e
+            if response.status_code != 200:
+                raise AdsPowerError(endpoint, "неожиданный ответ", http_status=response.status_code,
+                                    rate_limited=response.status_code == 429)
+            try:
+                payload = response.json()
+            except ValueError as e:
+                raise AdsPowerError(endpoint, "ответ не JSON", http_status=response.status_code) from e
+            if payload.get("code") == 0:
+                return payload.get("data") or {}
+            message = payload.get("msg") or "неизвестная ошибка"
+            if "too many" not in message.lower():
+                raise AdsPowerError(endpoint, message, code=payload.get("code"))
+            if attempt < RATE_LIMIT_RETRIES:
+                print(f"AdsPower просит реже обращаться к API, повтор {attempt + 1} из {RATE_LIMIT_RETRIES}")
+                time.sleep(1.0 / self.bucket.rate)
+        raise AdsPowerError(endpoint, message, code=payload.get("code"), rate_limited=True)
+
+    def status(self, profile_id, timeout=5):
+        """
+        Состояние браузера профиля: словарь с status ("Active"/"Inactive"),
+        а у открытого браузера ещё ws и webdriver
+        """
+        return self._call("/api/v1/browser/active", {"user_id": profile_id}, timeout)
+
+    def start(self, profile_id, timeout=60, launch_profile="standard"):
+        """
+        Запускает браузер профиля. Возвращает data ответа (ws, webdriver)
+        """
+        params = {"user_id": profile_id}
+        params.update(launch_params(launch_profile))
+        return self._call("/api/v1/browser/start", params, timeout, retry=False)
+
+    def ensure_started(self, profile_id, timeout=60, launch_profile="standard"):
+        """
+        Возвращает (data, reattached): если браузер профиля уже открыт, его данные для
+        подключения без повторного запуска, иначе запускает браузер
+        """
+        try:
+            data = self.status(profile_id)
+        except AdsPowerError as e:
+            if e.unavailable:
+                raise
+            print(f"Не удалось проверить статус браузера: {e}")
+            data = {}
+        if data.get("status") == "Active" and data.get("ws", {}).get("selenium") and data.get("webdriver"):
+            print(f"Браузер профиля {profile_id} уже открыт, подключаемся к нему")
+            return data, True
+        return self.start(profile_id, timeout, launch_profile), False
+
+    def stop(self, profile_id, timeout=15):
+        return self._call("/api/v1/browser/stop", {"user_id": profile_id}, timeout, retry=False)
+
+    def health(self, timeout=3):
+        """
+        Проверка сервиса AdsPower: {"ok": bool, "latency": секунды, "error": текст или None}
+        """
+        started_at = time.monotonic()
+        try:
+            self._call("/status", timeout=timeout)
+        except AdsPowerError as e:
+            return {"ok": False, "latency": time.monotonic() - started_at, "error": str(e)}
+        return {"ok": True, "latency": time.monotonic() - started_at, "error": None}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_adspower():
+    """
+    Возвращает общий на процесс клиент AdsPower (создаётся при первом обращении)
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = AdsPowerClient()
+        return _client
+
+
+def start_browser(profile_id, timeout=60, launch_profile="standard"):
+    """
+    Браузер профиля для подключения: уже открытый или только что запущенный
+    с профилем запуска launch_profile. Возвращает data ответа API (ws, webdriver),
+    при ошибке бросает AdsPowerError
+    """
+    print(f"Запуск браузера профиля {profile_id} через AdsPower ({get_adspower().base_url}), профиль запуска {launch_profile}")
+    data, _ = get_adspower().ensure_started(profile_id, timeout, launch_profile)
+    return data
+
+
+def stop_browser(profile_id, timeout=15):
+    """
+    Закрывает браузер профиля через AdsPower API. Возвращает True при успехе
+    """
+    print(f"Отправляем запрос на закрытие браузера профиля {profile_id}")
+    try:
+        get_adspower().stop(profile_id, timeout)
+    except AdsPowerError as e:
+        print(f"Ошибка при закрытии браузера через API: {e}")
+        return False
+    print(f"Браузер успешно закрыт через AdsPower API")
+    return True
+
+
+def browser_status(profile_id, timeout=5):
+    """
+    Статус браузера профиля в AdsPower: "Active", "Inactive" или None, если API не ответил
+    """
+    try:
+        return get_adspower().status(profile_id, timeout).get("status")
+    except AdsPowerError as e:
+        print(f"Ошибка при проверке статуса браузера: {e}")
+        return None
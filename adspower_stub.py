@@ -0,0 +1,139 @@
+# adspower_stub.py
+import os
+import sys
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Заглушка локального API AdsPower для проверки клиента без AdsPower:
+#     python adspower_stub.py 50399
+#     ADSPOWER_API_URL=http://127.0.0.1:50399 python main.py
+# Отвечает как AdsPower: code/msg/data, "Too many request per second" чаще rate_limit запросов
+# в секунду, ws и webdriver у запущенного браузера (настоящий браузер не запускается)
+DEFAULT_PORT = 50399
+DEFAULT_RATE_LIMIT = 1.0
+
+
+class AdsPowerStub:
+    """
+    Сервер-заглушка. start_delay — задержка ответа /browser/start (проверка таймаутов чтения),
+    starts и stops — сколько раз профиль запускали и закрывали.
+
+        with AdsPowerStub() as stub:
+            client = AdsPowerClient(stub.url)
+    """
+    def __init__(self, port=0, rate_limit=None, start_delay=0, webdriver=None, debugger_address="127.0.0.1:9222"):
+        self.rate_limit = rate_limit if rate_limit is not None else float(os.getenv("STUB_RATE_LIMIT", DEFAULT_RATE_LIMIT))
+        self.start_delay = start_delay
+        self.webdriver = webdriver or os.getenv("STUB_WEBDRIVER", "chromedriver")
+        self.debugger_address = debugger_address
+        self.lock = threading.Lock()
+        self.last_request_at = 0.0
+        self.active = set()
+        self.starts = {}
+        self.stops = {}
+        self.rejected = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True, name="adspower-stub")
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _allowed(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.rate_limit and now - self.last_request_at < 1.0 / self.rate_limit:
+                self.rejected += 1
+                return False
+            self.last_request_at = now
+            return True
+
+    def _browser_data(self, profile_id):
+        return {
+            "ws": {"selenium": self.debugger_address, "puppeteer": f"ws://{self.debugger_address}/devtools/browser/{profile_id}"},
+            "debug_port": self.debugger_address.rsplit(":", 1)[-1],
+            "webdriver": self.webdriver,
+        }
+
+    def handle(self, path, params):
+        """
+        Ответ API на запрос path с параметрами params: (HTTP-статус, тело)
+        """
+        if path == "/status":
+            return 200, {"code": 0, "msg": "success"}
+        if not self._allowed():
+            return 200, {"code": -1, "msg": "Too many request per second, please check"}
+        profile_id = params.get("user_id")
+        if not profile_id and path.startswith("/api/v1/browser/"):
+            return 200, {"code": -1, "msg": "user_id is required"}
+        if path == "/api/v1/browser/active":
+            with self.lock:
+                active = profile_id in self.active
+            if not active:
+                return 200, {"code": 0, "msg": "success", "data": {"status": "Inactive"}}
+            return 200, {"code": 0, "msg": "success", "data": dict(self._browser_data(profile_id), status="Active")}
+        if path == "/api/v1/browser/start":
+            if self.start_delay:
+                time.sleep(self.start_delay)
+            with self.lock:
+                self.active.add(profile_id)
+                self.starts[profile_id] = self.starts.get(profile_id, 0) + 1
+            return 200, {"code": 0, "msg": "success", "data": self._browser_data(profile_id)}
+        if path == "/api/v1/browser/stop":
+            with self.lock:
+                self.active.discard(profile_id)
+                self.stops[profile_id] = self.stops.get(profile_id, 0) + 1
+            return 200, {"code": 0, "msg": "success"}
+        return 404, {"code": -1, "msg": "not found"}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                status, body = stub.handle(url.path, params)
+                payload = json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Клиент не дождался ответа (таймаут чтения)
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    stub = AdsPowerStub(port)
+    print(f"Заглушка AdsPower слушает {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.server.server_close()
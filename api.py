@@ -0,0 +1,72 @@
+# api.py
+import threading
+
+from http_client import get_http
+from catalog import CatalogCache
+
+FLOWVELVET_API_URL = "https://flowvelvet.com/api/v1"
+SFS_MODELS_URL = f"{FLOWVELVET_API_URL}/sfs-models/"
+
+_catalog_cache = None
+_catalog_cache_lock = threading.Lock()
+
+
+def fetch_models_data(onlyfans_tag, etag=None, last_modified=None):
+    """
+    Запрос /sfs-models/ с валидаторами сохранённой копии. Возвращает ответ requests (200 или 304)
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    print(f"Запрос к API моделей: {SFS_MODELS_URL}?onlyfans_tag={onlyfans_tag}")
+    return get_http().get(SFS_MODELS_URL, params={"onlyfans_tag": onlyfans_tag}, headers=headers)
+
+
+def get_catalog_cache():
+    global _catalog_cache
+    with _catalog_cache_lock:
+        if _catalog_cache is None:
+            _catalog_cache = CatalogCache(fetch_models_data)
+        return _catalog_cache
+
+
+def get_models_data(onlyfans_tag):
+    """
+    Получает данные о моделях тега (/sfs-models/) через общий дисковый кэш. Возвращает словарь или None
+    """
+    data = get_catalog_cache().get(onlyfans_tag)
+    if data is not None:
+        print(f"Получено {len(data.get('models', []))} моделей")
+    return data
+
+
+def notify_posted(onlyfans_tag, idempotency_key=None):
+    """
+    Сообщает серверу об опубликованном посте. Возвращает ответ сервера.
+    idempotency_key уходит в заголовке Idempotency-Key (и в теле как delivery_id):
+    по нему сервер может распознать повтор уже засчитанного поста
+    """
+    body = {"onlyfans_tag": onlyfans_tag}
+    headers = {}
+    if idempotency_key:
+        body["delivery_id"] = idempotency_key
+        headers["Idempotency-Key"] = idempotency_key
+    return get_http().post(f"{FLOWVELVET_API_URL}/model/posted", json=body, headers=headers, timeout=10)
+
+
+def send_logout(onlyfans_tag):
+    """
+    Сообщает серверу, что аккаунт тега разлогинен. Возвращает ответ сервера
+    """
+    return get_http().post(f"{FLOWVELVET_API_URL}/models/logout/", json={"onlyfans_tag": onlyfans_tag}, timeout=10)
+
+
+def get_model_list():
+    """
+    Полный список моделей для soft.py (/model_list/)
+    """
+    response = get_http().get(f"{FLOWVELVET_API_URL}/model_list/", timeout=10)
+    response.raise_for_status()
+    return response.json()
@@ -0,0 +1,243 @@
+# browser_pool.py
+import os
+import time
+import atexit
+import threading
+
+from adspower import stop_browser
+from admission import waiting_count
+
+# Браузер профиля остаётся открытым после поста, если следующий пост этого профиля
+# не дальше горизонта (секунд). Иначе, а также после max_posts постов или при
+# разросшейся памяти страницы, браузер закрывается
+DEFAULT_POOL_HORIZON = 600
+DEFAULT_POOL_MAX_OPEN = 2
+DEFAULT_POOL_MAX_POSTS = 20
+DEFAULT_POOL_MAX_HEAP_MB = 512
+# Запас после дедлайна следующего поста, в течение которого браузер ещё ждёт его
+POOL_GRACE_SECONDS = 120
+REAP_INTERVAL = 5
+
+
+def close_browser(driver, profile_id):
+    """
+    Закрывает браузер через AdsPower API, при неудаче — напрямую через драйвер
+    """
+    try:
+        # Закрытие браузера через API AdsPower
+        if profile_id:
+            if not stop_browser(profile_id):
+                print("Пробуем закрыть браузер напрямую...")
+                driver.quit()
+                print("Браузер закрыт через драйвер")
+        else:
+            print("ID профиля не найден, закрываем браузер напрямую")
+            driver.quit()
+            print("Браузер закрыт через драйвер")
+    except Exception as e:
+        print(f"Ошибка при закрытии браузера: {e}")
+        try:
+            driver.quit()
+            print("Браузер закрыт через метод quit()")
+        except Exception:
+            print("Не удалось закрыть браузер")
+
+
+class BrowserSession:
+    """
+    Открытый браузер профиля вместе с арендой профиля и слотом браузера.
+    Пока сессия в пуле, профиль и слот остаются за ней
+    """
+    def __init__(self, profile_id, lease, admission, driver=None):
+        self.profile_id = profile_id
+        self.lease = lease
+        self.admission = admission
+        self.driver = driver
+        self.posts = 0
+        self.opened_at = time.monotonic()
+        self.last_used_at = time.monotonic()
+        # Unix-время, до которого сессия ждёт следующий пост
+        self.keep_until = None
+
+    def close(self, reason):
+        if self.driver is not None:
+            print(f"Закрываем браузер профиля {self.profile_id}: {reason}")
+            close_browser(self.driver, self.profile_id)
+            self.driver = None
+        self.admission.release()
+        self.lease.release()
+
+    def healthy(self):
+        """
+        Браузер отвечает и у него есть окно
+        """
+        try:
+            return self.driver.execute_script("return 1") == 1 and bool(self.driver.window_handles)
+        except Exception as e:
+            print(f"Браузер профиля {self.profile_id} не отвечает: {e}")
+            return False
+
+    def heap_mb(self):
+        try:
+            used = self.driver.execute_script(
+                "return performance.memory ? performance.memory.usedJSHeapSize : null"
+            )
+        except Exception:
+            return None
+        return used / (1024 * 1024) if used else None
+
+
+class BrowserPool:
+    """
+    Пул открытых браузеров по профилям: между близкими постами профиля браузер
+    не закрывается, и следующий пост не тратит время на запуск AdsPower и подключение.
+    Число простаивающих браузеров ограничено (вытесняется давно не использованный),
+    простаивающий браузер закрывается, если его профиль или слот браузера нужен кому-то ещё.
+    """
+    def __init__(self, horizon=None, max_open=None, max_posts=None, max_heap_mb=None):
+        self.horizon = horizon if horizon is not None else float(os.getenv("BROWSER_POOL_HORIZON", DEFAULT_POOL_HORIZON))
+        self.max_open = max_open if max_open is not None else int(os.getenv("BROWSER_POOL_MAX_OPEN", DEFAULT_POOL_MAX_OPEN))
+        self.max_posts = max_posts or int(os.getenv("BROWSER_POOL_MAX_POSTS", DEFAULT_POOL_MAX_POSTS))
+        self.max_heap_mb = max_heap_mb or float(os.getenv("BROWSER_POOL_MAX_HEAP_MB", DEFAULT_POOL_MAX_HEAP_MB))
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.stopped = threading.Event()
+        self.reaper = None
+
+    @property
+    def enabled(self):
+        return self.horizon > 0 and self.max_open > 0
+
+    def checkout(self, profile_id):
+        """
+        Забирает открытый браузер профиля из пула. None, если его нет или он не прошёл проверку
+        """
+        with self.lock:
+            session = self.idle.pop(profile_id, None)
+        if session is None:
+            return None
+        if not session.healthy():
+            session.close("не прошёл проверку перед повторным использованием")
+            return None
+        session.lease.renew()
+        session.admission.renew()
+        print(f"Используем уже открытый браузер профиля {profile_id} (постов в нём: {session.posts})")
+        return session
+
+    def checkin(self, session, next_deadline=None):
+        """
+        Возвращает сессию после поста. Браузер остаётся открытым, только если он есть,
+        следующий пост профиля в пределах горизонта и браузер не пора пересоздать
+        """
+        if session.driver is None:
+            session.close("пост завершился без браузера")
+            return
+        session.posts += 1
+        session.last_used_at = time.monotonic()
+        reason = self._close_reason(session, next_deadline)
+        if reason:
+            session.close(reason)
+            return
+        session.keep_until = next_deadline + POOL_GRACE_SECONDS
+        with self.lock:
+            self.idle[session.profile_id] = session
+            evicted = self._over_capacity()
+        for victim in evicted:
+            victim.close("превышен лимит открытых браузеров пула")
+        self._start_reaper()
+
+    def _close_reason(self, session, next_deadline):
+        if not self.enabled or next_deadline is None:
+            return "следующий пост профиля неизвестен"
+        if next_deadline - time.time() > self.horizon:
+            return f"следующий пост дальше {self.horizon:.0f} сек."
+        if session.posts >= self.max_posts:
+            return f"браузер обслужил {session.posts} постов"
+        heap = session.heap_mb()
+        if heap is not None and heap > self.max_heap_mb:
+            return f"память страницы {heap:.0f} МБ больше {self.max_heap_mb:.0f} МБ"
+        return None
+
+    def _over_capacity(self):
+        evicted = []
+        while len(self.idle) > self.max_open:
+            profile_id = min(self.idle, key=lambda key: self.idle[key].last_used_at)
+            evicted.append(self.idle.pop(profile_id))
+        return evicted
+
+    def evict_idle(self):
+        """
+        Закрывает простаивающие браузеры: просроченные, нужные другим публикациям профиля
+        и давно не использованный, если кто-то ждёт слот браузера
+        """
+        now = time.time()
+        with self.lock:
+            sessions = list(self.idle.values())
+        victims = []
+        for session in sessions:
+            if now > session.keep_until:
+                victims.append((session, "следующий пост так и не пришёл"))
+            elif session.lease.contended():
+                victims.append((session, "профиль нужен другой публикации"))
+        if not victims and sessions and waiting_count():
+            oldest = min(sessions, key=lambda session: session.last_used_at)
+            victims.append((oldest, "слот браузера нужен другой публикации"))
+        for session, reason in victims:
+            with self.lock:
+                if self.idle.get(session.profile_id) is not session:
+                    continue
+                del self.idle[session.profile_id]
+            session.close(reason)
+
+    def profiles(self):
+        """
+        Профили, чьи браузеры сейчас ждут в пуле
+        """
+        with self.lock:
+            return list(self.idle)
+
+    def close_all(self):
+        self.stopped.set()
+        with self.lock:
+            sessions = list(self.idle.values())
+            self.idle.clear()
+        for session in sessions:
+            session.close("завершение работы")
+
+    def _start_reaper(self):
+        with self.lock:
+            if self.reaper is not None:
+                return
+            self.reaper = threading.Thread(target=self._reap, daemon=True, name="browser-pool")
+        self.reaper.start()
+
+    def _reap(self):
+        while not self.stopped.wait(REAP_INTERVAL):
+            try:
+                self.evict_idle()
+            except Exception as e:
+                print(f"Ошибка при проверке пула браузеров: {e}")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """
+    Возвращает общий на процесс пул браузеров (создаётся при первом обращении)
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(_pool.close_all)
+        return _pool
+
+
+def close_browser_pool():
+    """
+    Закрывает все браузеры пула, если он создавался в этом процессе
+    """
+    if _pool is not None:
+        _pool.close_all()
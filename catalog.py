@@ -0,0 +1,199 @@
+# catalog.py
+import os
+import re
+import json
+import time
+import threading
+
+from state import save_tag_state
+
+# Как часто работающий планировщик перечитывает список моделей тега, секунд
+DEFAULT_CATALOG_REFRESH_INTERVAL = 900
+
+# Дисковый кэш ответов /sfs-models/, общий для всех процессов машины:
+#   TTL   — сколько секунд копия считается свежей и отдаётся без запроса
+#   STALE — ещё столько секунд устаревшая копия отдаётся сразу, а проверяется в фоне
+DEFAULT_CATALOG_CACHE_DIR = os.path.join("cache", "catalog")
+DEFAULT_CATALOG_CACHE_TTL = 300
+DEFAULT_CATALOG_CACHE_STALE = 3600
+
+
+class CatalogCache:
+    """
+    Кэш списка моделей по тегам на диске с условной перепроверкой (ETag / If-Modified-Since).
+    Файл тега перезаписывается только удачным ответом, поэтому последняя хорошая копия
+    переживает недоступность API. fetch(tag, etag, last_modified) возвращает ответ requests.
+    """
+    def __init__(self, fetch, directory=None, ttl=None, stale=None):
+        self.fetch = fetch
+        self.directory = directory or os.getenv("CATALOG_CACHE_DIR", DEFAULT_CATALOG_CACHE_DIR)
+        self.ttl = ttl if ttl is not None else float(os.getenv("CATALOG_CACHE_TTL", DEFAULT_CATALOG_CACHE_TTL))
+        self.stale = stale if stale is not None else float(os.getenv("CATALOG_CACHE_STALE", DEFAULT_CATALOG_CACHE_STALE))
+        self.lock = threading.Lock()
+        self.revalidating = set()
+
+    def _path(self, tag):
+        name = re.sub(r"[^\w.-]", "_", tag.lstrip("@")) or "_"
+        return os.path.join(self.directory, f"{name}.json")
+
+    def load(self, tag):
+        try:
+            with open(self._path(tag), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, tag, entry):
+        # Запись через временный файл: другие процессы никогда не увидят файл наполовину
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(tag)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    def revalidate(self, tag, entry=None):
+        """
+        Запрашивает список у API с валидаторами сохранённой копии.
+        Возвращает актуальную запись кэша или None, если API не ответил как надо.
+        """
+        entry = entry or {}
+        response = self.fetch(tag, entry.get("etag"), entry.get("last_modified"))
+        now = time.time()
+        if response.status_code == 304 and entry.get("data"):
+            entry["fetched_at"] = now
+            self.store(tag, entry)
+            return entry
+        if response.status_code != 200:
+            print(f"Ошибка при запросе к API. Код ответа: {response.status_code}")
+            return None
+        data = response.json()
+        if not isinstance(data, dict) or "models" not in data:
+            print("API вернул список моделей без поля models, оставляем прежнюю копию")
+            return None
+        entry = {
+            "data": data,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": now,
+        }
+        self.store(tag, entry)
+        return entry
+
+    def _revalidate_in_background(self, tag, entry):
+        with self.lock:
+            if tag in self.revalidating:
+                return
+            self.revalidating.add(tag)
+
+        def run():
+            try:
+                self.revalidate(tag, entry)
+            except Exception as e:
+                print(f"Фоновое обновление списка моделей {tag} не удалось: {e}")
+            finally:
+                with self.lock:
+                    self.revalidating.discard(tag)
+
+        threading.Thread(target=run, daemon=True, name=f"catalog-{tag}").start()
+
+    def get(self, tag):
+        """
+        Возвращает ответ /sfs-models/ для тега: свежую копию — сразу, устаревшую — сразу
+        с перепроверкой в фоне, иначе запрашивает API; при ошибке — последнюю хорошую копию
+        """
+        entry = self.load(tag)
+        age = time.time() - entry["fetched_at"] if entry else None
+        if entry and age < self.ttl:
+            return entry["data"]
+        if entry and age < self.ttl + self.stale:
+            self._revalidate_in_background(tag, entry)
+            return entry["data"]
+        try:
+            fresh = self.revalidate(tag, entry)
+        except Exception as e:
+            print(f"Ошибка при получении данных о моделях: {e}")
+            fresh = None
+        if fresh:
+            return fresh["data"]
+        if entry:
+            print(f"API недоступен, используем сохранённый список моделей {tag} (возраст {age / 60:.0f} мин.)")
+            return entry["data"]
+        return None
+
+
+class ModelCatalog:
+    """
+    Список моделей одного OnlyFans тега (ответ /sfs-models/), который планировщик
+    периодически обновляет и передаёт в публикации, чтобы createpost не запрашивал его заново
+    """
+    def __init__(self, tag, fetch, refresh_interval=None):
+        self.tag = tag
+        self.fetch = fetch
+        self.refresh_interval = refresh_interval or float(
+            os.getenv("CATALOG_REFRESH_INTERVAL", DEFAULT_CATALOG_REFRESH_INTERVAL)
+        )
+        self.data = None
+        self.fetched_at = None
+
+    @property
+    def models(self):
+        return (self.data or {}).get("models") or []
+
+    @property
+    def model_tags(self):
+        return [model.get("onlyfans_tag") for model in self.models]
+
+    @property
+    def profile_id(self):
+        return (self.data or {}).get("requested_model_ads_id")
+
+    def next_refresh(self):
+        """
+        Момент следующего обновления по монотонным часам
+        """
+        if self.fetched_at is None:
+            return time.monotonic()
+        return self.fetched_at + self.refresh_interval
+
+    def refresh_due(self):
+        return time.monotonic() >= self.next_refresh()
+
+    def refresh(self):
+        """
+        Запрашивает список заново. Возвращает (добавленные, удалённые) теги моделей
+        или None, если запрос не удался — тогда остаётся прежний список.
+        """
+        return self.update(self.fetch(self.tag))
+
+    def update(self, data):
+        """
+        Применяет уже полученный ответ API (см. refresh)
+        """
+        self.fetched_at = time.monotonic()
+        if not data or not data.get("models"):
+            return None
+        before = set(self.model_tags)
+        self.data = data
+        after = set(self.model_tags)
+        return sorted(after - before), sorted(before - after)
+
+
+def refresh_schedule(catalog, schedule, changes, log=print):
+    """
+    Применяет обновление списка моделей (результат catalog.refresh()/update()) к сетке:
+    если число моделей изменилось, сетка пересчитывается без сброса текущего цикла
+    и сразу сохраняется в базе состояния.
+    """
+    if changes is None:
+        log(f"⚠️ {catalog.tag}: не удалось обновить список моделей, работаем по прежнему ({len(catalog.models)})")
+        return False
+    added, removed = changes
+    if added or removed:
+        log(f"🔄 {catalog.tag}: список моделей обновлён: {len(catalog.models)} (+{len(added)} / -{len(removed)})")
+    if not schedule.resize(len(catalog.models)):
+        return False
+    log(f"⏱️ {catalog.tag}: новый интервал {schedule.interval} сек., "
+        f"оставшиеся слоты цикла через каждые {schedule.step:.0f} сек.")
+    save_tag_state(catalog.tag, **schedule.to_state())
+    return True
@@ -0,0 +1,219 @@
+# cdp_client.py
+import json
+import time
+import queue
+import threading
+
+import websocket
+
+from http_client import get_http
+
+# Сколько ждать ответа браузера на команду
+DEFAULT_COMMAND_TIMEOUT = 30
+READ_POLL_INTERVAL = 1
+
+
+class CdpError(Exception):
+    """
+    Ошибка команды Chrome DevTools Protocol: метод, текст и код ответа браузера
+    """
+    def __init__(self, method, message, code=None):
+        self.method = method
+        self.message = message
+        self.code = code
+        suffix = f" (code={code})" if code is not None else ""
+        super().__init__(f"CDP {method}: {message}{suffix}")
+
+
+class CdpConnection:
+    """
+    Соединение с браузером по DevTools websocket. Ответы на команды сопоставляются по id,
+    события раздаются подписчикам (очередям) из отдельного потока чтения
+    """
+    def __init__(self, ws_url, timeout=DEFAULT_COMMAND_TIMEOUT):
+        self.ws_url = ws_url
+        self.timeout = timeout
+        # Без Origin: иначе Chrome требует --remote-allow-origins
+        self.ws = websocket.create_connection(ws_url, timeout=timeout, suppress_origin=True)
+        self.ws.settimeout(READ_POLL_INTERVAL)
+        self.lock = threading.Lock()
+        self.next_id = 0
+        self.pending = {}
+        self.subscribers = []
+        self.closed = threading.Event()
+        self.reader = threading.Thread(target=self._read, daemon=True, name="cdp-reader")
+        self.reader.start()
+
+    def _read(self):
+        try:
+            while not self.closed.is_set():
+                try:
+                    raw = self.ws.recv()
+                except websocket.WebSocketTimeoutException:
+                    continue
+                if not raw:
+                    break
+                self._dispatch(json.loads(raw))
+        except Exception as e:
+            if not self.closed.is_set():
+                print(f"Соединение CDP {self.ws_url} прервано: {e}")
+        finally:
+            self.closed.set()
+            with self.lock:
+                waiters = list(self.pending.values())
+                self.pending.clear()
+            for waiter in waiters:
+                waiter.put(None)
+
+    def _dispatch(self, message):
+        if "id" in message:
+            with self.lock:
+                waiter = self.pending.pop(message["id"], None)
+            if waiter is not None:
+                waiter.put(message)
+            return
+        method = message.get("method")
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for methods, session_id, events in subscribers:
+            if method in methods and (session_id is None or message.get("sessionId") == session_id):
+                events.put((method, message.get("params", {})))
+
+    def send(self, method, params=None, session_id=None, timeout=None):
+        """
+        Отправляет команду и ждёт ответ. Возвращает result ответа или бросает CdpError
+        """
+        reply = queue.Queue(maxsize=1)
+        with self.lock:
+            if self.closed.is_set():
+                raise CdpError(method, "соединение закрыто")
+            self.next_id += 1
+            message = {"id": self.next_id, "method": method, "params": params or {}}
+            if session_id:
+                message["sessionId"] = session_id
+            self.pending[self.next_id] = reply
+            self.ws.send(json.dumps(message))
+        timeout = timeout or self.timeout
+        try:
+            response = reply.get(timeout=timeout)
+        except queue.Empty:
+            with self.lock:
+                self.pending.pop(message["id"], None)
+            raise CdpError(method, f"нет ответа за {timeout:.0f} сек.")
+        if response is None:
+            raise CdpError(method, "соединение закрыто")
+        if "error" in response:
+            error = response["error"]
+            raise CdpError(method, error.get("message", "неизвестная ошибка"), error.get("code"))
+        return response.get("result", {})
+
+    def subscribe(self, *methods, session_id=None):
+        """
+        Подписка на события methods. Возвращает очередь, в которую приходят пары (метод, params)
+        """
+        events = queue.Queue()
+        with self.lock:
+            self.subscribers.append((methods, session_id, events))
+        return events
+
+    def unsubscribe(self, events):
+        with self.lock:
+            self.subscribers = [entry for entry in self.subscribers if entry[2] is not events]
+
+    def wait_for_event(self, events, predicate=None, timeout=DEFAULT_COMMAND_TIMEOUT):
+        """
+        Ждёт из очереди подписки событие (метод, params), подходящее под predicate.
+        None, если не дождались за timeout
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                event = events.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if predicate is None or predicate(event):
+                return event
+
+    def close(self):
+        self.closed.set()
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+
+
+class CdpTab:
+    """
+    Вкладка браузера, к которой подключена сессия CDP (Target.attachToTarget, flatten)
+    """
+    def __init__(self, connection, session_id, target_id):
+        self.connection = connection
+        self.session_id = session_id
+        self.target_id = target_id
+
+    def send(self, method, params=None, timeout=None):
+        return self.connection.send(method, params, self.session_id, timeout)
+
+    def subscribe(self, *methods):
+        return self.connection.subscribe(*methods, session_id=self.session_id)
+
+    def unsubscribe(self, events):
+        self.connection.unsubscribe(events)
+
+    def wait_for_event(self, events, predicate=None, timeout=DEFAULT_COMMAND_TIMEOUT):
+        return self.connection.wait_for_event(events, predicate, timeout)
+
+    def evaluate(self, expression, await_promise=False, timeout=None, user_gesture=False):
+        """
+        Runtime.evaluate: значение выражения (по значению) или CdpError, если в странице исключение.
+        user_gesture — выполнять как действие пользователя (клики, которые открывают
+        выбор файла или всплывающие окна, без него страница игнорирует)
+        """
+        result = self.send("Runtime.evaluate", {
+            "expression": expression,
+            "returnByValue": True,
+            "awaitPromise": await_promise,
+            "userGesture": user_gesture,
+        }, timeout)
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            message = details.get("exception", {}).get("description") or details.get("text")
+            raise CdpError("Runtime.evaluate", message)
+        return result.get("result", {}).get("value")
+
+    def call(self, function_source, *args, await_promise=False, timeout=None, user_gesture=False):
+        """
+        Вызывает в странице JS-функцию function_source с аргументами, переданными как JSON
+        """
+        arguments = ", ".join(json.dumps(arg) for arg in args)
+        return self.evaluate(f"({function_source})({arguments})", await_promise, timeout, user_gesture)
+
+    def close(self):
+        try:
+            self.connection.send("Target.detachFromTarget", {"sessionId": self.session_id}, timeout=5)
+        except Exception:
+            pass
+        self.connection.close()
+
+
+def open_driver_tab(driver):
+    """
+    Подключается по CDP к текущей вкладке драйвера Selenium. Адрес DevTools берётся у самого
+    браузера (тот же, что AdsPower отдаёт в ws), поэтому подходит и для браузеров из пула и прогрева
+    """
+    address = driver.capabilities.get("goog:chromeOptions", {}).get("debuggerAddress")
+    if not address:
+        raise CdpError("Target.attachToTarget", "драйвер не сообщил адрес отладчика")
+    version = get_http().get(f"http://{address}/json/version", timeout=5).json()
+    connection = CdpConnection(version["webSocketDebuggerUrl"])
+    try:
+        # Дескриптор окна chromedriver — это id вкладки в DevTools
+        target_id = driver.current_window_handle
+        session_id = connection.send("Target.attachToTarget", {"targetId": target_id, "flatten": True})["sessionId"]
+    except Exception:
+        connection.close()
+        raise
+    return CdpTab(connection, session_id, target_id)
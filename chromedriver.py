@@ -0,0 +1,121 @@
+# chromedriver.py
+import os
+import atexit
+import threading
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
+
+
+
+class DriverServer:
+    """
+    Долгоживущий процесс chromedriver для одного бинарника драйвера AdsPower.
+    К нему подключаются все сессии процесса вместо запуска своего chromedriver на каждый пост
+    """
+    def __init__(self, driver_path):
+        self.driver_path = driver_path
+        self.service = None
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return self.service.service_url
+
+    def start(self):
+        self.service = Service(executable_path=self.driver_path)
+        self.service.start()
+        print(f"chromedriver запущен: {self.driver_path} ({self.url})")
+
+    def stop(self):
+        if self.service is None:
+            return
+        try:
+            self.service.stop()
+        except Exception as e:
+            print(f"Ошибка при остановке chromedriver: {e}")
+        self.service = None
+
+    def alive(self):
+        """
+        Процесс chromedriver жив и принимает соединения. Медленный ответ под нагрузкой
+        или ошибка отдельной сессии не делают сервер мёртвым: его перезапуск оборвал бы
+        все сессии процесса (посты в потоках, пул, прогрев)
+        """
+        if self.service is None:
+            return False
+        process = getattr(self.service, "process", None)
+        if process is not None and process.poll() is not None:
+            return False
+        return self.service.is_connectable()
+
+    def ensure_running(self):
+        """
+        Возвращает адрес сервера, запустив chromedriver, если он ещё не запущен или его процесс умер
+        """
+        with self.lock:
+            if self.service is not None and not self.alive():
+                print(f"chromedriver {self.url} не работает, перезапускаем")
+                self.stop()
+            if self.service is None:
+                self.start()
+            return self.url
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+def get_driver_server(driver_path):
+    """
+    Общий на процесс сервер chromedriver для бинарника driver_path
+    """
+    key = os.path.realpath(driver_path)
+    with _servers_lock:
+        server = _servers.get(key)
+        if server is None:
+            server = DriverServer(driver_path)
+            _servers[key] = server
+        return server
+
+
+def stop_driver_servers():
+    with _servers_lock:
+        servers = list(_servers.values())
+        _servers.clear()
+    for server in servers:
+        server.stop()
+
+
+atexit.register(stop_driver_servers)
+
+
+def _remote(url, options):
+    executor = ChromiumRemoteConnection(url, vendor_prefix="goog", browser_name="chrome")
+    return webdriver.Remote(command_executor=executor, options=options)
+
+
+def attach(driver_path, options):
+    """
+    Новая сессия WebDriver на общем chromedriver для driver_path.
+    Если подключиться не удалось, попытка повторяется на том же сервере; chromedriver
+    перезапускается, только если его процесс умер (см. DriverServer.alive).
+    quit() такой сессии закрывает только её, сервер остаётся для следующих постов
+    """
+    if os.getenv("CHROMEDRIVER_SHARED", "1") == "0":
+        return webdriver.Chrome(service=Service(executable_path=driver_path), options=options)
+    server = get_driver_server(driver_path)
+    url = server.ensure_running()
+    try:
+        return _remote(url, options)
+    except Exception as e:
+        print(f"Не удалось подключиться через chromedriver {url} ({e}), пробуем ещё раз")
+        return _remote(server.ensure_running(), options)
+
+
+def execute_cdp(driver, cmd, params=None):
+    """
+    Команда Chrome DevTools Protocol через chromedriver (работает и для webdriver.Remote)
+    """
+    return driver.execute("executeCdpCommand", {"cmd": cmd, "params": params or {}})["value"]
@@ -0,0 +1,167 @@
+# composer_load.py
+import os
+import time
+import queue
+
+from state import connect
+
+# Режимы загрузки страницы создания поста:
+#   full — как раньше: ждём полной загрузки страницы и текста "New post"
+#   fast — pageLoadStrategy=eager, блокировка лишних запросов (видео, шрифты, счётчики),
+#          страница готова, как только появилось поле ввода поста
+COMPOSER_LOAD_MODES = ("full", "fast")
+DEFAULT_COMPOSER_LOAD_MODE = "full"
+
+# Что блокируется в режиме fast (шаблоны Network.setBlockedURLs, * — любая подстрока).
+# Переопределяется через COMPOSER_BLOCK_URLS="*.mp4*,*.woff2*"
+DEFAULT_BLOCKED_URLS = [
+    "*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*",
+    "*.woff*", "*.ttf*", "*.otf*",
+    "*.gif*",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*facebook.net*", "*hotjar.com*", "*sentry.io*",
+]
+# Сколько последних загрузок каждого режима учитывать при расчёте экономии
+STATS_WINDOW = 200
+
+
+def get_composer_load_mode():
+    mode = os.getenv("COMPOSER_LOAD_MODE", DEFAULT_COMPOSER_LOAD_MODE)
+    if mode not in COMPOSER_LOAD_MODES:
+        raise ValueError(f"Неизвестный COMPOSER_LOAD_MODE: {mode}. Допустимо: {', '.join(COMPOSER_LOAD_MODES)}")
+    return mode
+
+
+def _split_patterns(value):
+    return [pattern.strip() for pattern in value.split(",") if pattern.strip()]
+
+
+def apply_request_blocking(driver):
+    """
+    Включает блокировку запросов во вкладке драйвера. Список разрешённых адресов
+    (COMPOSER_ALLOW_URLS, синтаксис URLPattern) блокирует всё остальное и требует
+    браузер с поддержкой urlPatterns в Network.setBlockedURLs; иначе используется
+    список запрещённых (COMPOSER_BLOCK_URLS или DEFAULT_BLOCKED_URLS)
+    """
+    from chromedriver import execute_cdp
+    execute_cdp(driver, "Network.enable")
+    allowed = _split_patterns(os.getenv("COMPOSER_ALLOW_URLS", ""))
+    if allowed:
+        patterns = [{"urlPattern": pattern, "block": False} for pattern in allowed]
+        patterns.append({"urlPattern": "*://*/*", "block": True})
+        try:
+            execute_cdp(driver, "Network.setBlockedURLs", {"urlPatterns": patterns})
+            print(f"Разрешены только запросы к {len(allowed)} шаблонам адресов")
+            return
+        except Exception as e:
+            print(f"Браузер не поддерживает список разрешённых адресов ({e}), используем список запрещённых")
+    blocked = _split_patterns(os.getenv("COMPOSER_BLOCK_URLS", "")) or DEFAULT_BLOCKED_URLS
+    execute_cdp(driver, "Network.setBlockedURLs", {"urls": blocked})
+    print(f"Заблокированы запросы по {len(blocked)} шаблонам адресов")
+
+
+class PageTransferMeter:
+    """
+    Считает, сколько байт вкладка драйвера получила по сети: сумма encodedDataLength
+    из событий Network.loadingFinished (своя сессия CDP с включённым Network в обоих режимах,
+    так что full и fast измеряются одинаково). В отличие от transferSize из Resource Timing,
+    учитываются и кросс-доменные ресурсы без Timing-Allow-Origin
+    """
+    def __init__(self, driver):
+        from cdp_client import open_driver_tab
+        self.tab = open_driver_tab(driver)
+        self.finished = self.tab.subscribe("Network.loadingFinished")
+        try:
+            self.tab.send("Network.enable")
+        except Exception:
+            self.close()
+            raise
+
+    def totals(self):
+        """
+        (байты, ресурсы) с момента создания
+        """
+        transferred = resources = 0
+        while True:
+            try:
+                _, params = self.finished.get_nowait()
+            except queue.Empty:
+                return int(transferred), resources
+            transferred += params.get("encodedDataLength") or 0
+            resources += 1
+
+    def close(self):
+        self.tab.unsubscribe(self.finished)
+        self.tab.close()
+
+
+def start_transfer_meter(driver):
+    """
+    PageTransferMeter для вкладки драйвера или None, если подключиться по CDP не удалось
+    """
+    try:
+        return PageTransferMeter(driver)
+    except Exception as e:
+        print(f"Не удалось включить подсчёт трафика страницы: {e}")
+        return None
+
+
+def page_transfer_stats(meter):
+    """
+    Сколько байт страница получила по сети и сколько ресурсов загрузила с запуска meter.
+    Возвращает (байты, ресурсы) или (None, None)
+    """
+    if meter is None:
+        return None, None
+    return meter.totals()
+
+
+def _ensure_page_load_table(conn):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS page_load_stats ("
+        "ts REAL NOT NULL, mode TEXT NOT NULL, duration REAL, bytes INTEGER)"
+    )
+
+
+def record_page_load(mode, duration, transferred):
+    """
+    Запоминает загрузку страницы создания поста для сравнения режимов
+    """
+    conn = connect()
+    try:
+        _ensure_page_load_table(conn)
+        conn.execute(
+            "INSERT INTO page_load_stats (ts, mode, duration, bytes) VALUES (?, ?, ?, ?)",
+            (time.time(), mode, duration, transferred)
+        )
+    finally:
+        conn.close()
+
+
+def page_load_savings():
+    """
+    Средняя экономия режима fast относительно full по последним загрузкам обоих режимов:
+    словарь {seconds, bytes, fast_samples, full_samples} или None, если одного из режимов ещё нет
+    """
+    conn = connect()
+    try:
+        _ensure_page_load_table(conn)
+        averages = {}
+        for mode in COMPOSER_LOAD_MODES:
+            row = conn.execute(
+                "SELECT AVG(duration) AS duration, AVG(bytes) AS bytes, COUNT(*) AS samples FROM ("
+                "SELECT duration, bytes FROM page_load_stats WHERE mode = ? ORDER BY ts DESC LIMIT ?)",
+                (mode, STATS_WINDOW)
+            ).fetchone()
+            if not row["samples"]:
+                return None
+            averages[mode] = row
+    finally:
+        conn.close()
+    full, fast = averages["full"], averages["fast"]
+    return {
+        "seconds": (full["duration"] or 0) - (fast["duration"] or 0),
+        "bytes": (full["bytes"] or 0) - (fast["bytes"] or 0),
+        "fast_samples": fast["samples"],
+        "full_samples": full["samples"],
+    }
@@ -2,21 +2,32 @@ import time
 import os
 import sys
 import io
-import random
-import requests
 import json
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.action_chains import ActionChains
 from dotenv import load_dotenv
-from db import save_post_link
+from events import POST_EVENTS_ENV, EventEmitter, open_event_channel
+from rotation import next_model, record_post, rotation_status
+from errors import AccountLoggedOut, ImageUnavailable, TagNotFound
+from admission import BrowserAdmission
+from leases import ProfileLease, ProfileBusy
+from chromedriver import attach, execute_cdp
+from composer_load import (get_composer_load_mode, apply_request_blocking, start_transfer_meter,
+                           page_transfer_stats, record_page_load)
+from post_steps import PostSteps, get_post_backend, open_cdp_steps, record_editor_run
+from browser_pool import BrowserSession, close_browser, get_browser_pool
+from adspower import start_browser, get_launch_profile
+from api import get_models_data
+from outbox import enqueue, start_sender
+from image_prep import get_upload_image
+from prefetch import is_prepared_valid
 import math
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 if sys.platform == 'win32':
     # Установка UTF-8 для вывода в консоль
@@ -24,25 +35,16 @@ if sys.platform == 'win32':
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 
 
-# API endpoint для получения SFS моделей
-API_BASE_URL = "https://flowvelvet.com/api/v1/sfs-models/"
-
-def launch_browser_with_adspower(profile_id):
+def launch_browser_with_adspower(profile_id, launch_profile=None):
     """
-    Запускает браузер через AdsPower API
+    Подключается к браузеру профиля AdsPower: уже открытому или запущенному заново.
+    launch_profile — standard или lean (см. adspower.LAUNCH_PROFILES); по умолчанию
+    берётся из POST_LAUNCH_PROFILE / LAUNCH_PROFILE. При ошибке AdsPower бросает AdsPowerError
     """
-    api_url = f"http://localhost:50325/api/v1/browser/start?user_id={profile_id}"
-    print(f"Запрос к API AdsPower: {api_url}")
-    response = requests.get(api_url)
-    data = json.loads(response.text)
-    print(f"Ответ от AdsPower: {data}")
-
-    if data['code'] != 0:
-        print(f"Ошибка при запуске браузера: {data['msg']}")
-        return None
+    data = start_browser(profile_id, launch_profile=launch_profile or get_launch_profile("POST_LAUNCH_PROFILE"))
 
-    driver_path = data['data']['webdriver']
-    debugger_address = data['data']['ws']['selenium']
+    driver_path = data['webdriver']
+    debugger_address = data['ws']['selenium']
     print(f"Путь к драйверу: {driver_path}")
     print(f"Адрес отладчика: {debugger_address}")
 
@@ -50,56 +52,33 @@ def launch_browser_with_adspower(profile_id):
     chrome_options.add_experimental_option("debuggerAddress", debugger_address)
     # Дополнительный параметр для открытия нового окна
     chrome_options.add_argument("--new-window")
-    service = Service(executable_path=driver_path)
-    driver = webdriver.Chrome(service=service, options=chrome_options)
-    
-    # Закрываем лишние вкладки, оставляем только первую
-    handles = driver.window_handles
-    if len(handles) > 1:
-        main_handle = handles[0]
-        for handle in handles:
-            if handle != main_handle:
-                driver.switch_to.window(handle)
-                driver.close()
-        driver.switch_to.window(main_handle)
-    
+    fast_load = get_composer_load_mode() == "fast"
+    if fast_load:
+        # Не ждём картинки и прочие подресурсы: страница готова, когда готов DOM
+        chrome_options.page_load_strategy = "eager"
+    # Сессия открывается на общем для процесса chromedriver этого бинарника (см. chromedriver.py)
+    driver = attach(driver_path, chrome_options)
+    close_extra_tabs(driver)
+    if fast_load:
+        try:
+            apply_request_blocking(driver)
+        except Exception as e:
+            print(f"Не удалось включить блокировку запросов: {e}")
     return driver
 
-def verify_image_url(image_url):
-    """
-    Проверяет доступность изображения по URL
-    """
-    try:
-        response = requests.head(image_url, timeout=5)
-        if response.status_code == 200:
-            print(f"Изображение доступно по URL: {image_url}")
-            return True
-        else:
-            print(f"Изображение недоступно. Код ответа: {response.status_code}")
-            return False
-    except Exception as e:
-        print(f"Ошибка при проверке изображения: {e}")
-        return False
 
-def get_models_data(onlyfans_tag):
+def close_extra_tabs(driver):
     """
-    Получает данные о моделях с API
+    Закрывает все вкладки, кроме текущей, через CDP — без переключения драйвера между окнами
     """
     try:
-        api_url = f"{API_BASE_URL}?onlyfans_tag={onlyfans_tag}"
-        print(f"Запрос к API моделей: {api_url}")
-        response = requests.get(api_url)
-        
-        if response.status_code != 200:
-            print(f"Ошибка при запросе к API. Код ответа: {response.status_code}")
-            return None
-            
-        data = response.json()
-        print(f"Получено {len(data.get('models', []))} моделей")
-        return data
+        current = driver.current_window_handle
+        targets = execute_cdp(driver, "Target.getTargets")["targetInfos"]
+        for target in targets:
+            if target.get("type") == "page" and target["targetId"] != current:
+                execute_cdp(driver, "Target.closeTarget", {"targetId": target["targetId"]})
     except Exception as e:
-        print(f"Ошибка при получении данных о моделях: {e}")
-        return None
+        print(f"Не удалось закрыть лишние вкладки: {e}")
 
 def calculate_post_interval(total_models):
     """
@@ -109,209 +88,140 @@ def calculate_post_interval(total_models):
     interval_seconds = math.ceil(hours_24_in_seconds / total_models)
     return interval_seconds
 
-def download_to_temp_file(image_url):
+def upload_image(driver, image_path, wait):
     """
-    Загружает изображение во временный файл и возвращает путь к нему
+    Функция загрузки изображения через кнопку #attach_file_photo.
+    image_path — файл из кэша картинок, он не удаляется после загрузки
     """
-    try:
-        import tempfile
+    # 1. Файл уже лежит в кэше картинок
+    abs_path = os.path.abspath(image_path)
+    print(f"Загружаем изображение из кэша: {abs_path}")
         
-        # Загружаем изображение
-        print(f"Загружаем изображение с URL: {image_url}")
-        response = requests.get(image_url, stream=True, timeout=10)
+    # 2. Находим и нажимаем на кнопку #attach_file_photo
+    try:
+        print("Ищем кнопку с id='attach_file_photo'")
         
-        if response.status_code == 200:
-            # Создаем временный файл
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-            temp_path = temp_file.name
+        # Проверяем наличие кнопки
+        if driver.execute_script("return document.getElementById('attach_file_photo') !== null"):
+            print("Кнопка #attach_file_photo найдена")
             
-            # Сохраняем содержимое в файл
-            with open(temp_path, 'wb') as f:
-                for chunk in response.iter_content(1024):
-                    f.write(chunk)
+            # Находим кнопку
+            attach_button = driver.find_element(By.ID, "attach_file_photo")
             
-            print(f"Изображение успешно загружено во временный файл: {temp_path}")
-            return temp_path
-        else:
-            print(f"Ошибка при загрузке изображения. Код ответа: {response.status_code}")
-            return None
-    except Exception as e:
-        print(f"Ошибка при загрузке изображения во временный файл: {e}")
-        return None
-
-def upload_image(driver, image_url, wait):
-    """
-    Функция загрузки изображения через кнопку #attach_file_photo
-    """
-    temp_file_path = None
-    try:
-        print(f"Загружаем изображение с URL: {image_url}")
-        
-        # 1. Скачиваем изображение во временный файл
-        try:
-            response = requests.get(image_url, stream=True, timeout=15)
-            if response.status_code != 200:
-                print(f"Ошибка при скачивании изображения. Код ответа: {response.status_code}")
-                return False
-                
-            # Создаем временный файл
-            import tempfile
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-            temp_file_path = temp_file.name
+            # Прокручиваем к кнопке
+            driver.execute_script("arguments[0].scrollIntoView(true);", attach_button)
             
-            # Записываем данные
-            with open(temp_file_path, 'wb') as f:
-                for chunk in response.iter_content(1024):
-                    f.write(chunk)
-                    
-            print(f"Изображение сохранено в: {temp_file_path}")
-            abs_path = os.path.abspath(temp_file_path)
-            print(f"Абсолютный путь: {abs_path}")
-        except Exception as e:
-            print(f"Ошибка при скачивании изображения: {e}")
-            return False
+            # Небольшая пауза
+            time.sleep(1)
             
-        # 2. Находим и нажимаем на кнопку #attach_file_photo
-        try:
-            print("Ищем кнопку с id='attach_file_photo'")
+            # Проверяем видимость
+            is_visible = attach_button.is_displayed()
+            print(f"Кнопка видима: {is_visible}")
             
-            # Проверяем наличие кнопки
-            if driver.execute_script("return document.getElementById('attach_file_photo') !== null"):
-                print("Кнопка #attach_file_photo найдена")
-                
-                # Находим кнопку
-                attach_button = driver.find_element(By.ID, "attach_file_photo")
+            # Нажимаем на кнопку
+            driver.execute_script("arguments[0].click();", attach_button)
+            print("Кнопка #attach_file_photo нажата")
+            
+            # Ждем появления диалога выбора файла
+            time.sleep(3)
+            
+            # Находим инпут для файла, который должен появиться
+            file_inputs = driver.find_elements(By.CSS_SELECTOR, "input[type='file']")
+            
+            if file_inputs:
+                print(f"Найдено {len(file_inputs)} инпутов для файлов")
                 
-                # Прокручиваем к кнопке
-                driver.execute_script("arguments[0].scrollIntoView(true);", attach_button)
+                # Первый инпут должен быть для загрузки изображения
+                file_input = file_inputs[0]
                 
-                # Небольшая пауза
-                time.sleep(1)
+                # Делаем его видимым
+                driver.execute_script("""
+                    arguments[0].style.display = 'block';
+                    arguments[0].style.visibility = 'visible';
+                    arguments[0].style.opacity = '1';
+                """, file_input)
                 
-                # Проверяем видимость
-                is_visible = attach_button.is_displayed()
-                print(f"Кнопка видима: {is_visible}")
+                # Отправляем путь к файлу
+                file_input.send_keys(abs_path)
+                print("Путь к файлу отправлен в инпут")
                 
-                # Нажимаем на кнопку
-                driver.execute_script("arguments[0].click();", attach_button)
-                print("Кнопка #attach_file_photo нажата")
+                # Ждем завершения загрузки
+                time.sleep(5)
                 
-                # Ждем появления диалога выбора файла
-                time.sleep(3)
+                return True
+            else:
+                print("Инпуты для файлов не найдены после нажатия кнопки")
                 
-                # Находим инпут для файла, который должен появиться
-                file_inputs = driver.find_elements(By.CSS_SELECTOR, "input[type='file']")
+                # Пробуем найти скрытые инпуты
+                hidden_inputs = driver.execute_script("""
+                    return Array.from(document.querySelectorAll('input[type="file"]')).filter(el => 
+                        window.getComputedStyle(el).display === 'none' || 
+                        window.getComputedStyle(el).visibility === 'hidden' ||
+                        el.getAttribute('hidden') !== null
+                    );
+                """)
                 
-                if file_inputs:
-                    print(f"Найдено {len(file_inputs)} инпутов для файлов")
-                    
-                    # Первый инпут должен быть для загрузки изображения
-                    file_input = file_inputs[0]
+                if hidden_inputs:
+                    print(f"Найдено {len(hidden_inputs)} скрытых инпутов для файлов")
                     
-                    # Делаем его видимым
+                    # Делаем первый инпут видимым
                     driver.execute_script("""
                         arguments[0].style.display = 'block';
                         arguments[0].style.visibility = 'visible';
                         arguments[0].style.opacity = '1';
-                    """, file_input)
+                        arguments[0].removeAttribute('hidden');
+                    """, hidden_inputs[0])
                     
                     # Отправляем путь к файлу
-                    file_input.send_keys(abs_path)
-                    print("Путь к файлу отправлен в инпут")
+                    hidden_inputs[0].send_keys(abs_path)
+                    print("Путь к файлу отправлен в скрытый инпут")
                     
                     # Ждем завершения загрузки
                     time.sleep(5)
                     
                     return True
-                else:
-                    print("Инпуты для файлов не найдены после нажатия кнопки")
-                    
-                    # Пробуем найти скрытые инпуты
-                    hidden_inputs = driver.execute_script("""
-                        return Array.from(document.querySelectorAll('input[type="file"]')).filter(el => 
-                            window.getComputedStyle(el).display === 'none' || 
-                            window.getComputedStyle(el).visibility === 'hidden' ||
-                            el.getAttribute('hidden') !== null
-                        );
-                    """)
-                    
-                    if hidden_inputs:
-                        print(f"Найдено {len(hidden_inputs)} скрытых инпутов для файлов")
-                        
-                        # Делаем первый инпут видимым
-                        driver.execute_script("""
-                            arguments[0].style.display = 'block';
-                            arguments[0].style.visibility = 'visible';
-                            arguments[0].style.opacity = '1';
-                            arguments[0].removeAttribute('hidden');
-                        """, hidden_inputs[0])
-                        
-                        # Отправляем путь к файлу
-                        hidden_inputs[0].send_keys(abs_path)
-                        print("Путь к файлу отправлен в скрытый инпут")
-                        
-                        # Ждем завершения загрузки
-                        time.sleep(5)
-                        
-                        return True
-            else:
-                print("Кнопка #attach_file_photo не найдена")
+        else:
+            print("Кнопка #attach_file_photo не найдена")
+            
+            # Ищем альтернативный селектор для кнопки загрузки файла
+            try:
+                print("Ищем по селектору .attach_file")
+                attach_file_button = driver.find_element(By.CSS_SELECTOR, ".attach_file")
                 
-                # Ищем альтернативный селектор для кнопки загрузки файла
-                try:
-                    print("Ищем по селектору .attach_file")
-                    attach_file_button = driver.find_element(By.CSS_SELECTOR, ".attach_file")
-                    
-                    print("Найдена кнопка .attach_file, нажимаем на нее")
-                    driver.execute_script("arguments[0].click();", attach_file_button)
-                    print("Кнопка .attach_file нажата")
-                    
-                    # Ждем появления диалога выбора файла
-                    time.sleep(3)
-                    
-                    # Находим инпут для файла
-                    file_inputs = driver.find_elements(By.CSS_SELECTOR, "input[type='file']")
+                print("Найдена кнопка .attach_file, нажимаем на нее")
+                driver.execute_script("arguments[0].click();", attach_file_button)
+                print("Кнопка .attach_file нажата")
+                
+                # Ждем появления диалога выбора файла
+                time.sleep(3)
+                
+                # Находим инпут для файла
+                file_inputs = driver.find_elements(By.CSS_SELECTOR, "input[type='file']")
+                
+                if file_inputs:
+                    # Отправляем путь к файлу
+                    file_inputs[0].send_keys(abs_path)
+                    print("Путь к файлу отправлен в инпут")
                     
-                    if file_inputs:
-                        # Отправляем путь к файлу
-                        file_inputs[0].send_keys(abs_path)
-                        print("Путь к файлу отправлен в инпут")
-                        
-                        # Ждем завершения загрузки
-                        time.sleep(5)
-                        
-                        return True
-                    else:
-                        print("Инпуты для файлов не найдены после нажатия кнопки .attach_file")
-                except Exception as alt_err:
-                    print(f"Ошибка при поиске альтернативной кнопки: {alt_err}")
+                    # Ждем завершения загрузки
+                    time.sleep(5)
                     
-            print("Все попытки загрузки изображения не удались")
-            return False
-        except Exception as e:
-            print(f"Ошибка при загрузке изображения: {e}")
-            return False
-    finally:
-        # Пытаемся удалить временный файл
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                # Небольшая задержка перед удалением
-                time.sleep(3)
-                os.unlink(temp_file_path)
-                print(f"Временный файл удалён: {temp_file_path}")
-            except Exception as e:
-                print(f"Ошибка при удалении временного файла: {e}")
-                # Запланируем удаление при выходе
-                try:
-                    import atexit
-                    atexit.register(lambda f=temp_file_path: os.unlink(f) if os.path.exists(f) else None)
-                    print("Файл будет удален при завершении программы")
-                except:
-                    pass
+                    return True
+                else:
+                    print("Инпуты для файлов не найдены после нажатия кнопки .attach_file")
+            except Exception as alt_err:
+                print(f"Ошибка при поиске альтернативной кнопки: {alt_err}")
+                
+        print("Все попытки загрузки изображения не удались")
+        return False
+    except Exception as e:
+        print(f"Ошибка при загрузке изображения: {e}")
+        return False
 
 def tag_model(driver, model_tag, wait):
     """
-    Функция для отметки модели с дополнительной кнопкой перед полем ввода
+    Функция для отметки модели с дополнительной кнопкой перед полем ввода.
+    Возвращает True/False; если поиск не нашёл модель, бросает TagNotFound
     """
     try:
         print("Нажимаем на кнопку отметки модели...")
@@ -436,7 +346,9 @@ def tag_model(driver, model_tag, wait):
                     print("Не найдены ни чекбоксы, ни строки с моделями")
                     # Закрываем модальное окно
                     close_modal(driver)
-                    return False
+                    raise TagNotFound(f"Поиск не нашёл модель {model_tag}")
+        except TagNotFound:
+            raise
         except Exception as select_err:
             print(f"Ошибка при выборе модели: {select_err}")
         
@@ -493,6 +405,8 @@ def tag_model(driver, model_tag, wait):
             close_modal(driver)
         
         return True
+    except TagNotFound:
+        raise
     except Exception as e:
         print(f"Общая ошибка при отметке модели: {e}")
         
@@ -852,14 +766,199 @@ def close_modal(driver):
     print("Принудительное закрытие модального окна через JavaScript")
     time.sleep(1)
 
-def check_logged_in_or_stop(driver, main_model_tag):
+def enter_post_text(driver, wait, post_text):
+    """
+    Вводит текст поста в поле редактора через JavaScript (insertText и событие input).
+    Текст вставляется как есть, без разбора HTML, как и в бэкенде cdp (Input.insertText)
+    """
+    # Ждем появления текстового поля
+    print("Ожидание загрузки текстового поля...")
+    input_field = wait.until(EC.presence_of_element_located((
+        By.CSS_SELECTOR, 'div[contenteditable="true"][role="textbox"]'
+    )))
+    print("Текстовое поле найдено")
+
+    # Вводим текст из API в поле ввода
+    print("Ввод текста в поле...")
+
+    # Для contenteditable div нужно использовать JavaScript: insertText вставляет
+    # текст в выделение (всё поле) как обычный текст, переводы строк — как переносы
+    driver.execute_script(
+        "arguments[0].focus();"
+        "const range = document.createRange();"
+        "range.selectNodeContents(arguments[0]);"
+        "const selection = window.getSelection();"
+        "selection.removeAllRanges();"
+        "selection.addRange(range);"
+        "document.execCommand('insertText', false, arguments[1]);",
+        input_field,
+        post_text
+    )
+
+    print("Текст успешно введен в поле ввода")
+
+    # Активация поля
+    driver.execute_script(
+        "arguments[0].dispatchEvent(new Event('input', { bubbles: true }));",
+        input_field
+    )
+
+    time.sleep(2)
+    print("Текст введен и активирован")
+
+
+def click_submit(driver, wait):
+    """
+    Нажимает кнопку отправки поста, перебирая способы клика. Возвращает True, если кнопка нажата
+    """
+    # Задержка для полной загрузки страницы
+    time.sleep(3)
+
+    # Точный селектор кнопки отправки
+    exact_selector = 'button[at-attr="submit_post"]'
+
+    # Проверяем, есть ли отключенные кнопки
+    try:
+        disabled_buttons = driver.find_elements(By.CSS_SELECTOR, exact_selector + '.m-disabled')
+
+        if disabled_buttons:
+            print("Найдена отключенная кнопка. Ждем, пока она станет активной...")
+            # Ожидаем, пока кнопка станет активной (максимум 30 секунд)
+            wait_for_enabled = WebDriverWait(driver, 30)
+            wait_for_enabled.until_not(EC.presence_of_element_located((
+                By.CSS_SELECTOR, exact_selector + '.m-disabled'
+            )))
+            print("Кнопка стала активной")
+    except Exception as wait_error:
+        print(f"Ошибка при ожидании активации кнопки: {wait_error}")
+
+    # Пробуем несколько способов клика
+    successful_click = False
+
+    # Способ 1: Прямой клик по селектору
+    try:
+        post_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, exact_selector)))
+        post_button.click()  # Прямой клик
+        print("Кнопка отправки нажата прямым кликом")
+        successful_click = True
+    except Exception as e:
+        print(f"Ошибка при прямом клике: {e}")
+
+        # Способ 2: JavaScript клик
+        try:
+            post_button = driver.find_element(By.CSS_SELECTOR, exact_selector)
+            driver.execute_script("arguments[0].click();", post_button)
+            print("Кнопка отправки нажата через JavaScript")
+            successful_click = True
+        except Exception as js_error:
+            print(f"Ошибка при JavaScript клике: {js_error}")
+
+            # Способ 3: По тексту кнопки
+            try:
+                post_button = driver.find_element(By.XPATH, "//button[contains(text(), 'Post')]")
+                driver.execute_script("arguments[0].click();", post_button)
+                print("Кнопка отправки нажата по тексту")
+                successful_click = True
+            except Exception as text_error:
+                print(f"Ошибка при клике по тексту: {text_error}")
+
+    # Если ни один метод не сработал, пробуем удалить атрибут disabled и нажать
+    if not successful_click:
+        try:
+            print("Пробуем удалить атрибут disabled и нажать кнопку...")
+            # Находим все кнопки
+            buttons = driver.find_elements(By.TAG_NAME, "button")
+
+            for btn in buttons:
+                try:
+                    btn_text = btn.text.strip()
+                    btn_class = btn.get_attribute('class')
+
+                    if "Post" in btn_text or "post" in btn_text.lower():
+                        print(f"Найдена кнопка с текстом '{btn_text}' и классом '{btn_class}'")
+
+                        # Удаляем атрибут disabled и класс m-disabled
+                        driver.execute_script("""
+                            arguments[0].removeAttribute('disabled');
+                            arguments[0].classList.remove('m-disabled');
+                        """, btn)
+
+                        # Пробуем нажать
+                        driver.execute_script("arguments[0].click();", btn)
+                        print("Кнопка отправки нажата после удаления disabled")
+                        successful_click = True
+                        break
+                except Exception:
+                    continue
+        except Exception as disabled_error:
+            print(f"Ошибка при попытке удалить disabled: {disabled_error}")
+
+    return successful_click
+
+
+class SeleniumPostSteps(PostSteps):
+    """
+    Шаги редактора через chromedriver (см. post_steps.PostSteps)
+    """
+    name = "selenium"
+
+    def __init__(self, driver, wait):
+        self.driver = driver
+        self.wait = wait
+
+    def enter_text(self, text):
+        enter_post_text(self.driver, self.wait, text)
+
+    def upload_image(self, image_path):
+        return upload_image(self.driver, image_path, self.wait)
+
+    def tag_model(self, model_tag):
+        return tag_model(self.driver, model_tag, self.wait)
+
+    def set_expiration(self):
+        return set_post_expiration(self.driver, self.wait)
+
+    def submit(self, timeout=30):
+        if not click_submit(self.driver, self.wait):
+            return False, None
+        print("Ожидаем завершения отправки и перенаправления...")
+        try:
+            WebDriverWait(self.driver, timeout).until(lambda d: "posts/create" not in d.current_url)
+        except Exception:
+            return True, None
+        return True, self.driver.current_url
+
+
+def open_post_steps(driver, wait):
+    """
+    Шаги редактора выбранного бэкенда (POST_DRIVER_BACKEND). Если подключиться
+    по CDP не удалось, пост продолжается через Selenium
+    """
+    if get_post_backend() == "cdp":
+        try:
+            return open_cdp_steps(driver)
+        except Exception as e:
+            print(f"Не удалось подключиться к вкладке по CDP ({e}), продолжаем через Selenium")
+    return SeleniumPostSteps(driver, wait)
+
+
+def check_logged_in_or_stop(driver, main_model_tag, events=None, composer_ready=False):
+    """
+    Проверяет, что аккаунт залогинен (на странице есть "New post"), иначе отправляет логаут
+    и бросает AccountLoggedOut. composer_ready=True — достаточно появления поля ввода поста
+    (режим fast в composer_load), не дожидаясь остальной страницы
+    """
     print(f"[DEBUG] Проверка логина для модели {main_model_tag}")
     timeout = 20
     is_logged_in = False
-    try:
-        WebDriverWait(driver, timeout).until(
-            EC.presence_of_element_located((By.XPATH, '//*[contains(text(), "New post")]'))
+    ready = EC.presence_of_element_located((By.XPATH, '//*[contains(text(), "New post")]'))
+    if composer_ready:
+        ready = EC.any_of(
+            EC.presence_of_element_located((By.CSS_SELECTOR, 'div[contenteditable="true"][role="textbox"]')),
+            ready
         )
+    try:
+        WebDriverWait(driver, timeout).until(ready)
         is_logged_in = True
         print("[DEBUG] Элемент 'New post' найден, аккаунт залогинен.")
     except Exception:
@@ -869,79 +968,130 @@ def check_logged_in_or_stop(driver, main_model_tag):
     if not main_model_tag.startswith("@"):
         main_model_tag = "@" + main_model_tag
 
-    payload = {"onlyfans_tag": main_model_tag}
-    api_url_logout = "https://flowvelvet.com/api/v1/models/logout/"
 
 
     if not is_logged_in:
         print("\n\033[91mАккаунт разлогинен, работа скрипта остановлена.\033[0m")
-        print(f"[DEBUG] Отправка запроса logout на сервер: {api_url_logout}, payload: {payload}")
+        if events:
+            events.emit("logout", onlyfans_tag=main_model_tag)
+        # Сообщение о логауте доставит фоновый отправитель outbox
+        print(f"[DEBUG] Запрос logout для {main_model_tag} поставлен в очередь отправки")
         try:
-            resp = requests.post(api_url_logout, json=payload, timeout=10)
-            print(f"[DEBUG] Ответ от сервера: статус {resp.status_code}, ответ: {resp.text}")
+            enqueue("logout", onlyfans_tag=main_model_tag)
         except Exception as e:
-            print(f"Ошибка при отправке logout запроса: {e}")
+            print(f"Ошибка при постановке logout запроса в очередь: {e}")
         try:
             driver.quit()
         except Exception:
             pass
-        sys.exit(1)
+        raise AccountLoggedOut(main_model_tag)
 
     return True
 
 
-def main():
-    load_dotenv()
-    profile_id = None
-    main_model_tag = None
-
-    # Аргумент main_model_tag — это именно основной тег, который должен идти во все запросы и во все проверки!
-    if len(sys.argv) > 2:
-        profile_id = sys.argv[1].strip()
-        main_model_tag = sys.argv[2].strip()
-        if not main_model_tag.startswith("@"):
-            main_model_tag = "@" + main_model_tag
+def create_post(profile_id, main_model_tag, events=None, catalog=None, deadline=None, prepared=None,
+                next_deadline=None):
+    """
+    Одна публикация для основного тега: выбор модели, запуск браузера и все шаги поста.
+    Ход работы сообщается через events. Возвращает True, если пост опубликован.
+    Если аккаунт разлогинен, бросает AccountLoggedOut.
+    catalog — ответ /sfs-models/, уже полученный планировщиком; без него список запрашивается здесь.
+    Браузер запускается только после аренды профиля (его не откроет никто другой)
+    и получения слота в общей очереди машины, deadline (unix-время слота) задаёт место в этой очереди.
+    prepared — пост, подготовленный планировщиком заранее (см. prefetch.prepare_post).
+    next_deadline — unix-время следующего поста профиля: если он скоро, браузер
+    остаётся открытым в пуле (см. browser_pool) вместе с арендой и слотом.
+    """
+    if events is None:
+        events = EventEmitter()
+    pool = get_browser_pool()
+    events.step_started("admission")
+    session = pool.checkout(profile_id)
+    if session is not None:
+        events.step_finished("admission", pooled=True)
     else:
-        print("Не передан профиль или тег модели в аргументах запуска.")
-        sys.exit(1)
+        lease = ProfileLease(profile_id, owner=f"createpost.py {main_model_tag}")
+        try:
+            lease.acquire()
+        except ProfileBusy as e:
+            print(e)
+            events.step_finished("admission", ok=False)
+            events.error("admission", type(e).__name__, e)
+            events.emit("finished", ok=False)
+            return False
+        # Аренда продлевается, пока пост ждёт слот браузера: иначе она истечёт в долгой очереди
+        admission = BrowserAdmission(profile_id, deadline, keepalive=lease.renew)
+        try:
+            admission.acquire()
+        except BaseException:
+            lease.release()
+            raise
+        events.step_finished("admission")
+        session = BrowserSession(profile_id, lease, admission)
+    try:
+        result = publish_post(profile_id, main_model_tag, events, catalog, prepared, session)
+    finally:
+        pool.checkin(session, next_deadline)
+    if isinstance(result, ProfileMismatch):
+        # Аренда и слот первого профиля уже отпущены: профиль из API проходит
+        # обычный путь (аренда, очередь машины) с уже выбранной моделью.
+        # Браузер чужого профиля в пуле не оставляем: его следующий пост неизвестен
+        print(f"Используем профиль из API: {result.profile_id}")
+        return create_post(result.profile_id, main_model_tag, events, result.catalog, deadline, result.prepared)
+    return result
 
-    # Тут мы работаем только с тем тегом, который пришёл через аргумент!
-    onlyfans_tag = main_model_tag
 
+def prepare_post_content(onlyfans_tag, events, catalog=None, prepared=None):
+    """
+    Сетевая часть поста, не зависящая от браузера: список моделей, выбор модели по ротации,
+    текст и картинка. Возвращает словарь (profile_id из API, model, post_text, image_path)
+    или None, если публиковать нечего (ошибка уже отправлена в events).
+    """
     # Получаем данные моделей с API по правильному тегу!
-    models_data = get_models_data(onlyfans_tag)
+    events.step_started("catalog")
+    if catalog:
+        print(f"Используем список моделей от планировщика: {len(catalog.get('models', []))} моделей")
+        models_data = catalog
+    else:
+        models_data = get_models_data(onlyfans_tag)
     if not models_data or "models" not in models_data:
         print("Не удалось получить данные о моделях с API.")
-        return
+        events.step_finished("catalog", ok=False)
+        events.error("catalog", "CatalogUnavailable", "Не удалось получить данные о моделях с API")
+        return None
 
-    
-    # Используем профиль из ответа API, если доступен
-    if "requested_model_ads_id" in models_data and models_data["requested_model_ads_id"]:
-        profile_id = models_data["requested_model_ads_id"]
-        print(f"Используем профиль из API: {profile_id}")
-    
     # Получаем список моделей
     models = models_data.get("models", [])
     if not models:
         print("Список моделей пуст.")
-        return
+        events.step_finished("catalog", ok=False)
+        events.error("catalog", "EmptyCatalog", "Список моделей пуст")
+        return None
+    events.step_finished("catalog", models=len(models), cached=bool(catalog))
     
     # Вычисляем интервал между постами для равномерного распределения
     interval = calculate_post_interval(len(models))
     print(f"Рассчитан интервал между постами: {interval} секунд ({interval/60:.2f} минут)")
     
-    # Получаем случайную модель из списка
-    model = random.choice(models)
-    print(f"Выбрана случайная модель: {model['onlyfans_tag']}")
-    
-    # Проверяем URL изображения
-    image_url = model['image_url']
-    if not verify_image_url(image_url):
-        print("URL изображения недоступен, будем использовать медиа-хранилище.")
-        image_url = None
+    # Выбираем модель по ротации: за цикл каждая модель получает один пост.
+    # Если планировщик уже подготовил пост во время ожидания, берём его модель и картинку
+    if not is_prepared_valid(prepared, models):
+        prepared = None
+    if prepared:
+        model = prepared['model']
+    else:
+        model = next_model(onlyfans_tag, models)
+    remaining, total = rotation_status(onlyfans_tag)
+    print(f"Выбрана модель по ротации: {model['onlyfans_tag']} (осталось в раунде {remaining} из {total})"
+          f"{', подготовлена заранее' if prepared else ''}")
+    events.emit("model_selected", model_tag=model['onlyfans_tag'], prefetched=bool(prepared))
     
-    # Текст поста
-    post_text = model['post_text']
+    # Текст поста: без него публиковать нечего
+    post_text = model.get('post_text')
+    if not post_text:
+        print(f"У модели {model['onlyfans_tag']} нет текста поста")
+        events.error("catalog", "MissingPostText", f"У модели {model['onlyfans_tag']} нет текста поста")
+        return None
     try:
         print(f"Текст поста: {post_text[:50]}...")  # Выводим только начало для отладки
     except UnicodeEncodeError:
@@ -949,196 +1099,298 @@ def main():
         safe_text = ''.join(char if ord(char) < 128 else '?' for char in post_text[:50])
         print(f"Текст поста (без эмодзи): {safe_text}...")
     
-    # Тег модели для отметки
-    model_tag = model['onlyfans_tag']
-    print(f"Тег модели: {model_tag}")
-    
-    # Запуск браузера через AdsPower
-    print(f"Запуск браузера с профилем ID: {profile_id}")
-    driver = launch_browser_with_adspower(profile_id)
-    
-    if not driver:
-        print("Не удалось запустить браузер")
-        return
+    # Картинка берётся из локального кэша (скачивается, только если её там нет или она изменилась)
+    # и заранее уменьшается и пересохраняется для быстрой загрузки
+    if prepared:
+        image_path = prepared['image_path']
+    else:
+        try:
+            image_path = get_upload_image(model['image_url']) if model.get('image_url') else None
+        except ImageUnavailable as e:
+            # Картинки модели больше нет: это ошибка данных, планировщик пропустит модель
+            print(e)
+            events.error("catalog", "ImageUnavailable", e)
+            return None
+    if not image_path:
+        print("URL изображения недоступен, будем использовать медиа-хранилище.")
+
+    return {
+        "profile_id": models_data.get("requested_model_ads_id"),
+        "catalog": models_data,
+        "model": model,
+        "post_text": post_text,
+        "image_path": image_path,
+    }
+
+
+def open_composer(profile_id, main_model_tag, events, driver=None):
+    """
+    Запускает браузер профиля (или берёт уже открытый driver из пула) и открывает страницу создания поста.
+    Возвращает (driver, wait) или None при ошибке (она уже отправлена в events).
+    Если аккаунт разлогинен, бросает AccountLoggedOut.
+    """
+    events.step_started("launch")
+    if driver is not None:
+        events.step_finished("launch", pooled=True)
+    else:
+        # Запуск браузера через AdsPower
+        print(f"Запуск браузера с профилем ID: {profile_id}")
+        try:
+            driver = launch_browser_with_adspower(profile_id)
+        except Exception as e:
+            print(f"Ошибка при запуске браузера: {e}")
+            events.error("launch", type(e).__name__, e)
+            driver = None
+
+        if not driver:
+            print("Не удалось запустить браузер")
+            events.step_finished("launch", ok=False)
+            return None
+        events.step_finished("launch")
 
     # Открываем страницу создания поста на OnlyFans
+    load_mode = get_composer_load_mode()
+    meter = None
     try:
-        print("Открываем страницу OnlyFans...")
-        driver.get("https://onlyfans.com/posts/create")
+        events.step_started("page_load")
+        # Браузер прогрет заранее (см. prewarm): страница создания поста уже открыта
+        prewarmed = "posts/create" in driver.current_url
+        if not prewarmed:
+            # Трафик страницы считается по событиям сети, начиная с перехода на неё
+            meter = start_transfer_meter(driver)
+        started_at = time.monotonic()
+        if prewarmed:
+            print("Страница создания поста уже открыта")
+        else:
+            print("Открываем страницу OnlyFans...")
+            driver.get("https://onlyfans.com/posts/create")
         wait = WebDriverWait(driver, 30)
         print("Страница открыта успешно")
         # Проверяем, залогинен ли аккаунт, если нет — сразу логаут и выход
-        check_logged_in_or_stop(driver, main_model_tag)
+        check_logged_in_or_stop(driver, main_model_tag, events, composer_ready=load_mode == "fast")
+        duration = time.monotonic() - started_at
+        transferred, resources = page_transfer_stats(meter)
+        if transferred is not None and not prewarmed:
+            print(f"Страница готова за {duration:.1f} сек. (режим {load_mode}): "
+                  f"{transferred // 1024} КБ, ресурсов {resources}")
+            try:
+                record_page_load(load_mode, duration, transferred)
+            except Exception as stats_error:
+                print(f"Не удалось сохранить статистику загрузки страницы: {stats_error}")
+        events.step_finished("page_load", load_mode=load_mode, bytes=transferred, resources=resources)
+    except AccountLoggedOut:
+        events.step_finished("page_load", ok=False)
+        raise
     except Exception as e:
         print(f"Ошибка при открытии страницы: {e}")
+        events.step_finished("page_load", ok=False)
+        events.error("page_load", type(e).__name__, e)
         try:
             driver.quit()
         except Exception:
             pass
-        sys.exit(1)
-    
+        return None
+    finally:
+        if meter is not None:
+            meter.close()
+    return driver, wait
+
+
+def _discard_composer(composer, profile_id):
+    """
+    Дожидается запуска браузера, который уже не понадобится, и закрывает его
+    """
+    try:
+        opened = composer.result()
+    except Exception:
+        return
+    if opened:
+        close_browser(opened[0], profile_id)
+
+
+class ProfileMismatch:
+    """
+    Результат publish_post, когда API назначил тег другому профилю: пост надо публиковать
+    через profile_id с уже выбранной моделью и картинкой (prepared)
+    """
+    def __init__(self, profile_id, catalog, prepared):
+        self.profile_id = profile_id
+        self.catalog = catalog
+        self.prepared = prepared
+
+
+def publish_post(profile_id, main_model_tag, events, catalog=None, prepared=None, session=None):
+    """
+    Шаги публикации после получения слота браузера (см. create_post).
+    Запуск браузера со страницей создания поста и подготовка содержимого
+    (список моделей, модель, картинка) идут параллельно и сходятся перед вводом текста.
+    session — сессия пула: её открытый браузер используется вместо запуска,
+    а после удачного поста браузер возвращается в неё, а не закрывается.
+    Если API назначил тег другому профилю, возвращает ProfileMismatch.
+    """
+    if not main_model_tag.startswith("@"):
+        main_model_tag = "@" + main_model_tag
+
+    # Тут мы работаем только с тем тегом, который пришёл через аргумент!
+    onlyfans_tag = main_model_tag
+
+    # Браузер из пула принадлежит этому посту, пока пост не вернёт его обратно
+    pooled_driver = session.driver if session else None
+    if session:
+        session.driver = None
+
+    # Браузер запускается в отдельном потоке, пока здесь готовится содержимое поста
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="composer")
+    composer = executor.submit(open_composer, profile_id, main_model_tag, events, pooled_driver)
+    executor.shutdown(wait=False)
+    try:
+        content = prepare_post_content(onlyfans_tag, events, catalog, prepared)
+    except BaseException:
+        _discard_composer(composer, profile_id)
+        raise
+
+    try:
+        opened = composer.result()
+    except AccountLoggedOut:
+        events.emit("finished", ok=False)
+        raise
+    except Exception as e:
+        print(f"Ошибка при запуске браузера: {e}")
+        events.error("launch", type(e).__name__, e)
+        opened = None
+
+    if content is None:
+        # Публиковать нечего: браузер, если он успел открыться, закрываем
+        if opened:
+            close_browser(opened[0], profile_id)
+        events.emit("finished", ok=False)
+        return False
+
+    # Профиль из ответа API отличается от запущенного: браузер закрываем, а публикацию
+    # через профиль из API проводит create_post, отпустив аренду и слот этого профиля
+    if content['profile_id'] and content['profile_id'] != profile_id:
+        print(f"Профиль {profile_id} не совпадает с профилем из API {content['profile_id']}")
+        if opened:
+            close_browser(opened[0], profile_id)
+        chosen = {"model": content['model'], "image_path": content['image_path']}
+        return ProfileMismatch(content['profile_id'], content['catalog'], chosen)
+
+    if not opened:
+        events.emit("finished", ok=False)
+        return False
+    driver, wait = opened
+
+    model = content['model']
+    post_text = content['post_text']
+    image_path = content['image_path']
+
+    # Тег модели для отметки
+    model_tag = model['onlyfans_tag']
+    print(f"Тег модели: {model_tag}")
     
+    # Шаги редактора идут через выбранный бэкенд (selenium или cdp, см. post_steps.py)
+    steps = open_post_steps(driver, wait)
+    print(f"Бэкенд шагов редактора: {steps.name}")
+    editor_started_at = time.monotonic()
+
     # ШАГ 1: Ввод текста поста
+    events.step_started("text")
     try:
-        # Ждем появления текстового поля
-        print("Ожидание загрузки текстового поля...")
-        input_field = wait.until(EC.presence_of_element_located((
-            By.CSS_SELECTOR, 'div[contenteditable="true"][role="textbox"]'
-        )))
-        print("Текстовое поле найдено")
-        
-        # Вводим текст из API в поле ввода
-        print("Ввод текста в поле...")
-        
-        # Для contenteditable div нужно использовать JavaScript
-        driver.execute_script(
-            "arguments[0].innerHTML = arguments[1];", 
-            input_field, 
-            post_text
-        )
-        
-        print("Текст успешно введен в поле ввода")
-        
-        # Активация поля
-        driver.execute_script(
-            "arguments[0].dispatchEvent(new Event('input', { bubbles: true }));",
-            input_field
-        )
-        
-        time.sleep(2)
-        print("Текст введен и активирован")
+        steps.enter_text(post_text)
+        events.step_finished("text", backend=steps.name)
         
     except Exception as e:
         print(f"Ошибка при вводе текста поста: {e}")
-        return
+        events.step_finished("text", ok=False, backend=steps.name)
+        events.error("text", type(e).__name__, e)
+        steps.close()
+        close_browser(driver, profile_id)
+        events.emit("finished", ok=False)
+        return False
     
     # ШАГ 2: Загрузка изображения
-    if image_url:
-        upload_success = upload_image(driver, image_url, wait)
+    if image_path:
+        events.step_started("upload")
+        upload_success = steps.upload_image(image_path)
+        events.step_finished("upload", ok=upload_success, backend=steps.name)
         if not upload_success:
             print("Не удалось загрузить изображение, продолжаем без него")
 
     # ШАГ 3: Отметка модели
-    tag_success = tag_model(driver, model_tag, wait)
+    events.step_started("tag")
+    try:
+        tag_success = steps.tag_model(model_tag)
+        tag_error = None
+    except TagNotFound as e:
+        tag_success = False
+        tag_error = e
+    events.step_finished("tag", ok=tag_success, backend=steps.name)
     if not tag_success:
-        print("Не удалось отметить модель, продолжаем без отметки")
+        # Пост без отметки модели бесполезен: отменяем его. Если поиск не нашёл модель,
+        # планировщик возьмёт следующую, при сбое редактора — повторит пост
+        print("Не удалось отметить модель, пост не публикуем")
+        if tag_error is not None:
+            events.error("tag", "TagNotFound", tag_error)
+        else:
+            events.error("tag", "TagFailed", f"Не удалось отметить модель {model_tag}")
+        steps.close()
+        close_browser(driver, profile_id)
+        events.emit("finished", ok=False)
+        return False
 
     # ШАГ 3.5: Установка срока действия поста
-    expiration_success = set_post_expiration(driver, wait)
+    events.step_started("expiration")
+    expiration_success = steps.set_expiration()
+    events.step_finished("expiration", ok=expiration_success, backend=steps.name)
     if not expiration_success:
         print("Не удалось установить срок действия поста, продолжаем без установки")
 
 
     # ШАГ 4: Нажатие кнопки отправки поста
+    redirected = False
+    events.step_started("submit")
     try:
         print("Нажимаем кнопку отправки поста...")
-        
-        # Задержка для полной загрузки страницы
-        time.sleep(3)
-        
-        # Точный селектор кнопки отправки
-        exact_selector = 'button[at-attr="submit_post"]'
-        
-        # Проверяем, есть ли отключенные кнопки
-        try:
-            disabled_buttons = driver.find_elements(By.CSS_SELECTOR, exact_selector + '.m-disabled')
-            
-            if disabled_buttons:
-                print("Найдена отключенная кнопка. Ждем, пока она станет активной...")
-                # Ожидаем, пока кнопка станет активной (максимум 30 секунд)
-                wait_for_enabled = WebDriverWait(driver, 30)
-                wait_for_enabled.until_not(EC.presence_of_element_located((
-                    By.CSS_SELECTOR, exact_selector + '.m-disabled'
-                )))
-                print("Кнопка стала активной")
-        except Exception as wait_error:
-            print(f"Ошибка при ожидании активации кнопки: {wait_error}")
-        
-        # Пробуем несколько способов клика
-        successful_click = False
-        
-        # Способ 1: Прямой клик по селектору
-        try:
-            post_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, exact_selector)))
-            post_button.click()  # Прямой клик
-            print("Кнопка отправки нажата прямым кликом")
-            successful_click = True
-        except Exception as e:
-            print(f"Ошибка при прямом клике: {e}")
-            
-            # Способ 2: JavaScript клик
-            try:
-                post_button = driver.find_element(By.CSS_SELECTOR, exact_selector)
-                driver.execute_script("arguments[0].click();", post_button)
-                print("Кнопка отправки нажата через JavaScript")
-                successful_click = True
-            except Exception as js_error:
-                print(f"Ошибка при JavaScript клике: {js_error}")
-                
-                # Способ 3: По тексту кнопки
-                try:
-                    post_button = driver.find_element(By.XPATH, "//button[contains(text(), 'Post')]")
-                    driver.execute_script("arguments[0].click();", post_button)
-                    print("Кнопка отправки нажата по тексту")
-                    successful_click = True
-                except Exception as text_error:
-                    print(f"Ошибка при клике по тексту: {text_error}")
-        
-        # Если ни один метод не сработал, пробуем удалить атрибут disabled и нажать
-        if not successful_click:
-            try:
-                print("Пробуем удалить атрибут disabled и нажать кнопку...")
-                # Находим все кнопки
-                buttons = driver.find_elements(By.TAG_NAME, "button")
-                
-                for btn in buttons:
-                    try:
-                        btn_text = btn.text.strip()
-                        btn_class = btn.get_attribute('class')
-                        
-                        if "Post" in btn_text or "post" in btn_text.lower():
-                            print(f"Найдена кнопка с текстом '{btn_text}' и классом '{btn_class}'")
-                            
-                            # Удаляем атрибут disabled и класс m-disabled
-                            driver.execute_script("""
-                                arguments[0].removeAttribute('disabled');
-                                arguments[0].classList.remove('m-disabled');
-                            """, btn)
-                            
-                            # Пробуем нажать
-                            driver.execute_script("arguments[0].click();", btn)
-                            print("Кнопка отправки нажата после удаления disabled")
-                            successful_click = True
-                            break
-                    except Exception:
-                        continue
-            except Exception as disabled_error:
-                print(f"Ошибка при попытке удалить disabled: {disabled_error}")
+        successful_click, post_url = steps.submit()
         
         # Проверяем, был ли успешный клик
         if not successful_click:
             print("Не удалось нажать кнопку отправки поста")
-            return
-        
-        # Ждем перенаправления и завершения отправки
-        print("Ожидаем завершения отправки и перенаправления...")
+            events.step_finished("submit", ok=False, backend=steps.name)
+            events.error("submit", "SubmitNotClickable", "Не удалось нажать кнопку отправки поста")
+            close_browser(driver, profile_id)
+            events.emit("finished", ok=False)
+            return False
         
-        # Проверяем URL каждую секунду в течение 30 секунд
-        wait_for_redirect = WebDriverWait(driver, 30)
-        try:
-            wait_for_redirect.until(lambda d: "posts/create" not in d.current_url)
-            print(f"Обнаружено перенаправление на URL: {driver.current_url}")
-        except Exception:
+        if post_url:
+            print(f"Обнаружено перенаправление на URL: {post_url}")
+            events.emit("post_url", url=post_url)
+            redirected = True
+            try:
+                record_post(onlyfans_tag, model_tag)
+            except Exception as rotation_error:
+                print(f"Не удалось обновить ротацию моделей: {rotation_error}")
+        else:
             print("Перенаправление не обнаружено по истечении таймаута")
             # Дополнительная задержка
             time.sleep(10)
         
         print("Отправка завершена")
+        events.step_finished("submit", backend=steps.name)
+        try:
+            record_editor_run(steps.name, time.monotonic() - editor_started_at, redirected)
+        except Exception as stats_error:
+            print(f"Не удалось сохранить статистику бэкенда: {stats_error}")
         
     except Exception as e:
         print(f"Ошибка при отправке поста: {e}")
+        events.step_finished("submit", ok=False, backend=steps.name)
+        events.error("submit", type(e).__name__, e)
+    finally:
+        steps.close()
         
     # ШАГ 5: Копирование ссылки на созданный пост
+    events.step_started("link")
     try:
         print("Получаем ссылку на пост из адресной строки...")
         
@@ -1149,47 +1401,66 @@ def main():
         post_link = driver.current_url
         print(f"Текущий URL страницы: {post_link}")
         
-        # Сохраняем ссылку в БД
-        if save_post_link(post_link, profile_id):
-            print("Ссылка успешно сохранена в БД")
-        else:
-            print("Ошибка при сохранении в БД, пробуем сохранить в файл")
+        # Ставим ссылку в очередь на запись в БД (outbox), публикация Mongo не ждёт
+        try:
+            enqueue("post_link", post_url=post_link, profile_id=profile_id,
+                    onlyfans_tag=onlyfans_tag, model_tag=model_tag)
+            print("Ссылка поставлена в очередь на сохранение в БД")
+        except Exception as outbox_error:
+            print(f"Ошибка при постановке в очередь ({outbox_error}), пробуем сохранить в файл")
             # Резервное сохранение в файл
             with open("post_links.txt", 'a', encoding='utf-8') as f:
                 timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
                 f.write(f"{timestamp} - {post_link} - {profile_id}\n")
             print("Ссылка сохранена в резервный файл")
+        events.step_finished("link", url=post_link)
         
     except Exception as e:
         print(f"Ошибка при сохранении ссылки: {e}")
+        events.step_finished("link", ok=False)
+        events.error("link", type(e).__name__, e)
 
     finally:
-            print("Скрипт завершен. Закрываем браузер...")
-            try:
-                # Закрытие браузера через API AdsPower
-                if profile_id:
-                    close_api_url = f"http://localhost:50325/api/v1/browser/stop?user_id={profile_id}"
-                    print(f"Отправляем запрос на закрытие браузера: {close_api_url}")
-                    response = requests.get(close_api_url)
-                    data = json.loads(response.text)
-                    if data['code'] == 0:
-                        print(f"Браузер успешно закрыт через AdsPower API")
-                    else:
-                        print(f"Ошибка при закрытии браузера через API: {data['msg']}")
-                        print("Пробуем закрыть браузер напрямую...")
-                        driver.quit()
-                        print("Браузер закрыт через драйвер")
-                else:
-                    print("ID профиля не найден, закрываем браузер напрямую")
-                    driver.quit()
-                    print("Браузер закрыт через драйвер")
-            except Exception as e:
-                print(f"Ошибка при закрытии браузера: {e}")
-                try:
-                    driver.quit()
-                    print("Браузер закрыт через метод quit()")
-                except Exception:
-                    print("Не удалось закрыть браузер")
+            if session is not None and redirected:
+                # Браузер возвращается в сессию пула, create_post решит, держать ли его открытым
+                session.driver = driver
+            else:
+                print("Скрипт завершен. Закрываем браузер...")
+                close_browser(driver, profile_id)
+            events.emit("finished", ok=redirected)
+    return redirected
+
+
+def main():
+    load_dotenv()
+    # Машиночитаемые события для main.py; обычный лог при этом уходит в stderr
+    events = open_event_channel()
+    # При запуске из main.py очередь отправки разбирает main.py; при ручном запуске — этот процесс
+    if not os.getenv(POST_EVENTS_ENV):
+        start_sender()
+
+    # Аргумент main_model_tag — это именно основной тег, который должен идти во все запросы и во все проверки!
+    if len(sys.argv) > 2:
+        profile_id = sys.argv[1].strip()
+        main_model_tag = sys.argv[2].strip()
+    else:
+        print("Не передан профиль или тег модели в аргументах запуска.")
+        sys.exit(1)
+
+    # Необязательный третий аргумент — файл со списком моделей от main.py
+    catalog = None
+    if len(sys.argv) > 3:
+        with open(sys.argv[3], 'r', encoding='utf-8') as f:
+            catalog = json.load(f)
+    # Дедлайн слота для очереди браузеров; без него — время запуска
+    deadline = float(os.getenv("POST_DEADLINE")) if os.getenv("POST_DEADLINE") else None
+    # Пост, подготовленный main.py заранее
+    prepared = json.loads(os.getenv("POST_PREPARED")) if os.getenv("POST_PREPARED") else None
+
+    try:
+        create_post(profile_id, main_model_tag, events, catalog, deadline, prepared)
+    except AccountLoggedOut:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
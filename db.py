@@ -3,28 +3,58 @@ import os
 from dotenv import load_dotenv
 from datetime import datetime
 import pymongo
+from pymongo.errors import BulkWriteError
 
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 DB_NAME = os.getenv("DB_NAME", "onlyfans_posts")
 
-client = pymongo.MongoClient(MONGO_URI)
-db = client[DB_NAME]
-collection = db["post_links"]
+# Клиент создаётся при первом обращении и переиспользуется всеми публикациями процесса
+_client = None
 
-def save_post_link(post_url, profile_id):
+def get_collection():
+    global _client
+    if _client is None:
+        _client = pymongo.MongoClient(MONGO_URI)
+    return _client[DB_NAME]["post_links"]
+
+# Код MongoDB для повторяющегося _id
+DUPLICATE_KEY = 11000
+
+def save_post_links(documents):
+    """
+    Сохраняет пачку документов со ссылками на посты одним запросом (для outbox).
+    Возвращает по результату на документ: None — сохранён (или уже был сохранён раньше
+    с тем же _id), иначе текст ошибки. Сетевая ошибка MongoDB пробрасывается.
+    """
+    if not documents:
+        return []
+    try:
+        get_collection().insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        results = [None] * len(documents)
+        for error in e.details.get("writeErrors", []):
+            if error.get("code") != DUPLICATE_KEY:
+                results[error["index"]] = f"MongoDB: {error.get('errmsg')}"
+        return results
+    return [None] * len(documents)
+
+def save_post_link(post_url, profile_id, onlyfans_tag=None, model_tag=None):
     """
     Сохраняет ссылку на пост в MongoDB.
-    Каждый документ содержит поле post_url, profile_id и дату создания.
+    Каждый документ содержит поле post_url, profile_id, основной тег, тег продвигаемой модели
+    и дату создания. По основному тегу и тегу модели засевается ротация моделей.
     """
     try:
         document = {
             "post_url": post_url,
             "profile_id": profile_id,  # добавляем идентификатор профиля
+            "onlyfans_tag": onlyfans_tag,
+            "model_tag": model_tag,
             "created_at": datetime.utcnow()
         }
-        result = collection.insert_one(document)
+        result = get_collection().insert_one(document)
         print(f"Ссылка сохранена, id документа: {result.inserted_id}")
         return True
     except Exception as e:
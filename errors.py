@@ -0,0 +1,60 @@
+# errors.py
+
+# Классы ошибок публикации и что с ними делает планировщик:
+#   transient — сбой окружения (запуск AdsPower, таймаут, сеть): быстрый повтор с паузой
+#   content   — проблема с данными модели (нет текста, модель не находится при отметке): берём следующую модель
+#   fatal     — продолжать бессмысленно (аккаунт разлогинен): тег останавливается
+ERROR_CLASSES = ("transient", "content", "fatal")
+
+# Типы ошибок из событий error, которые не относятся к transient
+ERROR_CLASS_BY_TYPE = {
+    "AccountLoggedOut": "fatal",
+    "MissingPostText": "content",
+    "ImageUnavailable": "content",
+    "TagNotFound": "content",
+}
+
+
+class PostError(Exception):
+    """
+    Ошибка публикации с классом, по которому планировщик выбирает политику
+    """
+    error_class = "transient"
+
+
+class TransientPostError(PostError):
+    error_class = "transient"
+
+
+class ContentPostError(PostError):
+    error_class = "content"
+
+
+class FatalPostError(PostError):
+    error_class = "fatal"
+
+
+class ImageUnavailable(ContentPostError):
+    """
+    Картинки модели больше нет по её URL (404/410): пост этой модели пропускается
+    """
+
+
+class TagNotFound(ContentPostError):
+    """
+    Поиск при отметке модели отработал, но модель по тегу не нашёл: пост этой модели пропускается.
+    Остальные сбои отметки (кнопки, модальное окно) — временные
+    """
+
+
+class AccountLoggedOut(FatalPostError):
+    """
+    Аккаунт разлогинен: публикации для тега нужно остановить
+    """
+
+
+def classify_error(error_type):
+    """
+    Возвращает класс ошибки по её типу (имени исключения или коду из события error)
+    """
+    return ERROR_CLASS_BY_TYPE.get(error_type, "transient")
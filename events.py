@@ -0,0 +1,133 @@
+# events.py
+import os
+import sys
+import json
+import time
+import threading
+
+from errors import classify_error
+
+# Переменная окружения, через которую main.py включает канал событий у createpost.py
+POST_EVENTS_ENV = "POST_EVENTS"
+
+# Шаги публикации в порядке выполнения
+POST_STEPS = ("admission", "catalog", "launch", "page_load", "text", "upload", "tag", "expiration", "submit", "link")
+
+
+class EventEmitter:
+    """
+    Передаёт машиночитаемые события публикации: в поток (JSON, по одному на строку)
+    или в функцию sink (воркеры в том же процессе). Без того и другого события отбрасываются.
+    Шаги публикации могут идти в нескольких потоках, поэтому отправка событий под замком.
+    """
+    def __init__(self, stream=None, sink=None):
+        self.stream = stream
+        self.sink = sink
+        self.step_started_at = {}
+        self.lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        if self.stream is None and self.sink is None:
+            return
+        payload = {"event": event, "ts": time.time()}
+        payload.update(fields)
+        with self.lock:
+            if self.sink is not None:
+                self.sink(payload)
+            if self.stream is not None:
+                self.stream.write(json.dumps(payload, ensure_ascii=False) + "\n")
+                self.stream.flush()
+
+    def step_started(self, step):
+        self.step_started_at[step] = time.monotonic()
+        self.emit("step_started", step=step)
+
+    def step_finished(self, step, ok=True, **fields):
+        started_at = self.step_started_at.pop(step, None)
+        duration = time.monotonic() - started_at if started_at is not None else None
+        self.emit("step_finished", step=step, ok=ok, duration=duration, **fields)
+
+    def error(self, step, error_type, message, error_class=None):
+        error_class = error_class or classify_error(error_type)
+        self.emit("error", step=step, error_type=error_type, error_class=error_class, message=str(message))
+
+
+def open_event_channel():
+    """
+    Открывает канал событий в дочернем процессе createpost.py.
+    Если main.py включил события, stdout отдаётся под JSON-события,
+    а человекочитаемый лог (все print) уходит в stderr.
+    """
+    if os.getenv(POST_EVENTS_ENV) != "stdout":
+        return EventEmitter()
+    stream = sys.stdout
+    sys.stdout = sys.stderr
+    return EventEmitter(stream)
+
+
+def parse_event(line):
+    """
+    Разбирает строку канала событий. Возвращает словарь события или None
+    """
+    line = line.strip()
+    if not line.startswith("{"):
+        return None
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(event, dict) or "event" not in event:
+        return None
+    return event
+
+
+class PostResult:
+    """
+    Итог одной публикации, собранный из потока событий
+    """
+    def __init__(self):
+        self.ok = False
+        self.post_url = None
+        self.logged_out = False
+        self.model_tag = None
+        self.finished = False
+        self.hung_step = None
+        self.steps = {}
+        self.errors = []
+
+    def apply(self, event):
+        kind = event.get("event")
+        if kind == "model_selected":
+            self.model_tag = event.get("model_tag")
+        elif kind == "step_finished":
+            self.steps[event.get("step")] = {"ok": event.get("ok"), "duration": event.get("duration")}
+        elif kind == "post_url":
+            self.post_url = event.get("url")
+            self.ok = True
+        elif kind == "logout":
+            self.logged_out = True
+        elif kind == "error":
+            self.errors.append(event)
+        elif kind == "hung":
+            self.hung_step = event.get("step")
+        elif kind == "finished":
+            self.finished = True
+
+    @property
+    def last_error(self):
+        return self.errors[-1] if self.errors else None
+
+    @property
+    def error_class(self):
+        """
+        Класс ошибки, оборвавшей публикацию (transient/content/fatal).
+        None — пост удался или его исход неизвестен (например, не дождались перенаправления)
+        """
+        if self.logged_out:
+            return "fatal"
+        if self.ok or not self.errors:
+            return None
+        if self.steps.get("submit", {}).get("ok"):
+            # Кнопка отправки уже нажата: повтор может задвоить пост
+            return None
+        return self.last_error.get("error_class") or classify_error(self.last_error.get("error_type"))
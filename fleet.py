@@ -0,0 +1,208 @@
+# fleet.py
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from state import resume_tag_state, mark_slot_started, mark_slot_finished, save_tag_state
+from schedule import PostSchedule, calculate_post_interval
+from catalog import refresh_schedule
+
+# Через сколько секунд повторить слот тега, если запуск поста упал с исключением
+FLEET_RETRY_DELAY = 60
+
+
+class FleetTag:
+    """
+    Состояние одного OnlyFans тега внутри флота
+    """
+    def __init__(self, model_tag, profile_id, schedule, catalog, cycle_count=0):
+        self.model_tag = model_tag
+        self.profile_id = profile_id
+        self.schedule = schedule
+        self.catalog = catalog
+        self.cycle_count = cycle_count
+        self.stopped = False
+        self.running = False
+        # Номер актуальной записи в куче: после пересчёта сетки старые записи тега игнорируются
+        self.generation = 0
+
+
+class FleetScheduler:
+    """
+    Планировщик публикаций для множества тегов в одном процессе.
+    Все слоты лежат в одной куче таймеров, asyncio-цикл спит до ближайшего
+    слота и отдаёт пост в пул воркеров только когда слот наступил.
+    """
+    def __init__(self, model_tags, resolve_tag, run_slot, workers=None, log=print, prefetcher=None, prewarmer=None):
+        self.model_tags = model_tags
+        self.resolve_tag = resolve_tag
+        self.run_slot = run_slot
+        # Подготовка следующего поста и прогрев браузера к слоту, как в одиночном режиме (см. main.cycle)
+        self.prefetcher = prefetcher
+        self.prewarmer = prewarmer
+        self.workers = workers or int(os.getenv("FLEET_WORKERS", "4"))
+        self.log = log
+        self.heap = []
+        self.sequence = itertools.count()
+        self.running = 0
+        self.executor = None
+        self.wakeup = None
+
+    def schedule(self, fleet_tag, due):
+        fleet_tag.generation += 1
+        heapq.heappush(self.heap, (due, next(self.sequence), fleet_tag.generation, fleet_tag))
+        self.wakeup.set()
+
+    async def load_tags(self):
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*[
+            loop.run_in_executor(self.executor, self.resolve_tag, model_tag)
+            for model_tag in self.model_tags
+        ])
+        fleet_tags = []
+        for model_tag, resolved in zip(self.model_tags, results):
+            if not resolved:
+                self.log(f"⚠️ Тег {model_tag} пропущен: не удалось получить профиль или модели")
+                continue
+            profile_id, catalog = resolved
+            total_models = len(catalog.models)
+            interval = calculate_post_interval(total_models)
+            state = resume_tag_state(model_tag, interval)
+            schedule = PostSchedule.from_state(state, interval, total_models)
+            fleet_tags.append(FleetTag(model_tag, profile_id, schedule, catalog, state.get("cycle_count") or 0))
+            if self.prefetcher is not None:
+                self.prefetcher.schedule(model_tag, catalog.data, profile_id)
+            self._schedule_prewarm(fleet_tags[-1])
+        return fleet_tags
+
+    def _schedule_prewarm(self, fleet_tag):
+        if self.prewarmer is not None:
+            self.prewarmer.schedule(fleet_tag.model_tag, fleet_tag.profile_id, fleet_tag.schedule.next_deadline_wall())
+
+    async def refresh_catalogs(self, fleet_tags):
+        """
+        Периодически обновляет списки моделей тегов и пересчитывает их сетки без сброса цикла
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            active = [fleet_tag for fleet_tag in fleet_tags if not fleet_tag.stopped]
+            if not active:
+                return
+            next_refresh = min(fleet_tag.catalog.next_refresh() for fleet_tag in active)
+            await asyncio.sleep(max(0, next_refresh - time.monotonic()))
+            for fleet_tag in active:
+                if fleet_tag.stopped or not fleet_tag.catalog.refresh_due():
+                    continue
+                # Сетку меняем только в цикле событий, запрос к API — в пуле потоков
+                catalog = fleet_tag.catalog
+                try:
+                    data = await loop.run_in_executor(self.executor, catalog.fetch, fleet_tag.model_tag)
+                    changed = refresh_schedule(catalog, fleet_tag.schedule, catalog.update(data), self.log)
+                except Exception as e:
+                    self.log(f"❌ {fleet_tag.model_tag}: ошибка при обновлении списка моделей: {e}")
+                    continue
+                # Во время публикации новый дедлайн поставит сам dispatch
+                if changed and not fleet_tag.running:
+                    self.schedule(fleet_tag, fleet_tag.schedule.next_deadline())
+                    self._schedule_prewarm(fleet_tag)
+
+    async def dispatch(self, fleet_tag):
+        loop = asyncio.get_running_loop()
+        schedule = fleet_tag.schedule
+        slot = schedule.take_slot()
+        fleet_tag.running = True
+        fleet_tag.cycle_count += 1
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.log(f"[{current_time}] 🚀 {fleet_tag.model_tag}: публикация #{fleet_tag.cycle_count} (профиль {fleet_tag.profile_id}, "
+                 f"слот {slot.index + 1}/{schedule.total_slots}, опоздание {slot.lateness:.1f} сек.)")
+        if slot.skipped:
+            self.log(f"⏭️ {fleet_tag.model_tag}: пропущено просроченных слотов: {slot.skipped} (политика {schedule.policy})")
+        try:
+            mark_slot_started(fleet_tag.model_tag, fleet_tag.profile_id, fleet_tag.cycle_count,
+                              last_lateness=slot.lateness, **schedule.to_state())
+            post_success, was_logout = await loop.run_in_executor(
+                self.executor, self.run_slot, fleet_tag.profile_id, fleet_tag.model_tag, fleet_tag.cycle_count,
+                fleet_tag.catalog, schedule.to_wall(slot.deadline), schedule.next_deadline_wall()
+            )
+            mark_slot_finished(fleet_tag.model_tag, schedule.next_deadline_wall(), post_success)
+            if was_logout:
+                fleet_tag.stopped = True
+                self.log(f"🛑 {fleet_tag.model_tag}: аккаунт разлогинен, тег исключён из флота")
+                return
+            next_due = schedule.next_deadline()
+        except Exception as e:
+            self.log(f"❌ {fleet_tag.model_tag}: ошибка в слоте публикации: {e}")
+            next_due = max(schedule.next_deadline(), time.monotonic() + FLEET_RETRY_DELAY)
+            save_tag_state(fleet_tag.model_tag, in_flight=None)
+        finally:
+            fleet_tag.running = False
+            self.running -= 1
+            self.wakeup.set()
+        next_post_datetime = datetime.fromtimestamp(time.time() + max(0, next_due - time.monotonic()))
+        self.log(f"📅 {fleet_tag.model_tag}: следующий пост в {next_post_datetime.strftime('%Y-%m-%d %H:%M:%S')}")
+        self.schedule(fleet_tag, next_due)
+
+    async def run(self):
+        self.wakeup = asyncio.Event()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="fleet")
+        try:
+            fleet_tags = await self.load_tags()
+            if not fleet_tags:
+                self.log("❌ Нет ни одного тега для публикации.")
+                return
+            self.log(f"📑 Тегов во флоте: {len(fleet_tags)}, воркеров: {self.workers}")
+            for fleet_tag in fleet_tags:
+                self.schedule(fleet_tag, fleet_tag.schedule.next_deadline())
+            refresher = asyncio.create_task(self.refresh_catalogs(fleet_tags))
+
+            tasks = set()
+            while self.heap or self.running:
+                if not self.heap:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                    continue
+                due, _, generation, fleet_tag = self.heap[0]
+                if generation != fleet_tag.generation:
+                    heapq.heappop(self.heap)
+                    continue
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self.wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                heapq.heappop(self.heap)
+                self.running += 1
+                task = asyncio.create_task(self.dispatch(fleet_tag))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            refresher.cancel()
+            self.log("🛑 Во флоте не осталось активных тегов.")
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def load_fleet_tags(args):
+    """
+    Собирает список тегов флота: из аргументов, из FLEET_TAGS или из файла FLEET_TAGS_FILE
+    """
+    tags = [a.strip() for a in args if a.strip()]
+    if not tags:
+        tags = [t.strip() for t in os.getenv("FLEET_TAGS", "").split(",") if t.strip()]
+    if not tags:
+        tags_file = os.getenv("FLEET_TAGS_FILE", "fleet_tags.txt")
+        if os.path.exists(tags_file):
+            with open(tags_file, 'r', encoding='utf-8') as f:
+                tags = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    normalized = []
+    for tag in tags:
+        if not tag.startswith("@"):
+            tag = "@" + tag
+        if tag not in normalized:
+            normalized.append(tag)
+    return normalized
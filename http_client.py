@@ -0,0 +1,113 @@
+# http_client.py
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Таймауты по умолчанию (подключение, чтение), если вызов не передал свой
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+# Повторы на один запрос и ответы, при которых повтор имеет смысл
+DEFAULT_RETRIES = 2
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RetryBudget:
+    """
+    Общий бюджет повторов процесса: каждый запрос добавляет долю повтора,
+    каждый повтор её тратит. Когда сервер лежит, повторы быстро кончаются
+    и не умножают нагрузку на него.
+    """
+    def __init__(self, ratio=None, minimum=None, maximum=100):
+        self.ratio = ratio if ratio is not None else float(os.getenv("HTTP_RETRY_BUDGET_RATIO", "0.2"))
+        self.minimum = minimum if minimum is not None else float(os.getenv("HTTP_RETRY_BUDGET_MIN", "10"))
+        self.maximum = maximum
+        self.tokens = self.minimum
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.maximum, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class BudgetRetry(Retry):
+    """
+    Retry из urllib3, который перед каждым повтором списывает его из RetryBudget
+    """
+    def __init__(self, *args, budget=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.budget = budget
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.budget = self.budget
+        return retry
+
+    def increment(self, *args, **kwargs):
+        if self.budget is not None and not self.budget.withdraw():
+            # Бюджет исчерпан: ведём себя так, будто повторы кончились
+            return self.new(total=0).increment(*args, **kwargs)
+        return super().increment(*args, **kwargs)
+
+
+class HttpClient(requests.Session):
+    """
+    Общая сессия для API flowvelvet, локального API AdsPower и картинок:
+    keep-alive пул соединений на каждый хост, сжатие ответов, таймауты по умолчанию
+    и повторы в рамках общего бюджета
+    """
+    def __init__(self, retries=None, pool_size=None):
+        super().__init__()
+        self.default_timeout = (
+            float(os.getenv("HTTP_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)),
+            float(os.getenv("HTTP_READ_TIMEOUT", DEFAULT_READ_TIMEOUT)),
+        )
+        self.retry_budget = RetryBudget()
+        retries = retries if retries is not None else int(os.getenv("HTTP_RETRIES", DEFAULT_RETRIES))
+        pool_size = pool_size or int(os.getenv("HTTP_POOL_SIZE", "10"))
+        retry = BudgetRetry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=RETRY_STATUSES,
+            # POST к API не идемпотентны: повторяем только соединение, которое не удалось установить
+            allowed_methods=frozenset(["GET", "HEAD", "OPTIONS"]),
+            raise_on_status=False,
+            respect_retry_after_header=True,
+            budget=self.retry_budget,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+        self.headers["Accept-Encoding"] = "gzip, deflate"
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.default_timeout)
+        self.retry_budget.deposit()
+        return super().request(method, url, **kwargs)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http():
+    """
+    Возвращает общий на процесс HTTP-клиент (создаётся при первом обращении)
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
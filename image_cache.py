@@ -0,0 +1,266 @@
+# image_cache.py
+import os
+import time
+import hashlib
+import mimetypes
+import threading
+from urllib.parse import urlparse
+
+from state import connect
+from http_client import get_http
+from errors import ImageUnavailable
+
+# Кэш промо-картинок моделей: файлы лежат под именем sha256 содержимого,
+# индекс URL -> файл хранится в базе состояния и общий для всех процессов
+DEFAULT_IMAGE_CACHE_DIR = os.path.join("cache", "images")
+# Подготовленные к загрузке копии (см. image_prep) называются <sha256 исходника>_<размер>_q<качество>.jpg,
+# входят в размер кэша и вытесняются вместе с исходником
+DEFAULT_PREPARED_DIR = os.path.join("cache", "images", "prepared")
+DEFAULT_IMAGE_CACHE_MAX_BYTES = 500 * 1024 * 1024
+# Сколько секунд копия считается свежей; потом перепроверяется по ETag / Last-Modified
+DEFAULT_IMAGE_CACHE_TTL = 24 * 60 * 60
+CHUNK_SIZE = 64 * 1024
+# Коды ответа, означающие, что картинки по URL больше нет (в отличие от временных сбоев)
+GONE_STATUSES = (404, 410)
+
+
+def _ensure_image_table(conn):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS image_cache ("
+        "url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, path TEXT NOT NULL, size INTEGER NOT NULL, "
+        "etag TEXT, last_modified TEXT, fetched_at REAL, last_used_at REAL)"
+    )
+
+
+class ImageCache:
+    """
+    Локальный кэш картинок по URL и хэшу содержимого: условная перепроверка,
+    атомарная запись и вытеснение давно не использованных файлов по общему размеру
+    """
+    def __init__(self, directory=None, max_bytes=None, ttl=None):
+        self.directory = directory or os.getenv("IMAGE_CACHE_DIR", DEFAULT_IMAGE_CACHE_DIR)
+        self.max_bytes = max_bytes or int(os.getenv("IMAGE_CACHE_MAX_BYTES", DEFAULT_IMAGE_CACHE_MAX_BYTES))
+        self.ttl = ttl if ttl is not None else float(os.getenv("IMAGE_CACHE_TTL", DEFAULT_IMAGE_CACHE_TTL))
+        self.prepared_dir = os.getenv("IMAGE_PREPARED_DIR", DEFAULT_PREPARED_DIR)
+
+    def _prepared_files(self):
+        """
+        Подготовленные копии по хэшу исходника: {sha256: [(путь, размер), ...]}
+        """
+        prepared = {}
+        try:
+            names = os.listdir(self.prepared_dir)
+        except OSError:
+            return prepared
+        for name in names:
+            if not name.endswith(".jpg") or "_" not in name:
+                continue
+            path = os.path.join(self.prepared_dir, name)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            prepared.setdefault(name.split("_", 1)[0], []).append((path, size))
+        return prepared
+
+    def _lookup(self, url):
+        conn = connect()
+        try:
+            _ensure_image_table(conn)
+            row = conn.execute("SELECT * FROM image_cache WHERE url = ?", (url,)).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def _touch(self, url, **fields):
+        fields["last_used_at"] = time.time()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        conn = connect()
+        try:
+            conn.execute(f"UPDATE image_cache SET {assignments} WHERE url = ?", (*fields.values(), url))
+        finally:
+            conn.close()
+
+    def _extension(self, url, content_type):
+        extension = mimetypes.guess_extension((content_type or "").split(";")[0].strip()) if content_type else None
+        if not extension:
+            extension = os.path.splitext(urlparse(url).path)[1]
+        if extension in (None, "", ".jpe"):
+            extension = ".jpg"
+        return extension.lower()
+
+    def _download(self, url, response):
+        """
+        Пишет тело ответа во временный файл, считая sha256, и атомарно переносит
+        его под именем хэша. Возвращает (путь, sha256, размер)
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = os.path.join(self.directory, f".{os.getpid()}.{threading.get_ident()}.part")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            sha256 = digest.hexdigest()
+            path = os.path.join(self.directory, sha256 + self._extension(url, response.headers.get("Content-Type")))
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return os.path.abspath(path), sha256, size
+
+    def _store(self, url, path, sha256, size, response):
+        now = time.time()
+        conn = connect()
+        try:
+            _ensure_image_table(conn)
+            conn.execute(
+                "INSERT INTO image_cache (url, sha256, path, size, etag, last_modified, fetched_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(url) DO UPDATE SET "
+                "sha256 = excluded.sha256, path = excluded.path, size = excluded.size, etag = excluded.etag, "
+                "last_modified = excluded.last_modified, fetched_at = excluded.fetched_at, "
+                "last_used_at = excluded.last_used_at",
+                (url, sha256, path, size, response.headers.get("ETag"), response.headers.get("Last-Modified"), now, now)
+            )
+        finally:
+            conn.close()
+
+    def evict(self, keep=None):
+        """
+        Удаляет давно не использованные файлы вместе с их подготовленными копиями,
+        пока кэш (исходники и копии) больше max_bytes
+        """
+        conn = connect()
+        try:
+            _ensure_image_table(conn)
+            blobs = conn.execute(
+                "SELECT sha256, path, MAX(size) AS size, MAX(last_used_at) AS last_used_at "
+                "FROM image_cache GROUP BY sha256 ORDER BY last_used_at"
+            ).fetchall()
+            prepared = self._prepared_files()
+            total = sum(blob["size"] for blob in blobs)
+            total += sum(size for files in prepared.values() for _, size in files)
+            # Копии исходников, которых уже нет в индексе, не понадобятся: удаляются первыми
+            indexed = {blob["sha256"] for blob in blobs}
+            for sha256, files in prepared.items():
+                if sha256 in indexed or sha256 == keep:
+                    continue
+                for path, size in files:
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                    total -= size
+            for blob in blobs:
+                if total <= self.max_bytes:
+                    break
+                if blob["sha256"] == keep:
+                    continue
+                conn.execute("DELETE FROM image_cache WHERE sha256 = ?", (blob["sha256"],))
+                for path, size in [(blob["path"], blob["size"])] + prepared.get(blob["sha256"], []):
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                    total -= size
+        finally:
+            conn.close()
+
+    def forget(self, url):
+        """
+        Убирает URL из индекса (например, скачанный файл оказался битым), чтобы в следующий раз скачать заново.
+        Файл и его подготовленные копии удаляются, если на них не ссылается другой URL:
+        вне индекса их не учтёт и не вытеснит evict
+        """
+        conn = connect()
+        try:
+            _ensure_image_table(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT sha256, path FROM image_cache WHERE url = ?", (url,)).fetchone()
+                conn.execute("DELETE FROM image_cache WHERE url = ?", (url,))
+                shared = row is not None and conn.execute(
+                    "SELECT 1 FROM image_cache WHERE sha256 = ? LIMIT 1", (row["sha256"],)
+                ).fetchone() is not None
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        if row is None or shared:
+            return
+        prepared = [path for path, _ in self._prepared_files().get(row["sha256"], [])]
+        for path in [row["path"]] + prepared:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def get(self, url):
+        """
+        Возвращает абсолютный путь к локальной копии картинки или None, если её не получить.
+        Свежая копия отдаётся без запросов; при ошибке сети — последняя сохранённая.
+        Если картинки по URL больше нет (404/410), бросает ImageUnavailable
+        """
+        entry = self._lookup(url)
+        if entry and not os.path.exists(entry["path"]):
+            entry = None
+        if entry and time.time() - (entry["fetched_at"] or 0) < self.ttl:
+            self._touch(url)
+            return entry["path"]
+
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            with get_http().get(url, headers=headers, stream=True, timeout=15) as response:
+                if response.status_code == 304 and entry:
+                    self._touch(url, fetched_at=time.time())
+                    return entry["path"]
+                status = response.status_code
+                if status != 200:
+                    print(f"Изображение недоступно. Код ответа: {status}")
+                else:
+                    path, sha256, size = self._download(url, response)
+                    self._store(url, path, sha256, size, response)
+        except Exception as e:
+            if entry:
+                print(f"Не удалось перепроверить изображение ({e}), используем сохранённую копию")
+                self._touch(url)
+                return entry["path"]
+            print(f"Ошибка при скачивании изображения: {e}")
+            return None
+        if status in GONE_STATUSES:
+            self.forget(url)
+            raise ImageUnavailable(f"Изображение удалено с сервера (код {status}): {url}")
+        if status != 200:
+            return None
+        print(f"Изображение сохранено в кэш: {path} ({size} байт)")
+        self.evict(keep=sha256)
+        return path
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    global _image_cache
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = ImageCache()
+        return _image_cache
+
+
+def get_image(url):
+    """
+    Путь к локальной копии картинки по URL (см. ImageCache.get)
+    """
+    return get_image_cache().get(url)
@@ -0,0 +1,89 @@
+# image_prep.py
+import os
+import hashlib
+import threading
+
+from PIL import Image, ImageOps
+
+from image_cache import DEFAULT_PREPARED_DIR, get_image, get_image_cache
+
+# Картинка перед загрузкой уменьшается до этого размера по большей стороне,
+# пересохраняется в JPEG с этим качеством и без метаданных
+DEFAULT_IMAGE_MAX_DIMENSION = 2048
+DEFAULT_IMAGE_QUALITY = 85
+CHUNK_SIZE = 64 * 1024
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def prepare_image(source_path, max_dimension=None, quality=None, directory=None):
+    """
+    Готовит картинку к загрузке: проверяет, что файл читается, поворачивает по EXIF,
+    уменьшает, убирает метаданные и пересохраняет в JPEG. Результат кэшируется
+    по хэшу исходника и параметрам, поэтому одна картинка обрабатывается один раз.
+    Возвращает путь к готовому файлу или None, если исходник битый.
+    """
+    max_dimension = max_dimension or int(os.getenv("IMAGE_MAX_DIMENSION", DEFAULT_IMAGE_MAX_DIMENSION))
+    quality = quality or int(os.getenv("IMAGE_QUALITY", DEFAULT_IMAGE_QUALITY))
+    directory = directory or os.getenv("IMAGE_PREPARED_DIR", DEFAULT_PREPARED_DIR)
+
+    source_hash = _file_sha256(source_path)
+    target_path = os.path.abspath(os.path.join(directory, f"{source_hash}_{max_dimension}_q{quality}.jpg"))
+    if os.path.exists(target_path):
+        return target_path
+
+    try:
+        # verify() находит обрезанные и битые файлы, но после него картинку нужно открыть заново
+        with Image.open(source_path) as image:
+            image.verify()
+        with Image.open(source_path) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            elif image.mode != "RGB":
+                image = image.convert("RGB")
+            original_size = image.size
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+            os.makedirs(directory, exist_ok=True)
+            temp_path = f"{target_path}.{os.getpid()}.{threading.get_ident()}.part"
+            try:
+                # Метаданные (EXIF, ICC, комментарии) не передаются в save и не попадают в файл
+                image.save(temp_path, "JPEG", quality=quality, optimize=True, progressive=True)
+                os.replace(temp_path, target_path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        print(f"Изображение повреждено или не читается ({source_path}): {e}")
+        return None
+
+    source_size = os.path.getsize(source_path)
+    target_size = os.path.getsize(target_path)
+    print(f"Изображение подготовлено: {original_size[0]}x{original_size[1]} -> {image.size[0]}x{image.size[1]}, "
+          f"{source_size // 1024} КБ -> {target_size // 1024} КБ")
+    return target_path
+
+
+def get_upload_image(url):
+    """
+    Картинка модели, готовая к загрузке: из кэша картинок и после prepare_image.
+    None, если картинку не получить или она битая (тогда она будет скачана заново в следующий раз)
+    """
+    path = get_image(url)
+    if not path:
+        return None
+    prepared_path = prepare_image(path)
+    if not prepared_path:
+        get_image_cache().forget(url)
+    return prepared_path
@@ -0,0 +1,188 @@
+# leases.py
+import os
+import sys
+import time
+import uuid
+import sqlite3
+import threading
+
+from state import connect
+from errors import TransientPostError
+
+# Аренда профиля AdsPower: один профиль — один владелец на всю машину
+# (main.py, его воркеры, soft.py). Через сколько секунд брошенная аренда истекает
+DEFAULT_LEASE_TTL = 1800
+# Сколько ждать освобождения профиля, прежде чем сдаться
+DEFAULT_LEASE_WAIT = 600
+POLL_INTERVAL = 0.5
+# Отметка ожидающего считается живой столько секунд после последнего опроса
+WANTED_STALE_SECONDS = 5
+
+# Ожидающие в этом процессе просыпаются сразу при освобождении профиля,
+# ожидающие в других процессах — при следующем опросе базы
+_released = threading.Condition()
+
+
+class ProfileBusy(TransientPostError):
+    """
+    Профиль так и не освободился: его держит другая публикация
+    """
+
+
+def _ensure_lease_table(conn):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS profile_leases ("
+        "profile_id TEXT PRIMARY KEY, holder TEXT NOT NULL, owner TEXT, pid INTEGER, "
+        "acquired_at REAL, expires_at REAL)"
+    )
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(profile_leases)")}
+    if "wanted_at" not in columns:
+        try:
+            conn.execute("ALTER TABLE profile_leases ADD COLUMN wanted_at REAL")
+        except sqlite3.OperationalError as e:
+            # Колонку одновременно добавил другой поток или процесс
+            if "duplicate column" not in str(e):
+                raise
+
+
+def default_owner():
+    """
+    Кто держит профиль: имя скрипта и pid, для сообщений ожидающим
+    """
+    return f"{os.path.basename(sys.argv[0]) or 'python'} (pid {os.getpid()})"
+
+
+class ProfileLease:
+    """
+    Исключительная аренда профиля AdsPower на время публикации (и пока его браузер держит пул).
+    Второй желающий открыть тот же профиль ждёт в очереди, а не ломает чужую сессию.
+
+        with ProfileLease(profile_id, owner="main.py @tag"):
+            ... запуск браузера профиля ...
+    """
+    def __init__(self, profile_id, owner=None, ttl=None, timeout=None, log=print, announce=True):
+        self.profile_id = str(profile_id)
+        self.owner = owner or default_owner()
+        self.ttl = ttl or float(os.getenv("PROFILE_LEASE_TTL", DEFAULT_LEASE_TTL))
+        self.timeout = timeout if timeout is not None else float(os.getenv("PROFILE_LEASE_WAIT", DEFAULT_LEASE_WAIT))
+        self.log = log
+        # announce=False — не просить текущего владельца отпустить профиль (попытка «если свободен»)
+        self.announce = announce
+        self.holder = uuid.uuid4().hex
+        self.acquired = False
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    def _try_acquire(self, conn):
+        """
+        Одна попытка занять профиль. Возвращает None при успехе или текущего владельца
+        """
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM profile_leases WHERE expires_at < ?", (now,))
+            row = conn.execute(
+                "SELECT owner, expires_at FROM profile_leases WHERE profile_id = ?", (self.profile_id,)
+            ).fetchone()
+            if row is not None and self.announce:
+                # Отмечаем, что профиль кому-то нужен: владелец, который держит его про запас, отпустит его
+                conn.execute("UPDATE profile_leases SET wanted_at = ? WHERE profile_id = ?", (now, self.profile_id))
+            elif row is None:
+                conn.execute(
+                    "INSERT INTO profile_leases (profile_id, holder, owner, pid, acquired_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.profile_id, self.holder, self.owner, os.getpid(), now, now + self.ttl)
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return None if row is None else dict(row)
+
+    def acquire(self):
+        conn = connect()
+        try:
+            _ensure_lease_table(conn)
+            waited_from = time.monotonic()
+            reported = False
+            while True:
+                current = self._try_acquire(conn)
+                if current is None:
+                    self.acquired = True
+                    if reported:
+                        self.log(f"Профиль {self.profile_id} освободился через {time.monotonic() - waited_from:.0f} сек.")
+                    return
+                if not reported:
+                    self.log(f"Профиль {self.profile_id} занят ({current['owner']}), ждём освобождения")
+                    reported = True
+                if time.monotonic() - waited_from > self.timeout:
+                    raise ProfileBusy(f"Профиль {self.profile_id} занят ({current['owner']}) "
+                                      f"дольше {self.timeout:.0f} сек.")
+                with _released:
+                    _released.wait(POLL_INTERVAL)
+        finally:
+            conn.close()
+
+    def renew(self):
+        """
+        Продлевает аренду ещё на ttl секунд (для долгих публикаций)
+        """
+        if not self.acquired:
+            return
+        conn = connect()
+        try:
+            _ensure_lease_table(conn)
+            conn.execute(
+                "UPDATE profile_leases SET expires_at = ? WHERE profile_id = ? AND holder = ?",
+                (time.time() + self.ttl, self.profile_id, self.holder)
+            )
+        finally:
+            conn.close()
+
+    def contended(self):
+        """
+        Ждёт ли кто-то этот профиль прямо сейчас
+        """
+        conn = connect()
+        try:
+            _ensure_lease_table(conn)
+            row = conn.execute(
+                "SELECT wanted_at FROM profile_leases WHERE profile_id = ? AND holder = ?",
+                (self.profile_id, self.holder)
+            ).fetchone()
+        finally:
+            conn.close()
+        return bool(row and row["wanted_at"] and row["wanted_at"] > time.time() - WANTED_STALE_SECONDS)
+
+    def release(self):
+        if not self.acquired:
+            return
+        conn = connect()
+        try:
+            _ensure_lease_table(conn)
+            conn.execute(
+                "DELETE FROM profile_leases WHERE profile_id = ? AND holder = ?", (self.profile_id, self.holder)
+            )
+        finally:
+            conn.close()
+        self.acquired = False
+        with _released:
+            _released.notify_all()
+
+
+def release_process_leases(pid):
+    """
+    Освобождает профили процесса, который был убит (зависание, падение воркера)
+    """
+    conn = connect()
+    try:
+        _ensure_lease_table(conn)
+        conn.execute("DELETE FROM profile_leases WHERE pid = ?", (pid,))
+    finally:
+        conn.close()
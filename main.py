@@ -1,15 +1,30 @@
 import sys
+import asyncio
 import subprocess
 import os
 import time
-import math
-import requests
 import json
 import io
 import platform
+import atexit
+import threading
 from multiprocessing import Process
 from dotenv import load_dotenv
 from datetime import datetime
+from state import resume_tag_state, mark_slot_started, mark_slot_finished, save_tag_state
+from schedule import PostSchedule, calculate_post_interval
+from events import POST_EVENTS_ENV, PostResult, parse_event
+from catalog import ModelCatalog, refresh_schedule
+from api import get_models_data
+from outbox import enqueue, start_sender
+from prefetch import Prefetcher
+from prewarm import Prewarmer
+from composer_load import page_load_savings
+from post_steps import backend_comparison, get_post_backend
+from rotation import skip_model
+from adspower import get_adspower, get_launch_profile
+from workers import PostJob, PostWorkerPool, get_worker_mode, stop_hung_browser, release_dead_process
+from post_watchdog import PostWatchdog, hang_events
 
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace', line_buffering=True)
 sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace', line_buffering=True)
@@ -63,27 +78,6 @@ def print_error(message):
     print(f"{Colors.RED}{Colors.BOLD}{message}{Colors.RESET}")
     sys.stdout.flush()
 
-def get_models_data(onlyfans_tag):
-    try:
-        api_base_url = "https://flowvelvet.com/api/v1/sfs-models/"
-        api_url = f"{api_base_url}?onlyfans_tag={onlyfans_tag}"
-        print_info(f"Запрос к API моделей: {api_url}")
-        response = requests.get(api_url)
-        if response.status_code != 200:
-            print_error(f"Ошибка при запросе к API. Код ответа: {response.status_code}")
-            return None
-        data = response.json()
-        print_success(f"Получено {len(data.get('models', []))} моделей")
-        return data
-    except Exception as e:
-        print_error(f"Ошибка при получении данных о моделях: {e}")
-        return None
-
-def calculate_post_interval(total_models):
-    hours_24_in_seconds = 24 * 60 * 60
-    interval_seconds = math.ceil(hours_24_in_seconds / total_models)
-    return interval_seconds
-
 def format_time_duration(seconds):
     if seconds > 3600:
         hours = seconds // 3600
@@ -97,146 +91,349 @@ def format_time_duration(seconds):
     else:
         return f"{int(seconds)} сек."
 
-def run_createpost(profile_id, model_tag):
+# Сообщения о завершённых шагах публикации (см. events.POST_STEPS)
+STEP_LABELS = {
+    "catalog": "Список моделей получен",
+    "launch": "Браузер запущен",
+    "page_load": "Страница создания поста открыта, аккаунт залогинен",
+    "text": "Текст публикации введен",
+    "upload": "Изображение успешно загружено",
+    "tag": "Модель успешно отмечена в публикации",
+    "expiration": "Срок действия установлен",
+    "submit": "Кнопка публикации нажата",
+    "link": "Ссылка на публикацию сохранена",
+}
+
+def open_post_log(model_tag, profile_id):
+    """
+    Подробный лог публикаций пишется в отдельный файл на каждый тег
+    """
+    log_dir = os.getenv("POST_LOG_DIR", "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, f"{model_tag.lstrip('@')}.log")
+    log_file = open(log_path, 'a', encoding='utf-8')
+    log_file.write(f"\n===== {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | {model_tag} | профиль {profile_id} =====\n")
+    log_file.flush()
+    return log_file
+
+def print_post_event(event, model_tag):
+    kind = event.get("event")
+    if kind == "model_selected":
+        print_success(f"➤ [{model_tag}] Выбрана модель: {event.get('model_tag')}")
+    elif kind == "step_finished":
+        step = event.get("step")
+        duration = event.get("duration") or 0
+        if event.get("ok"):
+            print_success(f"➤ [{model_tag}] {STEP_LABELS.get(step, step)} ({duration:.1f} сек.)")
+            if step == "page_load" and event.get("load_mode") == "fast":
+                print_page_load_savings(model_tag)
+            if step == "submit" and event.get("backend") == "cdp":
+                print_backend_comparison(model_tag)
+        else:
+            print_warning(f"➤ [{model_tag}] Шаг {step} не выполнен ({duration:.1f} сек.)")
+    elif kind == "post_url":
+        print_success(f"➤ [{model_tag}] Публикация успешно создана! URL: {event.get('url')}")
+    elif kind == "logout":
+        print_error(f"[{model_tag}] Аккаунт разлогинен, скрипт остановлен")
+    elif kind == "error":
+        print_error(f"➤ [{model_tag}] Ошибка на шаге {event.get('step')}: {event.get('error_type')}: {event.get('message')}")
+    elif kind == "hung":
+        print_error(f"⏰ [{model_tag}] Публикация зависла на шаге {event.get('step')}, воркер остановлен, браузер закрыт")
+
+def print_page_load_savings(model_tag):
+    try:
+        savings = page_load_savings()
+    except Exception:
+        return
+    if savings:
+        print_info(f"📉 [{model_tag}] Режим fast экономит на загрузке страницы в среднем {savings['seconds']:.1f} сек. "
+                   f"и {savings['bytes'] / 1024:.0f} КБ (постов fast: {savings['fast_samples']}, full: {savings['full_samples']})")
+
+def print_backend_comparison(model_tag):
+    try:
+        comparison = backend_comparison()
+    except Exception:
+        return
+    if comparison:
+        cdp, selenium = comparison["cdp"], comparison["selenium"]
+        print_info(f"📉 [{model_tag}] Шаги редактора: cdp {cdp['duration'] or 0:.1f} сек. ({cdp['success']:.0%} успешных, "
+                   f"постов {cdp['samples']}), selenium {selenium['duration'] or 0:.1f} сек. "
+                   f"({selenium['success']:.0%} успешных, постов {selenium['samples']})")
+
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+# Подготовка следующего поста каждого тега, пока идёт ожидание слота
+prefetcher = Prefetcher(log=print_info)
+# Запуск браузера следующего профиля незадолго до его слота
+prewarmer = Prewarmer(log=print_info)
+
+def get_worker_pool():
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            _worker_pool = PostWorkerPool()
+            atexit.register(_worker_pool.shutdown)
+            print_info(f"🧵 Публикации выполняются в тёплых воркерах: режим {_worker_pool.mode}, воркеров до {_worker_pool.size}")
+        return _worker_pool
+
+def run_createpost(profile_id, model_tag, catalog=None, deadline=None, prepared=None, next_deadline=None):
+    """
+    Выполняет одну публикацию и собирает результат из потока событий.
+    Подробный лог публикации уходит в файл тега в POST_LOG_DIR.
+    catalog — уже полученный ответ /sfs-models/, чтобы публикация не запрашивала его снова.
+    deadline — unix-время слота, по нему публикация встаёт в общую очередь браузеров.
+    prepared — пост, подготовленный во время ожидания слота (prefetch).
+    next_deadline — unix-время следующего слота тега: если он близко, воркер держит браузер открытым.
+    Процесс createpost.py в режиме subprocess завершается после поста, поэтому там браузер всегда закрывается.
+    """
+    if get_worker_mode() == "subprocess":
+        return run_createpost_subprocess(profile_id, model_tag, catalog, deadline, prepared)
+    result = PostResult()
+
+    def on_event(event):
+        result.apply(event)
+        print_post_event(event, model_tag)
+
+    with open_post_log(model_tag, profile_id) as log_file:
+        log_path = log_file.name
+    get_worker_pool().run(PostJob(profile_id, model_tag, log_path, catalog, deadline, prepared, next_deadline), on_event)
+    return result
+
+def run_createpost_subprocess(profile_id, model_tag, catalog=None, deadline=None, prepared=None):
+    """
+    Запускает createpost.py отдельным процессом и собирает результат из его канала событий (stdout, JSON по строке).
+    """
     env = os.environ.copy()
     env["PYTHONIOENCODING"] = "utf-8"
     env["PYTHONUNBUFFERED"] = "1"
-    post_created = False
-    post_url = None
-    was_logout = False
-    # Передаем второй аргумент — тег модели (main_model_tag)
-    process = subprocess.Popen(
-        [sys.executable, "-u", "createpost.py", profile_id, model_tag],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        env=env,
-        universal_newlines=True,
-        encoding='utf-8',
-        errors='replace',
-        bufsize=1
-    )
-    def process_output(pipe, prefix, is_error=False):
-        nonlocal post_created, post_url, was_logout
-        for line in iter(pipe.readline, ''):
-            line = line.strip()
-            if not line:
+    env[POST_EVENTS_ENV] = "stdout"
+    if deadline:
+        env["POST_DEADLINE"] = str(deadline)
+    if prepared:
+        env["POST_PREPARED"] = json.dumps(prepared, ensure_ascii=False)
+    result = PostResult()
+    with open_post_log(model_tag, profile_id) as log_file:
+        # Передаем второй аргумент — тег модели (main_model_tag)
+        args = [sys.executable, "-u", "createpost.py", profile_id, model_tag]
+        if catalog:
+            # Список моделей передаётся файлом рядом с логом: через аргументы он не помещается
+            catalog_path = os.path.splitext(log_file.name)[0] + ".catalog.json"
+            with open(catalog_path, 'w', encoding='utf-8') as f:
+                json.dump(catalog, f, ensure_ascii=False)
+            args.append(catalog_path)
+        process = subprocess.Popen(
+            args,
+            stdout=subprocess.PIPE,
+            stderr=log_file,
+            env=env,
+            universal_newlines=True,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1
+        )
+
+        def on_hang(step):
+            process.kill()
+            stop_hung_browser(profile_id)
+
+        watchdog = PostWatchdog(on_hang=on_hang).start()
+        for line in process.stdout:
+            event = parse_event(line)
+            if event is None:
                 continue
-            if "[DEBUG]" in line or "Аккаунт разлогинен" in line or "Ошибка" in line:
-                print_error(line)
-            if "Аккаунт разлогинен" in line:
-                was_logout = True
-                print_error("Аккаунт разлогинен, скрипт остановлен")
-            if "Выбрана случайная модель:" in line:
-                model_name = line.split("Выбрана случайная модель:")[-1].strip()
-                print_success(f"➤ Выбрана модель: {model_name}")
-            elif "URL изображения" in line and "доступно" in line:
-                print_info(f"➤ {line}")
-            elif "Текст успешно введен в поле ввода" in line:
-                print_success(f"➤ Текст публикации введен")
-            elif "успешно загружено" in line and "изображение" in line.lower():
-                print_success(f"➤ Изображение успешно загружено")
-            elif "Кнопка отметки модели нажата" in line:
-                print_success(f"➤ Отметка модели активирована")
-            elif "Нажата кнопка ADD" in line:
-                print_success(f"➤ Модель успешно отмечена в публикации")
-            elif "Устанавливаем срок действия поста" in line:
-                print_info(f"➤ Устанавливаем срок действия публикации")
-            elif "Кнопка срока действия нажата" in line:
-                print_success(f"➤ Срок действия установлен")
-            elif "Нажимаем кнопку отправки поста" in line:
-                print_info(f"➤ Отправляем публикацию")
-            elif "Кнопка отправки нажата" in line:
-                print_success(f"➤ Кнопка публикации нажата")
-            elif "Обнаружено перенаправление на URL:" in line:
-                post_url = line.split("URL:")[-1].strip()
-                print_success(f"➤ Публикация успешно создана! URL: {post_url}")
-                post_created = True
-            elif is_error:
-                print_error(f"➤ {line}")
-
-    from threading import Thread
-    stdout_thread = Thread(target=process_output, args=(process.stdout, "OUT"))
-    stderr_thread = Thread(target=process_output, args=(process.stderr, "ERR", True))
-    stdout_thread.daemon = True
-    stderr_thread.daemon = True
-    stdout_thread.start()
-    stderr_thread.start()
-    process.wait()
-    stdout_thread.join(timeout=5)
-    stderr_thread.join(timeout=5)
-    return post_created, post_url, was_logout
+            watchdog.observe(event)
+            result.apply(event)
+            print_post_event(event, model_tag)
+        process.wait()
+        watchdog.stop()
+        # Процесс мог быть убит, не закрыв браузеры и не вернув слоты и аренды профилей
+        release_dead_process(process.pid)
+        if watchdog.hung_step:
+            for event in hang_events(watchdog.hung_step, watchdog.hung_timeout):
+                result.apply(event)
+                print_post_event(event, model_tag)
+        elif process.returncode and not result.logged_out:
+            print_warning(f"⚠️ [{model_tag}] createpost.py завершился с кодом {process.returncode}, подробности в {log_file.name}")
+    return result
 
 def notify_posted(onlyfans_tag):
+    # Уведомление доставит фоновый отправитель outbox, с повторами и после перезапуска
     try:
-        url = "https://flowvelvet.com/api/v1/model/posted"
-        data = {"onlyfans_tag": onlyfans_tag}
-        headers = {"Content-Type": "application/json"}
-        resp = requests.post(url, data=json.dumps(data), headers=headers, timeout=10)
-        if resp.status_code == 200:
-            print_success("🔔 Уведомление о публикации успешно отправлено!")
-        else:
-            print_warning(f"⚠️ Не удалось отправить уведомление. Код ответа: {resp.status_code}")
+        enqueue("posted", onlyfans_tag=onlyfans_tag)
+        print_success("🔔 Уведомление о публикации поставлено в очередь отправки")
     except Exception as e:
-        print_warning(f"⚠️ Ошибка отправки уведомления: {e}")
+        print_warning(f"⚠️ Ошибка постановки уведомления в очередь: {e}")
 
-def cycle(profile_id, interval, model_tag):
-    cycle_count = 0
-    try:
-        while True:
+def run_post_slot(profile_id, model_tag, cycle_count, catalog=None, deadline=None, next_deadline=None):
+    """
+    Выполняет одну публикацию и её учёт. Возвращает (post_success, was_logout).
+    Неудачный пост обрабатывается по классу ошибки, не дожидаясь следующего слота:
+    transient — повтор с растущей паузой, content — сразу следующая модель, fatal — стоп.
+    """
+    slot_start_time = time.time()
+    transient_retries = int(os.getenv("POST_RETRY_ATTEMPTS", "2"))
+    content_skips = int(os.getenv("POST_CONTENT_SKIPS", "3"))
+    backoff = float(os.getenv("POST_RETRY_BACKOFF", "15"))
+    catalog_data = catalog.data if catalog else None
+    prepared = prefetcher.take(model_tag, catalog_data)
+    attempt = 0
+    while True:
+        attempt += 1
+        result = run_createpost(profile_id, model_tag, catalog_data, deadline, prepared, next_deadline)
+        error_class = result.error_class
+        if result.ok or error_class in (None, "fatal"):
+            break
+        error = result.last_error or {}
+        print_warning(f"⚠️ [{model_tag}] Попытка {attempt} не удалась ({error_class}): {error.get('error_type')} на шаге {error.get('step')}")
+        if error_class == "transient" and transient_retries > 0:
+            transient_retries -= 1
+            print_info(f"🔁 [{model_tag}] Повтор через {backoff:.0f} сек.")
+            time.sleep(backoff)
+            backoff *= 2
+            continue
+        if error_class == "content" and content_skips > 0 and result.model_tag:
+            content_skips -= 1
+            skip_model(model_tag, result.model_tag)
+            prepared = None
+            print_info(f"⏭️ [{model_tag}] Модель {result.model_tag} пропущена до следующего раунда, берём следующую")
+            continue
+        break
+    post_success, post_url, was_logout = result.ok, result.post_url, result.logged_out
+    if was_logout:
+        prewarmer.cancel(model_tag)
+        return post_success, was_logout
+    if catalog_data:
+        # Пока тег ждёт следующий слот, готовим следующий пост
+        prefetcher.schedule(model_tag, catalog_data, profile_id)
+    prewarmer.schedule(model_tag, profile_id, next_deadline)
+    elapsed_time = time.time() - slot_start_time
+    if post_success:
+        print_success(f"✅ Публикация #{cycle_count} для {model_tag} успешно создана! Операция заняла {elapsed_time:.2f} секунд.")
+        if post_url:
+            with open("successful_posts.txt", 'a', encoding='utf-8') as f:
+                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                f.write(f"{timestamp} | #{cycle_count} | {post_url} | {profile_id}\n")
+            notify_posted(model_tag)
+    else:
+        print_warning(f"⚠️ Публикация #{cycle_count} для {model_tag} возможно создана с ошибками. Операция заняла {elapsed_time:.2f} секунд.")
+    return post_success, was_logout
+
+def wait_until(deadline):
+    """
+    Ждёт наступления дедлайна по монотонным часам, показывая прогресс
+    """
+    wait_time = deadline - time.monotonic()
+    if wait_time <= 0:
+        return
+    if wait_time > 10:
+        progress_interval = 10
+        remaining = wait_time
+        while remaining > 0:
+            time.sleep(min(progress_interval, remaining))
+            remaining = max(0, deadline - time.monotonic())
+            progress_percent = int(((wait_time - remaining) / wait_time) * 100)
+            remaining_time = format_time_duration(remaining)
+            print(f"\r{Colors.BLUE}⏳ Прогресс: {progress_percent}% | Осталось: {remaining_time}{Colors.RESET}", end='')
+            sys.stdout.flush()
+        print()
+    else:
+        time.sleep(wait_time)
+
+def print_next_post(schedule):
+    wait_time = max(0, schedule.seconds_until_next())
+    next_post_datetime = datetime.fromtimestamp(schedule.next_deadline_wall()).strftime("%Y-%m-%d %H:%M:%S")
+    print_info(f"⏳ Ожидание {format_time_duration(wait_time)} до следующего поста.")
+    print_info(f"📅 Следующий пост будет опубликован в {next_post_datetime}")
+    sys.stdout.flush()
+
+def print_slot_lateness(slot, schedule):
+    if slot.skipped:
+        print_warning(f"⏭️ Пропущено просроченных слотов: {slot.skipped} (политика {schedule.policy})")
+    if slot.lateness >= 1:
+        print_warning(f"⏱️ Слот {slot.index + 1}/{schedule.total_slots} запущен с опозданием {format_time_duration(slot.lateness)} "
+                      f"(среднее {schedule.average_lateness():.1f} сек., максимум {schedule.lateness_max:.1f} сек.)")
+
+def cycle(profile_id, model_tag, catalog):
+    # Состояние цикла хранится в локальной базе, поэтому перезапуск продолжает с того же места
+    total_models = len(catalog.models)
+    interval = calculate_post_interval(total_models)
+    state = resume_tag_state(model_tag, interval)
+    cycle_count = state.get("cycle_count") or 0
+    schedule = PostSchedule.from_state(state, interval, total_models)
+    if state:
+        print_info(f"♻️ Восстановлено состояние {model_tag}: публикаций {cycle_count}")
+        print_next_post(schedule)
+    prefetcher.schedule(model_tag, catalog.data, profile_id)
+    prewarmer.schedule(model_tag, profile_id, schedule.next_deadline_wall())
+    while True:
+        try:
+            # Пока ждём слот, список моделей периодически обновляется, а сетка подстраивается под него
+            if catalog.next_refresh() < schedule.next_deadline():
+                wait_until(catalog.next_refresh())
+                if refresh_schedule(catalog, schedule, catalog.refresh(), print_info):
+                    print_next_post(schedule)
+                    prewarmer.schedule(model_tag, profile_id, schedule.next_deadline_wall())
+                continue
+            wait_until(schedule.next_deadline())
+            slot = schedule.take_slot()
             cycle_count += 1
-            cycle_start_time = time.time()
             current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             print(f"\n{Colors.HEADER}{Colors.BOLD}[{current_time}] 🚀 ЗАПУСК ПУБЛИКАЦИИ #{cycle_count}{Colors.RESET}")
             print(f"{Colors.BLUE}Профиль: {profile_id}{Colors.RESET}")
+            print_slot_lateness(slot, schedule)
             sys.stdout.flush()
+            mark_slot_started(model_tag, profile_id, cycle_count, last_lateness=slot.lateness, **schedule.to_state())
             # Передаем оба параметра!
-            post_success, post_url, was_logout = run_createpost(profile_id, model_tag)
+            post_success, was_logout = run_post_slot(
+                profile_id, model_tag, cycle_count, catalog, schedule.to_wall(slot.deadline),
+                schedule.next_deadline_wall()
+            )
+            mark_slot_finished(model_tag, schedule.next_deadline_wall(), post_success)
             if was_logout:
                 print_error("Аккаунт разлогинен, скрипт остановлен")
                 sys.exit(1)
-            post_created_time = time.time()
-            elapsed_time = post_created_time - cycle_start_time
-            wait_time = max(0, interval - elapsed_time)
-            if post_success:
-                print_success(f"✅ Публикация #{cycle_count} успешно создана! Операция заняла {elapsed_time:.2f} секунд.")
-                if post_url:
-                    with open("successful_posts.txt", 'a', encoding='utf-8') as f:
-                        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        f.write(f"{timestamp} | #{cycle_count} | {post_url} | {profile_id}\n")
-                    notify_posted(model_tag)
-            else:
-                print_warning(f"⚠️ Публикация #{cycle_count} возможно создана с ошибками. Операция заняла {elapsed_time:.2f} секунд.")
-            wait_message = format_time_duration(wait_time)
-            next_post_time = datetime.now().timestamp() + wait_time
-            next_post_datetime = datetime.fromtimestamp(next_post_time).strftime("%Y-%m-%d %H:%M:%S")
-            print_info(f"⏳ Ожидание {wait_message} до следующего поста.")
-            print_info(f"📅 Следующий пост будет опубликован в {next_post_datetime}")
-            sys.stdout.flush()
-            if wait_time > 0:
-                if wait_time > 10:
-                    progress_interval = 10
-                    elapsed_wait = 0
-                    while elapsed_wait < wait_time:
-                        wait_step = min(progress_interval, wait_time - elapsed_wait)
-                        time.sleep(wait_step)
-                        elapsed_wait += wait_step
-                        progress_percent = int((elapsed_wait / wait_time) * 100)
-                        remaining_time = format_time_duration(wait_time - elapsed_wait)
-                        print(f"\r{Colors.BLUE}⏳ Прогресс: {progress_percent}% | Осталось: {remaining_time}{Colors.RESET}", end='')
-                        sys.stdout.flush()
-                    print()
-                else:
-                    time.sleep(wait_time)
+            print_next_post(schedule)
             print_info(f"♻️ Цикл для профиля {profile_id} продолжается...\n")
-            sys.stdout.flush()
-    except KeyboardInterrupt:
-        print_warning("\n⛔ Работа скрипта прервана пользователем. Завершение...")
-    except Exception as e:
-        print_error(f"\n❌ Произошла ошибка в цикле: {e}")
-        print_warning("🔄 Пытаемся перезапустить цикл через 60 секунд...")
-        time.sleep(60)
-        cycle(profile_id, interval, model_tag)
+        except KeyboardInterrupt:
+            print_warning("\n⛔ Работа скрипта прервана пользователем. Завершение...")
+            return
+        except Exception as e:
+            print_error(f"\n❌ Произошла ошибка в цикле: {e}")
+            print_warning("🔄 Пытаемся продолжить цикл через 60 секунд...")
+            save_tag_state(model_tag, in_flight=None)
+            time.sleep(60)
+
+
+def resolve_profile_and_models(model_tag):
+    """
+    Получает профиль AdsPower и список моделей тега. Возвращает (profile_id, catalog) или None
+    """
+    catalog = ModelCatalog(model_tag, get_models_data)
+    if catalog.refresh() is None:
+        print_error(f"❌ Не удалось получить данные о моделях с API для {model_tag} или список моделей пуст.")
+        return None
+    profile_id = None
+    if catalog.profile_id:
+        profile_id = catalog.profile_id
+        print_info(f"👤 Используется профиль из API: {profile_id}")
+    else:
+        profiles_str = os.getenv("ADSPOWER_PROFILE_ID", "").strip()
+        profiles = [p.strip() for p in profiles_str.split(",") if p.strip()]
+        if profiles:
+            profile_id = profiles[0]
+            print_info(f"👤 Используется профиль из .env: {profile_id}")
+    if not profile_id:
+        print_error(f"❌ Не удалось определить ID профиля AdsPower для {model_tag}. Проверьте API или укажите его в .env файле.")
+        return None
+    return profile_id, catalog
 
+def run_fleet(model_tags):
+    from fleet import FleetScheduler
+    print_info(f"🏷️ Флот из {len(model_tags)} тегов: {', '.join(model_tags)}")
+    print_subheader("🚀 ЗАПУСК ФЛОТА ПУБЛИКАЦИЙ")
+    scheduler = FleetScheduler(model_tags, resolve_profile_and_models, run_post_slot, log=print_info,
+                               prefetcher=prefetcher, prewarmer=prewarmer)
+    asyncio.run(scheduler.run())
 
 def main():
     try:
@@ -244,6 +441,25 @@ def main():
         start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         print_info(f"⏰ Время запуска: {start_time}")
         load_dotenv()
+        # Фоновая доставка уведомлений, логаутов и ссылок на посты (в том числе оставшихся с прошлого запуска)
+        start_sender(log=print_info)
+        # AdsPower должен быть запущен до первого поста, иначе все запуски браузера будут падать
+        health = get_adspower().health()
+        if health["ok"]:
+            print_info(f"🧭 AdsPower доступен ({health['latency'] * 1000:.0f} мс)")
+        else:
+            print_warning(f"⚠️ AdsPower недоступен: {health['error']}")
+        print_info(f"🖥️ Профиль запуска браузеров: {get_launch_profile('POST_LAUNCH_PROFILE')}, "
+                   f"шаги редактора: {get_post_backend()}")
+        # Режим флота: python main.py --fleet [@tag1 @tag2 ...]
+        if len(sys.argv) > 1 and sys.argv[1].strip() == "--fleet":
+            from fleet import load_fleet_tags
+            model_tags = load_fleet_tags(sys.argv[2:])
+            if not model_tags:
+                print_error("❌ Не переданы теги для флота! Используй: python main.py --fleet @tag1 @tag2 или FLEET_TAGS / fleet_tags.txt")
+                sys.exit(1)
+            run_fleet(model_tags)
+            return
         # <--- Вот эта часть для работы с аргументом --->
         model_tag = None
         if len(sys.argv) > 1 and sys.argv[1].strip():
@@ -259,28 +475,11 @@ def main():
         print_info(f"🏷️ Используется OnlyFans тег: {model_tag}")
 
         # --------------------------------------------------
-        models_data = get_models_data(model_tag)
-        if not models_data or "models" not in models_data:
-            print_error("❌ Не удалось получить данные о моделях с API.")
-            return
-        profile_id = None
-        if "requested_model_ads_id" in models_data and models_data["requested_model_ads_id"]:
-            profile_id = models_data["requested_model_ads_id"]
-            print_info(f"👤 Используется профиль из API: {profile_id}")
-        else:
-            profiles_str = os.getenv("ADSPOWER_PROFILE_ID", "").strip()
-            profiles = [p.strip() for p in profiles_str.split(",") if p.strip()]
-            if profiles:
-                profile_id = profiles[0]
-                print_info(f"👤 Используется профиль из .env: {profile_id}")
-        if not profile_id:
-            print_error("❌ Не удалось определить ID профиля AdsPower. Проверьте API или укажите его в .env файле.")
-            return
-        models = models_data.get("models", [])
-        total_models = len(models)
-        if total_models == 0:
-            print_error("❌ Список моделей пуст. Нечего публиковать.")
+        resolved = resolve_profile_and_models(model_tag)
+        if not resolved:
             return
+        profile_id, catalog = resolved
+        total_models = len(catalog.models)
         interval = calculate_post_interval(total_models)
         minutes = interval / 60
         hours = minutes / 60
@@ -289,7 +488,7 @@ def main():
         print_info(f"⏱️ Рассчитан интервал между постами: {interval} секунд ({minutes:.2f} минут или {hours:.2f} часов)")
         print_info(f"📣 При таком интервале все {total_models} постов будут опубликованы за 24 часа.")
         print_subheader(f"🚀 ЗАПУСК ЦИКЛА ПУБЛИКАЦИЙ")
-        cycle(profile_id, interval, model_tag)
+        cycle(profile_id, model_tag, catalog)
     except KeyboardInterrupt:
         print_warning("\n⛔ Работа скрипта прервана пользователем. Завершение...")
     except Exception as e:
@@ -0,0 +1,268 @@
+# outbox.py
+import os
+import json
+import time
+import uuid
+import atexit
+import threading
+from datetime import datetime
+
+from state import connect
+
+# Сколько записей отправитель забирает за один проход
+DEFAULT_BATCH_SIZE = 50
+# Паузы между повторами: 30 сек., 1 мин., 2 мин. ... но не больше часа
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 3600
+# На сколько секунд процесс-отправитель забирает записи себе
+CLAIM_SECONDS = 120
+
+
+def _ensure_outbox_table(conn):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS outbox ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "kind TEXT NOT NULL, "
+        "payload TEXT NOT NULL, "
+        "attempts INTEGER NOT NULL DEFAULT 0, "
+        "next_attempt_at REAL NOT NULL, "
+        "created_at REAL NOT NULL, "
+        "last_error TEXT, "
+        "claimed_by TEXT, "
+        "claimed_until REAL)"
+    )
+
+
+def _deliver_posted(payload):
+    # Ключ delivery_id передаётся серверу как ключ идемпотентности. Если сервер его
+    # не учитывает, /model/posted доставляется как минимум один раз: ответ, потерянный
+    # по таймауту после того, как сервер уже засчитал пост, приведёт к повтору
+    from api import notify_posted
+    response = notify_posted(payload["onlyfans_tag"], payload["delivery_id"])
+    return None if response.status_code == 200 else f"код ответа {response.status_code}"
+
+
+def _deliver_logout(payload):
+    from api import send_logout
+    response = send_logout(payload["onlyfans_tag"])
+    return None if response.status_code < 500 else f"код ответа {response.status_code}"
+
+
+def _deliver_post_links(payloads):
+    from db import save_post_links
+    documents = []
+    for payload in payloads:
+        document = dict(payload)
+        # Повторная отправка той же записи не создаёт второй документ: _id постоянный
+        document["_id"] = document.pop("delivery_id")
+        document["created_at"] = datetime.utcfromtimestamp(payload["created_at"])
+        documents.append(document)
+    return save_post_links(documents)
+
+
+# Обработчик одной записи: получает payload и возвращает None (доставлено) или текст ошибки
+HANDLERS = {
+    "posted": _deliver_posted,
+    "logout": _deliver_logout,
+}
+# Обработчики пачкой: получают список payload одного вида и возвращают по результату на каждый
+BATCH_HANDLERS = {
+    "post_link": _deliver_post_links,
+}
+
+
+def enqueue(kind, **payload):
+    """
+    Кладёт запись в исходящую очередь. Запись хранится в базе состояния,
+    пока отправитель (в этом или другом процессе) её не доставит.
+    """
+    if kind not in HANDLERS and kind not in BATCH_HANDLERS:
+        raise ValueError(f"Неизвестный вид записи outbox: {kind}")
+    now = time.time()
+    payload.setdefault("created_at", now)
+    # Ключ записи для получателя: по нему повторная доставка распознаётся как дубликат
+    payload.setdefault("delivery_id", uuid.uuid4().hex)
+    conn = connect()
+    try:
+        _ensure_outbox_table(conn)
+        conn.execute(
+            "INSERT INTO outbox (kind, payload, next_attempt_at, created_at) VALUES (?, ?, ?, ?)",
+            (kind, json.dumps(payload, ensure_ascii=False), now, now)
+        )
+    finally:
+        conn.close()
+    if _sender is not None:
+        _sender.wakeup.set()
+
+
+def pending_count():
+    conn = connect()
+    try:
+        _ensure_outbox_table(conn)
+        return conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+    finally:
+        conn.close()
+
+
+class OutboxSender:
+    """
+    Фоновый отправитель: забирает созревшие записи пачками, доставляет их
+    и переносит неудачные на потом с растущей паузой
+    """
+    def __init__(self, batch_size=None, log=print):
+        self.batch_size = batch_size or int(os.getenv("OUTBOX_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+        self.log = log
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True, name="outbox")
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+
+    def _claim(self, conn):
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, kind, payload, attempts, created_at FROM outbox "
+                "WHERE next_attempt_at <= ? AND (claimed_until IS NULL OR claimed_until < ?) "
+                "ORDER BY next_attempt_at LIMIT ?",
+                (now, now, self.batch_size)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET claimed_by = ?, claimed_until = ? WHERE id = ?",
+                [(self.owner, now + CLAIM_SECONDS, row["id"]) for row in rows]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _extend_claim(self, conn):
+        """
+        Продлевает захват ещё не обработанных записей: долгая доставка пачки
+        не отдаёт их другому процессу посреди отправки
+        """
+        conn.execute("UPDATE outbox SET claimed_until = ? WHERE claimed_by = ?",
+                     (time.time() + CLAIM_SECONDS, self.owner))
+
+    def _deliver_kind(self, conn, kind, kind_rows):
+        """
+        Доставляет записи одного вида, возвращает по результату (None или текст ошибки) на каждую
+        """
+        payloads = [json.loads(row["payload"]) for row in kind_rows]
+        for payload, row in zip(payloads, kind_rows):
+            # Записи, поставленные до появления delivery_id
+            payload.setdefault("delivery_id", f"outbox-{row['id']}-{row['created_at']}")
+        if kind in BATCH_HANDLERS:
+            self._extend_claim(conn)
+            try:
+                return BATCH_HANDLERS[kind](payloads)
+            except Exception as e:
+                return [f"{type(e).__name__}: {e}"] * len(kind_rows)
+        errors = []
+        for payload in payloads:
+            self._extend_claim(conn)
+            try:
+                errors.append(HANDLERS[kind](payload))
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+        return errors
+
+    def deliver_due(self):
+        """
+        Один проход: доставляет созревшие записи. Возвращает число доставленных
+        """
+        conn = connect()
+        try:
+            _ensure_outbox_table(conn)
+            rows = self._claim(conn)
+            by_kind = {}
+            for row in rows:
+                by_kind.setdefault(row["kind"], []).append(row)
+            delivered = 0
+            for kind, kind_rows in by_kind.items():
+                errors = self._deliver_kind(conn, kind, kind_rows)
+                for row, error in zip(kind_rows, errors):
+                    if error is None:
+                        conn.execute("DELETE FROM outbox WHERE id = ?", (row["id"],))
+                        delivered += 1
+                        continue
+                    attempts = row["attempts"] + 1
+                    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempts - 1))
+                    conn.execute(
+                        "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ?, "
+                        "claimed_by = NULL, claimed_until = NULL WHERE id = ?",
+                        (attempts, time.time() + delay, error, row["id"])
+                    )
+                    self.log(f"Outbox: {kind} #{row['id']} не доставлен ({error}), попытка {attempts}, повтор через {delay} сек.")
+            return delivered
+        finally:
+            conn.close()
+
+    def next_due_in(self):
+        conn = connect()
+        try:
+            _ensure_outbox_table(conn)
+            row = conn.execute("SELECT MIN(next_attempt_at) FROM outbox").fetchone()
+        finally:
+            conn.close()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                self.deliver_due()
+                wait = self.next_due_in()
+            except Exception as e:
+                self.log(f"Outbox: ошибка отправителя: {e}")
+                wait = RETRY_BASE_DELAY
+            # Записи других процессов тоже нужно подхватывать, поэтому спим не дольше минуты
+            self.wakeup.wait(timeout=min(wait if wait is not None else 60, 60))
+            self.wakeup.clear()
+
+    def flush(self, timeout):
+        """
+        Пытается доставить всё созревшее до выхода из процесса, не дольше timeout секунд
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if not self.deliver_due():
+                    return
+            except Exception as e:
+                self.log(f"Outbox: ошибка при отправке перед выходом: {e}")
+                return
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def start_sender(log=print):
+    """
+    Запускает фоновый отправитель в этом процессе (один на процесс).
+    Перед выходом процесса созревшие записи отправляются ещё раз.
+    """
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = OutboxSender(log=log).start()
+            atexit.register(_flush_on_exit)
+        return _sender
+
+
+def _flush_on_exit():
+    if _sender is None:
+        return
+    _sender.stop()
+    _sender.flush(float(os.getenv("OUTBOX_FLUSH_TIMEOUT", "15")))
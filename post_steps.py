@@ -0,0 +1,455 @@
+# post_steps.py
+import os
+import time
+from abc import ABC, abstractmethod
+
+from state import connect
+from errors import TagNotFound
+
+# Бэкенды шагов редактора поста:
+#   selenium — как раньше, каждое действие через chromedriver
+#   cdp      — напрямую по Chrome DevTools Protocol: Input.insertText для текста с эмодзи,
+#              DOM.setFileInputFiles для картинки, Runtime.evaluate для кликов (как действие пользователя),
+#              события страницы вместо опроса и пауз
+POST_BACKENDS = ("selenium", "cdp")
+DEFAULT_POST_BACKEND = "selenium"
+# Сколько последних постов каждого бэкенда учитывать при сравнении
+STATS_WINDOW = 200
+
+TEXTBOX = 'div[contenteditable="true"][role="textbox"]'
+SUBMIT_BUTTON = 'button[at-attr="submit_post"]'
+MODAL = ".modal.show"
+ATTACH_BUTTONS = ["#attach_file_photo", ".attach_file"]
+TAG_BUTTON = "#make_post_form > div.b-make-post__sticky-panel > div > div.b-make-post__actions__btns > button:nth-child(6)"
+TAG_SEARCH_BUTTONS = [
+    "#ReleaseFormsModal___BV_modal_header_ .b-content-filter__group-btns > button",
+    ".modal-header button",
+    "#ReleaseFormsModal button.g-page__header__btn",
+    ".modal-content button.b-btn--search",
+]
+TAG_SEARCH_INPUTS = [
+    ".modal-content input.b-search-form__input",
+    ".modal-content input[type='search']",
+    "input[placeholder='Search release form or user...']",
+]
+TAG_RESULTS = [".modal-content input[type='checkbox']", ".b-rows-lists__item", ".modal-content label"]
+TAG_ADD_BUTTONS = [
+    "#ReleaseFormsModal___BV_modal_body_ .b-row-selected__controls > button",
+    "button.g-btn.m-rounded",
+    ".modal-footer button",
+    "button.btn-primary",
+]
+EXPIRATION_BUTTONS = [
+    "button.b-make-post__expire-period-btn",
+    ".b-make-post__actions__btns button[title*='xpiration']",
+    ".b-make-post__actions__btns button[at-attr='expiration']",
+    ".b-make-post__actions__btns > button:nth-of-type(7)",
+]
+EXPIRATION_TABS = [
+    "#ModalPostExpiration___BV_modal_body_ li:nth-child(2) button",
+    ".modal-content .b-tabs__nav li:nth-child(2) button",
+    ".modal-body .b-tabs__nav button:nth-of-type(2)",
+]
+EXPIRATION_APPLY_BUTTONS = [
+    "#ModalPostExpiration___BV_modal_footer_ > button:nth-child(2)",
+    ".modal-footer button:nth-child(2)",
+    ".modal-footer button.btn-primary",
+    ".modal-footer button.g-btn--primary",
+]
+# Запросы, которых ждём после загрузки картинки и поиска модели
+NETWORK_EVENTS = ("Network.requestWillBeSent", "Network.loadingFinished", "Network.loadingFailed")
+# Сколько ждать начала запроса, прежде чем считать, что его не будет
+REQUEST_START_TIMEOUT = 5
+UPLOAD_TIMEOUT = 120
+
+# Первый элемент по списку селекторов, иначе первая кнопка с одним из текстов
+FIND_JS = """(selectors, texts) => {
+    for (const selector of selectors) {
+        const element = document.querySelector(selector);
+        if (element) return element;
+    }
+    for (const button of document.querySelectorAll('button')) {
+        if (texts.some(text => button.textContent.includes(text))) return button;
+    }
+    return null;
+}"""
+
+
+def get_post_backend():
+    backend = os.getenv("POST_DRIVER_BACKEND", DEFAULT_POST_BACKEND)
+    if backend not in POST_BACKENDS:
+        raise ValueError(f"Неизвестный POST_DRIVER_BACKEND: {backend}. Допустимо: {', '.join(POST_BACKENDS)}")
+    return backend
+
+
+class PostSteps(ABC):
+    """
+    Шаги редактора поста, одинаковые для всех бэкендов. enter_text при ошибке бросает исключение,
+    upload_image, tag_model и set_expiration возвращают True/False
+    (tag_model бросает TagNotFound, если поиск отработал и не нашёл модель),
+    submit — (нажата ли кнопка, ссылка на пост или None, если перехода со страницы не было).
+    Бэкенд без какого-либо из шагов не создаётся (TypeError)
+    """
+    name = None
+
+    @abstractmethod
+    def enter_text(self, text):
+        pass
+
+    @abstractmethod
+    def upload_image(self, image_path):
+        pass
+
+    @abstractmethod
+    def tag_model(self, model_tag):
+        pass
+
+    @abstractmethod
+    def set_expiration(self):
+        pass
+
+    @abstractmethod
+    def submit(self, timeout=30):
+        pass
+
+    def close(self):
+        pass
+
+
+class CdpPostSteps(PostSteps):
+    """
+    Шаги редактора по CDP во вкладке, открытой драйвером. Ожидания — события страницы:
+    MutationObserver в странице для элементов, события Network для загрузок и поиска,
+    Page.fileChooserOpened для выбора файла и события навигации для перехода после отправки
+    """
+    name = "cdp"
+
+    def __init__(self, tab):
+        self.tab = tab
+        self.tab.send("Page.enable")
+        self.tab.send("Network.enable")
+
+    def _click(self, selectors, texts=()):
+        return self.tab.call("""(selectors, texts) => {
+            const element = (%s)(selectors, texts);
+            if (!element) return false;
+            element.scrollIntoView({block: 'center'});
+            element.click();
+            return true;
+        }""" % FIND_JS, selectors, list(texts), user_gesture=True)
+
+    def _wait_for(self, selectors, timeout, gone=False):
+        """
+        Ждёт появления (gone=True — исчезновения) элемента по MutationObserver в странице
+        """
+        return self.tab.call("""(selectors, timeout, gone) => new Promise(resolve => {
+            const find = %s;
+            const ready = () => (find(selectors, []) !== null) !== gone;
+            if (ready()) return resolve(true);
+            const observer = new MutationObserver(() => {
+                if (!ready()) return;
+                observer.disconnect();
+                clearTimeout(timer);
+                resolve(true);
+            });
+            const timer = setTimeout(() => { observer.disconnect(); resolve(false); }, timeout * 1000);
+            observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true});
+        })""" % FIND_JS, selectors, timeout, gone, await_promise=True, timeout=timeout + 5)
+
+    def _focus(self, selectors):
+        """
+        Фокусирует поле и выделяет его содержимое, чтобы ввод заменил его
+        """
+        return self.tab.call("""(selectors) => {
+            const element = (%s)(selectors, []);
+            if (!element) return false;
+            element.focus();
+            if (element.select) {
+                element.select();
+            } else {
+                const range = document.createRange();
+                range.selectNodeContents(element);
+                const selection = window.getSelection();
+                selection.removeAllRanges();
+                selection.addRange(range);
+            }
+            return true;
+        }""" % FIND_JS, selectors)
+
+    @staticmethod
+    def _is_upload(params):
+        """
+        Запрос загрузки файла: XHR/fetch с телом multipart/form-data или PUT с телом
+        """
+        if params.get("type") not in ("XHR", "Fetch"):
+            return False
+        request = params.get("request", {})
+        headers = {key.lower(): value for key, value in request.get("headers", {}).items()}
+        if "multipart/form-data" in headers.get("content-type", ""):
+            return True
+        return request.get("method") == "PUT" and bool(request.get("hasPostData"))
+
+    def _press_enter(self):
+        key = {"key": "Enter", "code": "Enter", "windowsVirtualKeyCode": 13, "nativeVirtualKeyCode": 13}
+        self.tab.send("Input.dispatchKeyEvent", dict(key, type="keyDown", text="\r"))
+        self.tab.send("Input.dispatchKeyEvent", dict(key, type="keyUp"))
+
+    def _wait_for_request(self, events, match, start_timeout, timeout):
+        """
+        Ждёт в подписке events первый запрос, подходящий под match(params события
+        Network.requestWillBeSent), и его завершение. Остальные запросы страницы не учитываются.
+        True — запрос завершился, False — не начался за start_timeout, не завершился
+        за timeout или завершился ошибкой
+        """
+        request_id = None
+        deadline = time.monotonic() + start_timeout
+        while True:
+            event = self.tab.wait_for_event(events, timeout=max(0, deadline - time.monotonic()))
+            if event is None:
+                return False
+            method, params = event
+            if request_id is None:
+                if method == "Network.requestWillBeSent" and match(params):
+                    request_id = params["requestId"]
+                    deadline = time.monotonic() + timeout
+                continue
+            if params.get("requestId") != request_id or method == "Network.requestWillBeSent":
+                continue
+            if method == "Network.loadingFailed":
+                print(f"Запрос {params.get('requestId')} завершился ошибкой: {params.get('errorText')}")
+                return False
+            return True
+
+    def _close_modal(self):
+        try:
+            if self._click([".modal .close", ".modal .btn-close"], ["CLOSE"]):
+                print("Модальное окно закрыто кнопкой")
+                if self._wait_for([MODAL], 3, gone=True):
+                    return
+            self.tab.evaluate("""
+                document.querySelectorAll('.modal').forEach(modal => {
+                    modal.style.display = 'none';
+                    modal.classList.remove('show');
+                    modal.setAttribute('aria-hidden', 'true');
+                });
+                document.body.classList.remove('modal-open');
+                document.querySelectorAll('.modal-backdrop').forEach(backdrop => backdrop.remove());
+            """)
+            print("Принудительное закрытие модального окна через JavaScript")
+        except Exception as e:
+            print(f"Ошибка при закрытии модального окна: {e}")
+
+    def enter_text(self, text):
+        """
+        Вводит текст как пользователь (Input.insertText): эмодзи без буфера обмена,
+        переводы строк — нажатием Enter. Текст вставляется как есть, без разбора HTML
+        (так же, как в пути selenium)
+        """
+        print("Ожидание загрузки текстового поля...")
+        if not self._wait_for([TEXTBOX], 30):
+            raise TimeoutError("Текстовое поле не появилось")
+        self._focus([TEXTBOX])
+        for index, line in enumerate(text.split("\n")):
+            if index:
+                self._press_enter()
+            if line:
+                self.tab.send("Input.insertText", {"text": line})
+        print("Текст введен через CDP")
+
+    def upload_image(self, image_path):
+        abs_path = os.path.abspath(image_path)
+        print(f"Загружаем изображение из кэша через CDP: {abs_path}")
+        chooser = self.tab.subscribe("Page.fileChooserOpened")
+        uploads = self.tab.subscribe(*NETWORK_EVENTS)
+        try:
+            # Диалог выбора файла не открывается: браузер отдаёт его инпут в событии
+            self.tab.send("Page.setInterceptFileChooserDialog", {"enabled": True})
+            opened = None
+            if self._click(ATTACH_BUTTONS):
+                opened = self.tab.wait_for_event(chooser, timeout=REQUEST_START_TIMEOUT)
+            if opened:
+                self.tab.send("DOM.setFileInputFiles", {"files": [abs_path], "backendNodeId": opened[1]["backendNodeId"]})
+            else:
+                root = self.tab.send("DOM.getDocument", {"depth": 0})["root"]["nodeId"]
+                node = self.tab.send("DOM.querySelector", {"nodeId": root, "selector": "input[type='file']"})["nodeId"]
+                if not node:
+                    print("Инпут для файла не найден")
+                    return False
+                self.tab.send("DOM.setFileInputFiles", {"files": [abs_path], "nodeId": node})
+            print("Файл передан в инпут, ждём окончания загрузки")
+            if not self._wait_for_request(uploads, self._is_upload, REQUEST_START_TIMEOUT, UPLOAD_TIMEOUT):
+                print("Загрузка изображения не началась или не завершилась")
+                return False
+            return True
+        except Exception as e:
+            print(f"Ошибка при загрузке изображения через CDP: {e}")
+            return False
+        finally:
+            self.tab.unsubscribe(chooser)
+            self.tab.unsubscribe(uploads)
+            try:
+                self.tab.send("Page.setInterceptFileChooserDialog", {"enabled": False})
+            except Exception:
+                pass
+
+    def tag_model(self, model_tag):
+        try:
+            if not self._click([TAG_BUTTON]):
+                print("Кнопка отметки модели не найдена")
+                return False
+            if not self._wait_for([MODAL], 10):
+                print("Модальное окно отметки модели не открылось")
+                return False
+            self._click(TAG_SEARCH_BUTTONS)
+            if not self._wait_for(TAG_SEARCH_INPUTS, 10):
+                print("Не удалось найти поле ввода после нажатия кнопки")
+                self._close_modal()
+                return False
+            self._focus(TAG_SEARCH_INPUTS)
+            search_tag = model_tag.replace('@', '')
+            searching = self.tab.subscribe(*NETWORK_EVENTS)
+            try:
+                self.tab.send("Input.insertText", {"text": search_tag})
+                self._press_enter()
+                print(f"Введен запрос для поиска: {search_tag}")
+                # Запрос поиска — тот, в адресе которого есть искомый тег
+                searched = self._wait_for_request(
+                    searching, lambda params: search_tag.lower() in params.get("request", {}).get("url", "").lower(),
+                    REQUEST_START_TIMEOUT, 15
+                )
+            finally:
+                self.tab.unsubscribe(searching)
+            if not self._wait_for(TAG_RESULTS, 10):
+                print("Не найдены ни чекбоксы, ни строки с моделями")
+                self._close_modal()
+                # Модели нет, только если запрос поиска прошёл; иначе это сбой страницы
+                if searched:
+                    raise TagNotFound(f"Поиск не нашёл модель {model_tag}")
+                return False
+            self._click(TAG_RESULTS)
+            if not self._click(TAG_ADD_BUTTONS, ["ADD", "Add"]):
+                print("Кнопка ADD не найдена")
+            if not self._wait_for([MODAL], 5, gone=True):
+                print("Модальное окно все еще открыто, пытаемся закрыть его")
+                self._close_modal()
+            return True
+        except TagNotFound:
+            raise
+        except Exception as e:
+            print(f"Общая ошибка при отметке модели через CDP: {e}")
+            self._close_modal()
+            return False
+
+    def set_expiration(self):
+        try:
+            if not self._click(EXPIRATION_BUTTONS):
+                print("Не удалось найти кнопку срока действия")
+                return False
+            if not self._wait_for([MODAL], 10):
+                print("Окно срока действия не открылось")
+                return False
+            if not self._click(EXPIRATION_TABS):
+                print("Не удалось найти вторую вкладку")
+            if not self._click(EXPIRATION_APPLY_BUTTONS, ["Apply", "Save", "Update", "OK"]):
+                print("Не удалось найти кнопку применения")
+            if not self._wait_for([MODAL], 5, gone=True):
+                print("Модальное окно всё ещё открыто, пытаемся закрыть его")
+                self._close_modal()
+            return True
+        except Exception as e:
+            print(f"Ошибка при установке срока действия поста через CDP: {e}")
+            self._close_modal()
+            return False
+
+    def _left_composer(self, event):
+        method, params = event
+        if method == "Page.frameNavigated":
+            frame = params.get("frame", {})
+            return "parentId" not in frame and "posts/create" not in frame.get("url", "")
+        return params.get("frameId") == self.tab.target_id and "posts/create" not in params.get("url", "")
+
+    def submit(self, timeout=30):
+        enabled_button = SUBMIT_BUTTON + ":not(.m-disabled):not([disabled])"
+        navigations = self.tab.subscribe("Page.frameNavigated", "Page.navigatedWithinDocument")
+        try:
+            if not self._wait_for([enabled_button], 30):
+                print("Кнопка отправки не стала активной за 30 сек.")
+            clicked = self._click([enabled_button, SUBMIT_BUTTON])
+            if not clicked:
+                print("Кнопка отправки не найдена, пробуем кнопку с текстом Post")
+                clicked = self.tab.call("""(texts) => {
+                    const button = (%s)([], texts);
+                    if (!button) return false;
+                    button.removeAttribute('disabled');
+                    button.classList.remove('m-disabled');
+                    button.click();
+                    return true;
+                }""" % FIND_JS, ["Post"])
+            if not clicked:
+                return False, None
+            print("Кнопка отправки нажата через CDP, ожидаем перехода со страницы...")
+            event = self.tab.wait_for_event(navigations, self._left_composer, timeout)
+        finally:
+            self.tab.unsubscribe(navigations)
+        if event is None:
+            return True, None
+        method, params = event
+        return True, params["frame"]["url"] if method == "Page.frameNavigated" else params["url"]
+
+    def close(self):
+        self.tab.close()
+
+
+def open_cdp_steps(driver):
+    """
+    Шаги редактора по CDP во вкладке драйвера
+    """
+    from cdp_client import open_driver_tab
+    return CdpPostSteps(open_driver_tab(driver))
+
+
+def _ensure_backend_stats_table(conn):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS post_backend_stats ("
+        "ts REAL NOT NULL, backend TEXT NOT NULL, duration REAL, ok INTEGER NOT NULL)"
+    )
+
+
+def record_editor_run(backend, duration, ok):
+    """
+    Запоминает, сколько заняли шаги редактора (от ввода текста до перехода после отправки)
+    """
+    conn = connect()
+    try:
+        _ensure_backend_stats_table(conn)
+        conn.execute(
+            "INSERT INTO post_backend_stats (ts, backend, duration, ok) VALUES (?, ?, ?, ?)",
+            (time.time(), backend, duration, int(bool(ok)))
+        )
+    finally:
+        conn.close()
+
+
+def backend_comparison():
+    """
+    Сравнение бэкендов по последним постам: словарь {backend: {duration, success, samples}}
+    (duration — среднее по удачным постам, success — доля удачных) или None,
+    если одного из бэкендов ещё нет
+    """
+    conn = connect()
+    try:
+        _ensure_backend_stats_table(conn)
+        comparison = {}
+        for backend in POST_BACKENDS:
+            row = conn.execute(
+                "SELECT AVG(CASE WHEN ok THEN duration END) AS duration, AVG(ok) AS success, "
+                "COUNT(*) AS samples FROM ("
+                "SELECT duration, ok FROM post_backend_stats WHERE backend = ? ORDER BY ts DESC LIMIT ?)",
+                (backend, STATS_WINDOW)
+            ).fetchone()
+            if not row["samples"]:
+                return None
+            comparison[backend] = {"duration": row["duration"], "success": row["success"], "samples": row["samples"]}
+    finally:
+        conn.close()
+    return comparison
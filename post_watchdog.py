@@ -0,0 +1,118 @@
+# post_watchdog.py
+import os
+import time
+import threading
+
+from events import POST_STEPS
+
+# Максимальная длительность каждого шага публикации в секундах.
+# "idle" — сколько можно молчать между шагами. Переопределяется через
+# STEP_TIMEOUTS="launch=120,upload=180"
+DEFAULT_STEP_TIMEOUTS = {
+    "admission": 3600,
+    "catalog": 60,
+    "launch": 120,
+    "page_load": 90,
+    "text": 60,
+    "upload": 120,
+    "tag": 90,
+    "expiration": 90,
+    "submit": 120,
+    "link": 60,
+    "idle": 60,
+}
+
+
+def load_step_timeouts():
+    timeouts = dict(DEFAULT_STEP_TIMEOUTS)
+    for item in os.getenv("STEP_TIMEOUTS", "").split(","):
+        if "=" not in item:
+            continue
+        step, value = item.split("=", 1)
+        step = step.strip()
+        if step not in POST_STEPS and step != "idle":
+            raise ValueError(f"Неизвестный шаг в STEP_TIMEOUTS: {step}")
+        timeouts[step] = float(value)
+    return timeouts
+
+
+def hang_events(step, timeout):
+    """
+    События, которыми сторожевой таймер завершает зависшую публикацию
+    """
+    message = f"Шаг {step} не завершился за {timeout:.0f} сек."
+    return [
+        {"event": "error", "ts": time.time(), "step": step, "error_type": "StepTimeout",
+         "error_class": "transient", "message": message},
+        {"event": "hung", "ts": time.time(), "step": step, "timeout": timeout},
+        {"event": "finished", "ts": time.time(), "ok": False},
+    ]
+
+
+class PostWatchdog:
+    """
+    Следит за потоком событий публикации и срабатывает, если один из идущих шагов
+    (или пауза между шагами) превысил свой дедлайн. Шаги могут идти параллельно,
+    у каждого свой дедлайн. on_hang вызывается один раз из потока сторожа с именем зависшего шага.
+    """
+    def __init__(self, on_hang=None, timeouts=None):
+        self.timeouts = timeouts or load_step_timeouts()
+        self.on_hang = on_hang
+        self.lock = threading.Lock()
+        # Идущие шаги: шаг -> дедлайн (monotonic)
+        self.active = {}
+        self.idle_deadline = time.monotonic() + self.timeouts["idle"]
+        self.hung_step = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._watch, daemon=True, name="post-watchdog")
+
+    def start(self):
+        # Отсчёт паузы начинается с запуска сторожа, а не с его создания
+        with self.lock:
+            self.idle_deadline = time.monotonic() + self.timeouts["idle"]
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    @property
+    def hung_timeout(self):
+        return self.timeouts.get(self.hung_step, self.timeouts["idle"])
+
+    def observe(self, event):
+        kind = event.get("event")
+        now = time.monotonic()
+        with self.lock:
+            if kind == "step_started":
+                step = event.get("step")
+                self.active[step] = now + self.timeouts.get(step, self.timeouts["idle"])
+            elif kind == "step_finished":
+                self.active.pop(event.get("step"), None)
+                self.idle_deadline = now + self.timeouts["idle"]
+            elif kind == "finished":
+                self.stopped.set()
+            elif not self.active:
+                self.idle_deadline = now + self.timeouts["idle"]
+
+    def _expired_step(self):
+        now = time.monotonic()
+        with self.lock:
+            if not self.active:
+                return "idle" if now > self.idle_deadline else None
+            step, deadline = min(self.active.items(), key=lambda item: item[1])
+            return step if now > deadline else None
+
+    def _watch(self):
+        while not self.stopped.wait(1):
+            step = self._expired_step()
+            if step:
+                self.hung_step = step
+                self.stopped.set()
+                print(f"⏰ Сторожевой таймер: шаг {step} завис (лимит {self.hung_timeout:.0f} сек.)")
+                if self.on_hang:
+                    try:
+                        self.on_hang(step)
+                    except Exception as e:
+                        print(f"Ошибка при обработке зависания: {e}")
+                return
@@ -0,0 +1,92 @@
+# prefetch.py
+import os
+import time
+import threading
+
+from rotation import next_model
+from image_prep import get_upload_image
+from adspower import browser_status
+
+
+def prepare_post(onlyfans_tag, catalog, profile_id=None):
+    """
+    Готовит всё для следующего поста тега, кроме работы с браузером: модель по ротации,
+    текст, картинку в локальном кэше и статус профиля AdsPower. Возвращает словарь
+    (его можно передать в воркер или дочерний процесс) или None, если готовить не из чего.
+    """
+    models = (catalog or {}).get("models") or []
+    if not models:
+        return None
+    model = next_model(onlyfans_tag, models)
+    prepared = {
+        "model": model,
+        "image_path": get_upload_image(model["image_url"]) if model.get("image_url") else None,
+        "profile_status": None,
+        "prepared_at": time.time(),
+    }
+    if profile_id:
+        try:
+            prepared["profile_status"] = browser_status(profile_id)
+        except Exception as e:
+            print(f"Не удалось проверить статус профиля {profile_id}: {e}")
+    return prepared
+
+
+def is_prepared_valid(prepared, models):
+    """
+    Подготовка годится, если модель всё ещё есть в списке и картинка на месте
+    """
+    if not prepared:
+        return False
+    model_tag = prepared["model"].get("onlyfans_tag")
+    if not any(model.get("onlyfans_tag") == model_tag for model in models):
+        return False
+    image_path = prepared.get("image_path")
+    return not image_path or os.path.exists(image_path)
+
+
+class Prefetcher:
+    """
+    Готовит следующий пост каждого тега в фоне, пока планировщик ждёт слот
+    """
+    def __init__(self, log=print):
+        self.log = log
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def schedule(self, onlyfans_tag, catalog, profile_id=None):
+        """
+        Запускает подготовку следующего поста тега в фоновом потоке
+        """
+        result = {"prepared": None, "done": threading.Event()}
+
+        def run():
+            try:
+                result["prepared"] = prepare_post(onlyfans_tag, catalog, profile_id)
+                prepared = result["prepared"]
+                if prepared:
+                    self.log(f"📦 {onlyfans_tag}: следующий пост подготовлен — {prepared['model']['onlyfans_tag']}"
+                             f"{', картинка в кэше' if prepared['image_path'] else ''}"
+                             f"{', профиль ' + prepared['profile_status'] if prepared['profile_status'] else ''}")
+            except Exception as e:
+                self.log(f"⚠️ {onlyfans_tag}: не удалось подготовить следующий пост: {e}")
+            finally:
+                result["done"].set()
+
+        with self.lock:
+            self.pending[onlyfans_tag] = result
+        threading.Thread(target=run, daemon=True, name=f"prefetch-{onlyfans_tag}").start()
+
+    def take(self, onlyfans_tag, catalog, timeout=0):
+        """
+        Забирает подготовленный пост тега. Если подготовка не успела или устарела
+        (модель пропала из списка), возвращает None — пост подготовится на месте.
+        """
+        with self.lock:
+            result = self.pending.pop(onlyfans_tag, None)
+        if result is None or not result["done"].wait(timeout):
+            return None
+        prepared = result["prepared"]
+        if not is_prepared_valid(prepared, (catalog or {}).get("models") or []):
+            return None
+        return prepared
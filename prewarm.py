@@ -0,0 +1,204 @@
+# prewarm.py
+import os
+import time
+import atexit
+import threading
+
+from adspower import stop_browser
+from admission import BrowserAdmission, AdmissionTimeout, handoff_pending, reclaim_handoff
+from leases import ProfileLease, ProfileBusy
+
+COMPOSER_URL = "https://onlyfans.com/posts/create"
+# За сколько секунд до слота запускать браузер профиля (0 — не прогревать)
+DEFAULT_PREWARM_LEAD = 45
+# Сколько прогретых браузеров может ждать своих слотов одновременно
+DEFAULT_PREWARM_MAX_BROWSERS = 1
+# Сколько прогретый браузер ждёт пост после дедлайна, прежде чем его закрыть
+DEFAULT_PREWARM_GRACE = 120
+POLL_INTERVAL = 0.5
+# Сколько ждать, пока публикация заберёт переданный ей слот браузера
+HANDOFF_WAIT = 60
+
+
+class WarmPlan:
+    """
+    Прогрев браузера одного тега к дедлайну его следующего слота
+    """
+    def __init__(self, onlyfans_tag, profile_id, deadline):
+        self.onlyfans_tag = onlyfans_tag
+        self.profile_id = profile_id
+        self.deadline = deadline
+        self.cancelled = threading.Event()
+        self.warm = False
+        self.thread = None
+
+
+class Prewarmer:
+    """
+    Заранее запускает браузер профиля, который публикует следующим, и открывает в нём
+    страницу создания поста. Прогретый браузер держит аренду профиля и слот браузера,
+    пока публикация этого профиля не попросит профиль: тогда аренда отпускается, а слот
+    передаётся публикации (см. BrowserAdmission.hand_off), и она подключается к уже открытому
+    браузеру (AdsPower отдаёт его как активный) без очереди за слотом.
+    Отменённый или не дождавшийся поста прогрев закрывает браузер.
+    """
+    def __init__(self, lead=None, max_browsers=None, grace=None, log=print):
+        self.lead = lead if lead is not None else float(os.getenv("PREWARM_LEAD", DEFAULT_PREWARM_LEAD))
+        self.max_browsers = max_browsers or int(os.getenv("PREWARM_MAX_BROWSERS", DEFAULT_PREWARM_MAX_BROWSERS))
+        self.grace = grace if grace is not None else float(os.getenv("PREWARM_GRACE", DEFAULT_PREWARM_GRACE))
+        self.log = log
+        self.lock = threading.Lock()
+        self.plans = {}
+        atexit.register(self.cancel_all)
+
+    @property
+    def enabled(self):
+        return self.lead > 0
+
+    def schedule(self, onlyfans_tag, profile_id, deadline):
+        """
+        Планирует прогрев к дедлайну (unix-время) следующего слота тега.
+        Прежний план тега отменяется
+        """
+        if not self.enabled or not profile_id or not deadline:
+            return
+        plan = WarmPlan(onlyfans_tag, profile_id, deadline)
+        with self.lock:
+            previous = self.plans.get(onlyfans_tag)
+            self.plans[onlyfans_tag] = plan
+        if previous is not None:
+            previous.cancelled.set()
+        plan.thread = threading.Thread(target=self._run, args=(plan,), daemon=True, name=f"prewarm-{onlyfans_tag}")
+        plan.thread.start()
+
+    def cancel(self, onlyfans_tag):
+        with self.lock:
+            plan = self.plans.pop(onlyfans_tag, None)
+        if plan is not None:
+            plan.cancelled.set()
+
+    def cancel_all(self, timeout=15):
+        """
+        Отменяет все прогревы и ждёт (не дольше timeout секунд), пока прогретые браузеры закроются
+        """
+        with self.lock:
+            plans = list(self.plans.values())
+            self.plans.clear()
+        for plan in plans:
+            plan.cancelled.set()
+        deadline = time.monotonic() + timeout
+        for plan in plans:
+            if plan.warm and plan.thread is not None:
+                plan.thread.join(max(0, deadline - time.monotonic()))
+
+    def _reserve(self, plan):
+        """
+        Занимает место среди прогретых браузеров. False, если мест нет
+        """
+        with self.lock:
+            if sum(1 for other in self.plans.values() if other.warm) >= self.max_browsers:
+                return False
+            plan.warm = True
+            return True
+
+    def _forget(self, plan):
+        with self.lock:
+            if self.plans.get(plan.onlyfans_tag) is plan:
+                del self.plans[plan.onlyfans_tag]
+
+    def _run(self, plan):
+        try:
+            if plan.cancelled.wait(max(0, plan.deadline - self.lead - time.time())):
+                return
+            if not self._reserve(plan):
+                self.log(f"🔥 {plan.onlyfans_tag}: прогрев пропущен, уже прогрето {self.max_browsers} браузеров")
+                return
+            self._warm(plan)
+        except Exception as e:
+            self.log(f"⚠️ {plan.onlyfans_tag}: ошибка прогрева браузера: {e}")
+        finally:
+            self._forget(plan)
+
+    def _warm(self, plan):
+        # Профиль занят (например, браузер уже открыт в пуле) — прогревать нечего
+        lease = ProfileLease(plan.profile_id, owner=f"prewarm {plan.onlyfans_tag}", timeout=0,
+                             log=lambda message: None, announce=False)
+        try:
+            lease.acquire()
+        except ProfileBusy:
+            plan.warm = False
+            return
+        admission = BrowserAdmission(plan.profile_id, plan.deadline, timeout=0, log=lambda message: None)
+        try:
+            admission.acquire()
+        except AdmissionTimeout:
+            lease.release()
+            plan.warm = False
+            self.log(f"🔥 {plan.onlyfans_tag}: прогрев пропущен, нет свободного слота браузера")
+            return
+        handed_off = False
+        try:
+            started_at = time.monotonic()
+            self._open_composer(plan.profile_id)
+            self.log(f"🔥 {plan.onlyfans_tag}: браузер профиля {plan.profile_id} прогрет "
+                     f"за {time.monotonic() - started_at:.0f} сек., до слота {plan.deadline - time.time():.0f} сек.")
+            while not plan.cancelled.wait(POLL_INTERVAL):
+                if lease.contended():
+                    # Публикация профиля ждёт аренду: отдаём ей профиль и слот вместе с открытым браузером
+                    self.log(f"🔥 {plan.onlyfans_tag}: прогретый браузер передан публикации")
+                    admission.hand_off()
+                    handed_off = True
+                    break
+                if time.time() > plan.deadline + self.grace:
+                    self.log(f"🔥 {plan.onlyfans_tag}: пост так и не начался, закрываем прогретый браузер")
+                    break
+        finally:
+            if not handed_off:
+                self._teardown(plan)
+            admission.release()
+            lease.release()
+        if handed_off:
+            self._await_adoption(plan)
+
+    def _await_adoption(self, plan):
+        """
+        Ждёт, пока публикация заберёт переданный слот. Если не забрала, слот снимается
+        и браузер закрывается (под арендой профиля, чтобы не закрыть браузер идущей публикации)
+        """
+        deadline = time.monotonic() + HANDOFF_WAIT
+        while time.monotonic() < deadline and not plan.cancelled.is_set():
+            if not handoff_pending(plan.profile_id):
+                return
+            plan.cancelled.wait(POLL_INTERVAL)
+        lease = ProfileLease(plan.profile_id, owner=f"prewarm {plan.onlyfans_tag}", timeout=0,
+                             log=lambda message: None, announce=False)
+        try:
+            lease.acquire()
+        except ProfileBusy:
+            # Профиль уже у публикации: она заберёт слот сразу после аренды
+            return
+        try:
+            if reclaim_handoff(plan.profile_id):
+                self.log(f"🔥 {plan.onlyfans_tag}: публикация не забрала прогретый браузер, закрываем его")
+                self._teardown(plan)
+        finally:
+            lease.release()
+
+    def _open_composer(self, profile_id):
+        """
+        Запускает браузер профиля и открывает страницу создания поста. Драйвер отключается,
+        браузер остаётся открытым в AdsPower
+        """
+        from createpost import launch_browser_with_adspower
+        driver = launch_browser_with_adspower(profile_id)
+        try:
+            driver.get(COMPOSER_URL)
+        finally:
+            # Драйвер подключён к чужому браузеру: quit останавливает chromedriver, а не браузер
+            driver.quit()
+
+    def _teardown(self, plan):
+        try:
+            stop_browser(plan.profile_id)
+        except Exception as e:
+            self.log(f"⚠️ {plan.onlyfans_tag}: не удалось закрыть прогретый браузер: {e}")
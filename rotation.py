@@ -0,0 +1,161 @@
+# rotation.py
+import time
+from datetime import datetime, timedelta
+
+from state import connect
+
+# Длина цикла ротации: за сутки каждая модель тега должна получить ровно один пост
+ROTATION_CYCLE_SECONDS = 24 * 60 * 60
+
+
+def _ensure_rotation_table(conn):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS rotation ("
+        "tag TEXT NOT NULL, "
+        "model TEXT NOT NULL, "
+        "deficit REAL NOT NULL DEFAULT 0, "
+        "posts INTEGER NOT NULL DEFAULT 0, "
+        "last_posted_at REAL, "
+        "PRIMARY KEY (tag, model))"
+    )
+
+
+def load_post_history(onlyfans_tag):
+    """
+    Возвращает {тег модели: unix-время последнего поста} за текущий цикл из MongoDB
+    (документы, сохранённые save_post_link)
+    """
+    from db import get_collection
+    since = datetime.utcnow() - timedelta(seconds=ROTATION_CYCLE_SECONDS)
+    history = {}
+    try:
+        cursor = get_collection().find(
+            {"onlyfans_tag": onlyfans_tag, "created_at": {"$gte": since}},
+            {"model_tag": 1, "created_at": 1}
+        )
+        for document in cursor:
+            model_tag = document.get("model_tag")
+            if not model_tag:
+                continue
+            posted_at = (document["created_at"] - datetime(1970, 1, 1)).total_seconds()
+            history[model_tag] = max(history.get(model_tag, 0), posted_at)
+    except Exception as e:
+        print(f"Не удалось загрузить историю постов из MongoDB: {e}")
+    return history
+
+
+def _sync_models(conn, onlyfans_tag, model_tags, history=None):
+    """
+    Приводит таблицу ротации к актуальному списку моделей. Новый тег засевается
+    историей из MongoDB (history, загружается заранее, вне транзакции):
+    модели, уже получившие пост в этом цикле, ждут следующего.
+    """
+    rows = {
+        row["model"]: row
+        for row in conn.execute("SELECT * FROM rotation WHERE tag = ?", (onlyfans_tag,))
+    }
+    history = (history or {}) if not rows else {}
+    for model_tag in model_tags:
+        if model_tag in rows:
+            continue
+        # Новая модель входит в текущий раунд
+        posted_at = history.get(model_tag)
+        conn.execute(
+            "INSERT INTO rotation (tag, model, deficit, last_posted_at) VALUES (?, ?, ?, ?)",
+            (onlyfans_tag, model_tag, 0.0 if posted_at else 1.0, posted_at)
+        )
+    removed = set(rows) - set(model_tags)
+    for model_tag in removed:
+        conn.execute("DELETE FROM rotation WHERE tag = ? AND model = ?", (onlyfans_tag, model_tag))
+
+
+def next_model(onlyfans_tag, models):
+    """
+    Выбирает модель для следующего поста тега по дефицитному раунд-робину.
+    Каждый раунд все модели получают квант 1; пост тратит квант, поэтому за раунд
+    каждая модель публикуется ровно один раз. При равенстве первой идёт модель,
+    дольше всех ждавшая поста. Состояние хранится в базе планировщика и переживает перезапуск.
+    """
+    # Каталог может повторять модель: в ротации у неё одна строка (PRIMARY KEY (tag, model))
+    model_tags = list(dict.fromkeys(model["onlyfans_tag"] for model in models))
+    conn = connect()
+    try:
+        _ensure_rotation_table(conn)
+        # История из MongoDB нужна только новому тегу. Она грузится до транзакции:
+        # запрос к MongoDB может идти десятки секунд, а база состояния общая для всех процессов
+        known = conn.execute("SELECT 1 FROM rotation WHERE tag = ? LIMIT 1", (onlyfans_tag,)).fetchone()
+        history = None if known else load_post_history(onlyfans_tag)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _sync_models(conn, onlyfans_tag, model_tags, history)
+            rows = conn.execute(
+                "SELECT model, deficit, last_posted_at FROM rotation WHERE tag = ?", (onlyfans_tag,)
+            ).fetchall()
+            if all(row["deficit"] < 1 for row in rows):
+                # Раунд завершён: все модели получили свой пост
+                conn.execute("UPDATE rotation SET deficit = deficit + 1 WHERE tag = ?", (onlyfans_tag,))
+                rows = conn.execute(
+                    "SELECT model, deficit, last_posted_at FROM rotation WHERE tag = ?", (onlyfans_tag,)
+                ).fetchall()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+    # Позиция первого вхождения модели в каталоге: по ней же берётся словарь модели
+    order = {}
+    for position, model in enumerate(models):
+        order.setdefault(model["onlyfans_tag"], position)
+    best = min(
+        rows,
+        key=lambda row: (-row["deficit"], row["last_posted_at"] or 0, order[row["model"]])
+    )
+    return models[order[best["model"]]]
+
+
+def record_post(onlyfans_tag, model_tag):
+    """
+    Списывает квант модели после успешной публикации. Неудачный пост квант не тратит,
+    и модель остаётся первой в очереди.
+    """
+    conn = connect()
+    try:
+        _ensure_rotation_table(conn)
+        conn.execute(
+            "UPDATE rotation SET deficit = deficit - 1, posts = posts + 1, last_posted_at = ? "
+            "WHERE tag = ? AND model = ?",
+            (time.time(), onlyfans_tag, model_tag)
+        )
+    finally:
+        conn.close()
+
+
+def skip_model(onlyfans_tag, model_tag):
+    """
+    Пропускает модель до следующего раунда (ошибка в её данных): квант списывается,
+    но пост не засчитывается
+    """
+    conn = connect()
+    try:
+        _ensure_rotation_table(conn)
+        conn.execute(
+            "UPDATE rotation SET deficit = deficit - 1 WHERE tag = ? AND model = ? AND deficit >= 1",
+            (onlyfans_tag, model_tag)
+        )
+    finally:
+        conn.close()
+
+
+def rotation_status(onlyfans_tag):
+    """
+    Возвращает (осталось моделей в раунде, всего моделей) для вывода прогресса
+    """
+    conn = connect()
+    try:
+        _ensure_rotation_table(conn)
+        rows = conn.execute("SELECT deficit FROM rotation WHERE tag = ?", (onlyfans_tag,)).fetchall()
+    finally:
+        conn.close()
+    return sum(1 for row in rows if row["deficit"] >= 1), len(rows)
@@ -0,0 +1,201 @@
+# schedule.py
+import os
+import math
+import time
+
+# Политики для слотов, пропущенных из-за долгих постов или простоя:
+#   run_now  — выполнить пропущенные слоты сразу, один за другим
+#   compress — равномерно распределить оставшиеся слоты до конца 24-часовой сетки
+#   skip     — пропустить просроченные слоты и продолжить с текущего
+OVERRUN_POLICIES = ("run_now", "compress", "skip")
+DEFAULT_OVERRUN_POLICY = "compress"
+
+
+def calculate_post_interval(total_models):
+    """
+    Рассчитывает интервал между постами для равномерного распределения на 24 часа
+    """
+    hours_24_in_seconds = 24 * 60 * 60
+    interval_seconds = math.ceil(hours_24_in_seconds / total_models)
+    return interval_seconds
+
+
+class Slot:
+    """
+    Слот публикации, выданный планировщиком
+    """
+    def __init__(self, index, deadline, lateness, skipped):
+        self.index = index
+        self.deadline = deadline
+        self.lateness = lateness
+        self.skipped = skipped
+
+
+class PostSchedule:
+    """
+    Сетка слотов публикаций на 24 часа с абсолютными дедлайнами.
+    Все дедлайны считаются по монотонным часам от начала сетки, поэтому длительность
+    поста и ожидания в Selenium не сдвигают следующие слоты. В базу состояния
+    дедлайны пишутся как unix-время.
+    """
+    def __init__(self, interval, total_slots, policy=None):
+        self.interval = interval
+        self.total_slots = max(1, total_slots)
+        self.policy = policy or os.getenv("OVERRUN_POLICY", DEFAULT_OVERRUN_POLICY)
+        if self.policy not in OVERRUN_POLICIES:
+            raise ValueError(f"Неизвестная политика OVERRUN_POLICY: {self.policy}. Допустимо: {', '.join(OVERRUN_POLICIES)}")
+        # Смещение между unix-временем и монотонными часами фиксируется один раз на процесс
+        self.clock_offset = time.time() - time.monotonic()
+        now = time.monotonic()
+        self.grid_start = now
+        self.anchor = now
+        self.anchor_index = 0
+        self.step = interval
+        self.slot_index = 0
+        self.slots_taken = 0
+        self.slots_skipped = 0
+        self.lateness_total = 0.0
+        self.lateness_max = 0.0
+
+    @property
+    def grid_length(self):
+        return self.total_slots * self.interval
+
+    @property
+    def grid_end(self):
+        return self.grid_start + self.grid_length
+
+    def to_wall(self, monotonic_time):
+        return monotonic_time + self.clock_offset
+
+    def from_wall(self, wall_time):
+        return wall_time - self.clock_offset
+
+    def deadline(self, index):
+        return self.anchor + (index - self.anchor_index) * self.step
+
+    def _start_grid(self, grid_start):
+        self.grid_start = grid_start
+        self.anchor = grid_start
+        self.anchor_index = 0
+        self.step = self.interval
+        self.slot_index = 0
+
+    def _roll_grid(self):
+        # Все слоты текущей сетки выданы — следующая сетка начинается ровно там, где кончилась эта
+        if self.slot_index >= self.total_slots:
+            self._start_grid(self.grid_end)
+
+    def next_deadline(self):
+        """
+        Дедлайн следующего слота по монотонным часам
+        """
+        self._roll_grid()
+        return self.deadline(self.slot_index)
+
+    def next_deadline_wall(self):
+        return self.to_wall(self.next_deadline())
+
+    def seconds_until_next(self):
+        return self.next_deadline() - time.monotonic()
+
+    def take_slot(self):
+        """
+        Выдаёт слот, который пора публиковать, применяя политику к просроченным слотам
+        """
+        now = time.monotonic()
+        self._roll_grid()
+        skipped = 0
+        if now >= self.grid_end:
+            # Простой дольше сетки: прошедшие сутки уже не наверстать
+            missed_grids = int((now - self.grid_start) // self.grid_length)
+            skipped += (self.total_slots - self.slot_index) + (missed_grids - 1) * self.total_slots
+            self._start_grid(self.grid_start + missed_grids * self.grid_length)
+
+        deadline = self.deadline(self.slot_index)
+        lateness = max(0.0, now - deadline)
+        if lateness >= self.step:
+            if self.policy == "skip":
+                missed = min(int(lateness // self.step), self.total_slots - 1 - self.slot_index)
+                self.slot_index += missed
+                skipped += missed
+                deadline = self.deadline(self.slot_index)
+                lateness = max(0.0, now - deadline)
+            elif self.policy == "compress":
+                remaining = self.total_slots - self.slot_index
+                self.anchor = now
+                self.anchor_index = self.slot_index
+                self.step = (self.grid_end - now) / remaining
+
+        slot = Slot(self.slot_index, deadline, lateness, skipped)
+        self.slot_index += 1
+        self.slots_taken += 1
+        self.slots_skipped += skipped
+        self.lateness_total += lateness
+        self.lateness_max = max(self.lateness_max, lateness)
+        return slot
+
+    def resize(self, total_slots):
+        """
+        Пересчитывает сетку под новое число моделей, не сбрасывая текущий цикл:
+        выданные слоты остаются выданными, оставшиеся равномерно распределяются
+        до конца текущих суток. Возвращает True, если сетка изменилась.
+        """
+        total_slots = max(1, total_slots)
+        if total_slots == self.total_slots:
+            return False
+        self._roll_grid()
+        now = time.monotonic()
+        next_deadline = self.deadline(self.slot_index)
+        self.total_slots = total_slots
+        self.interval = calculate_post_interval(total_slots)
+        remaining = total_slots - self.slot_index
+        if remaining <= 0:
+            # Все модели нового списка уже получили пост в этом цикле — ждём следующей сетки
+            self.slot_index = total_slots
+            return True
+        first = max(now, min(next_deadline, now + self.interval))
+        self.anchor = first
+        self.anchor_index = self.slot_index
+        if self.grid_end > first:
+            self.step = (self.grid_end - first) / remaining
+        else:
+            self.step = self.interval
+        return True
+
+    def average_lateness(self):
+        if not self.slots_taken:
+            return 0.0
+        return self.lateness_total / self.slots_taken
+
+    def to_state(self):
+        """
+        Поля для сохранения сетки в базе состояния
+        """
+        return {
+            "grid_start": self.to_wall(self.grid_start),
+            "grid_anchor": self.to_wall(self.anchor),
+            "grid_anchor_index": self.anchor_index,
+            "grid_step": self.step,
+            "grid_interval": self.interval,
+            "slot_index": self.slot_index,
+            "next_deadline": self.next_deadline_wall(),
+        }
+
+    @classmethod
+    def from_state(cls, state, interval, total_slots, policy=None):
+        """
+        Восстанавливает сетку из сохранённого состояния тега.
+        Если интервал изменился или сетки ещё нет, новая сетка начинается с сохранённого дедлайна.
+        """
+        schedule = cls(interval, total_slots, policy)
+        state = state or {}
+        if state.get("grid_start") is not None and state.get("grid_interval") == interval:
+            schedule.grid_start = schedule.from_wall(state["grid_start"])
+            schedule.anchor = schedule.from_wall(state["grid_anchor"])
+            schedule.anchor_index = state["grid_anchor_index"]
+            schedule.step = state["grid_step"]
+            schedule.slot_index = state["slot_index"]
+        elif state.get("next_deadline"):
+            schedule._start_grid(schedule.from_wall(state["next_deadline"]))
+        return schedule
@@ -52,6 +52,10 @@ def paste_text_with_emojis(driver, element, text):
         return False
 
 from createpost import launch_browser_with_adspower, tag_model
+from admission import BrowserAdmission
+from adspower import get_launch_profile
+from leases import ProfileLease
+from api import get_model_list
 
 import pyautogui
 import time
@@ -856,9 +860,7 @@ class ModelManagerApp:
 
         def fetch_models():
             try:
-                response = requests.get('https://flowvelvet.com/api/v1/model_list/', timeout=10)
-                response.raise_for_status()
-                models_data = response.json()
+                models_data = get_model_list()
 
                 # Update UI in main thread
                 self.root.after(0, self.on_models_loaded, models_data)
@@ -1098,7 +1100,13 @@ class ModelManagerApp:
     def create_post_wrapper(self, ads_id, model_tag, post_text, image_path, onlyfans_tag):
         """Wrapper for create_post with error handling and status updates"""
         driver = None
+        # Профиль арендуется, чтобы его не открыл одновременно main.py,
+        # а слот браузера берётся в общей очереди машины вместе с main.py и его воркерами
+        lease = ProfileLease(ads_id, owner=f"soft.py {onlyfans_tag}", log=self.add_status_message)
+        admission = BrowserAdmission(ads_id, log=self.add_status_message, keepalive=lease.renew)
         try:
+            lease.acquire()
+            admission.acquire()
             self.add_status_message(f"🔄 Starting post creation for {onlyfans_tag} (ads_id: {ads_id})")
             driver = self.create_post(ads_id, model_tag, post_text, image_path, onlyfans_tag)
             self.add_status_message(f"✅ Successfully created post for {onlyfans_tag}")
@@ -1113,6 +1121,8 @@ class ModelManagerApp:
                     self.add_status_message(f"✅ Browser closed for {onlyfans_tag}")
                 except Exception as e:
                     self.add_status_message(f"⚠️ Error closing browser for {onlyfans_tag}: {e}")
+            admission.release()
+            lease.release()
 
     def monitor_execution(self):
         """Monitor execution completion"""
@@ -1168,7 +1178,7 @@ class ModelManagerApp:
         from selenium.webdriver.support import expected_conditions as EC
         import time
 
-        driver = launch_browser_with_adspower(ads_id)
+        driver = launch_browser_with_adspower(ads_id, get_launch_profile("SOFT_LAUNCH_PROFILE"))
         try:
             driver.get("https://onlyfans.com/posts/create")
             wait = WebDriverWait(driver, 30)
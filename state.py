@@ -0,0 +1,138 @@
+# state.py
+import os
+import json
+import sqlite3
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "scheduler_state.db")
+
+# Колонки состояния тега; новые колонки добавляются в существующую базу автоматически
+TAG_STATE_COLUMNS = {
+    "profile_id": "TEXT",
+    "last_post_at": "REAL",
+    "next_deadline": "REAL",
+    "cycle_count": "INTEGER NOT NULL DEFAULT 0",
+    "in_flight": "TEXT",
+    "updated_at": "REAL",
+    "grid_start": "REAL",
+    "grid_anchor": "REAL",
+    "grid_anchor_index": "INTEGER",
+    "grid_step": "REAL",
+    "grid_interval": "REAL",
+    "slot_index": "INTEGER",
+    "last_lateness": "REAL",
+}
+
+
+def connect():
+    """
+    Открывает локальную базу состояния планировщика (SQLite, общий файл для всех процессов)
+    """
+    conn = sqlite3.connect(STATE_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    _ensure_tag_state_table(conn)
+    return conn
+
+
+def _ensure_tag_state_table(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS tag_state (tag TEXT PRIMARY KEY)")
+    existing = {row["name"] for row in conn.execute("PRAGMA table_info(tag_state)")}
+    for column, column_type in TAG_STATE_COLUMNS.items():
+        if column not in existing:
+            try:
+                conn.execute(f"ALTER TABLE tag_state ADD COLUMN {column} {column_type}")
+            except sqlite3.OperationalError as e:
+                # Колонку одновременно добавил другой поток или процесс
+                if "duplicate column" not in str(e):
+                    raise
+
+
+def load_tag_state(tag):
+    """
+    Возвращает сохранённое состояние тега в виде словаря или None
+    """
+    conn = connect()
+    try:
+        row = conn.execute("SELECT * FROM tag_state WHERE tag = ?", (tag,)).fetchone()
+        if row is None:
+            return None
+        state = dict(row)
+        if state.get("in_flight"):
+            state["in_flight"] = json.loads(state["in_flight"])
+        return state
+    finally:
+        conn.close()
+
+
+def save_tag_state(tag, **fields):
+    """
+    Обновляет переданные поля состояния тега (upsert)
+    """
+    unknown = set(fields) - set(TAG_STATE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Неизвестные поля состояния: {', '.join(sorted(unknown))}")
+    if "in_flight" in fields and fields["in_flight"] is not None:
+        fields["in_flight"] = json.dumps(fields["in_flight"], ensure_ascii=False)
+    fields["updated_at"] = time.time()
+    columns = ", ".join(fields)
+    placeholders = ", ".join("?" for _ in fields)
+    updates = ", ".join(f"{column} = excluded.{column}" for column in fields)
+    conn = connect()
+    try:
+        conn.execute(
+            f"INSERT INTO tag_state (tag, {columns}) VALUES (?, {placeholders}) "
+            f"ON CONFLICT(tag) DO UPDATE SET {updates}",
+            (tag, *fields.values())
+        )
+    finally:
+        conn.close()
+
+
+def resume_tag_state(tag, interval):
+    """
+    Восстанавливает состояние тега после перезапуска и возвращает его словарём (пустым для нового тега).
+    Прерванная публикация (in_flight) считается занявшей свой слот, чтобы не было дубля.
+    """
+    state = load_tag_state(tag)
+    if not state:
+        return {}
+    in_flight = state.get("in_flight")
+    if in_flight:
+        print(f"Публикация #{in_flight.get('cycle')} для {tag} была прервана, её слот считается занятым")
+        if state.get("grid_start") is None:
+            started_at = in_flight.get("started_at") or time.time()
+            state["next_deadline"] = max(state.get("next_deadline") or 0, started_at + interval)
+        state["in_flight"] = None
+        save_tag_state(tag, next_deadline=state["next_deadline"], in_flight=None)
+    return state
+
+
+def mark_slot_started(tag, profile_id, cycle_count, **schedule_fields):
+    """
+    Фиксирует начало публикации (и уже выданный слот сетки) до запуска браузера.
+    Возвращает unix-время старта.
+    """
+    started_at = time.time()
+    save_tag_state(
+        tag,
+        profile_id=profile_id,
+        cycle_count=cycle_count,
+        in_flight={"cycle": cycle_count, "profile_id": profile_id, "started_at": started_at},
+        **schedule_fields
+    )
+    return started_at
+
+
+def mark_slot_finished(tag, next_deadline, posted):
+    """
+    Фиксирует завершение публикации и дедлайн следующего слота
+    """
+    fields = {"next_deadline": next_deadline, "in_flight": None}
+    if posted:
+        fields["last_post_at"] = time.time()
+    save_tag_state(tag, **fields)
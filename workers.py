@@ -0,0 +1,346 @@
+# workers.py
+import os
+import sys
+import time
+import queue
+import threading
+import multiprocessing
+
+from events import EventEmitter
+from adspower import stop_browser
+from post_watchdog import PostWatchdog, hang_events
+from admission import release_process_slots
+from leases import release_process_leases
+
+# Режимы выполнения публикаций:
+#   process    — пул долгоживущих процессов (forkserver/spawn), падение процесса не задевает планировщик
+#   thread     — публикации в потоках самого планировщика, минимальные накладные расходы
+#   subprocess — старый режим: отдельный python createpost.py на каждый пост
+WORKER_MODES = ("process", "thread", "subprocess")
+DEFAULT_WORKER_MODE = "process"
+# Сколько пост ждёт занятый воркер, у которого в пуле открыт браузер его профиля,
+# прежде чем уйти к свободному воркеру (и запустить браузер заново)
+AFFINITY_WAIT = 30
+
+
+class WorkerCrashed(Exception):
+    """
+    Процесс-воркер завершился посреди публикации
+    """
+
+
+class JobHung(Exception):
+    """
+    Сторожевой таймер остановил зависшую публикацию
+    """
+    def __init__(self, step):
+        super().__init__(step)
+        self.step = step
+
+
+class PostJob:
+    """
+    Задание на одну публикацию для воркера
+    """
+    def __init__(self, profile_id, model_tag, log_path, catalog=None, deadline=None, prepared=None,
+                 next_deadline=None):
+        self.profile_id = profile_id
+        self.model_tag = model_tag
+        self.log_path = log_path
+        # Ответ /sfs-models/ от планировщика; без него createpost запросит список сам
+        self.catalog = catalog
+        # Unix-время слота: место публикации в общей очереди браузеров
+        self.deadline = deadline
+        # Модель и картинка, подготовленные заранее (prefetch)
+        self.prepared = prepared
+        # Unix-время следующего слота тега: по нему решается, держать ли браузер открытым
+        self.next_deadline = next_deadline
+
+
+def get_worker_mode():
+    mode = os.getenv("POST_WORKER_MODE", DEFAULT_WORKER_MODE)
+    if mode not in WORKER_MODES:
+        raise ValueError(f"Неизвестный POST_WORKER_MODE: {mode}. Допустимо: {', '.join(WORKER_MODES)}")
+    return mode
+
+
+def run_post_job(job, sink):
+    """
+    Выполняет публикацию в текущем процессе, отдавая события в sink
+    """
+    from createpost import create_post, AccountLoggedOut
+    events = EventEmitter(sink=sink)
+    try:
+        create_post(job.profile_id, job.model_tag, events, job.catalog, job.deadline, job.prepared,
+                    job.next_deadline)
+    except AccountLoggedOut:
+        # Событие logout уже отправлено из check_logged_in_or_stop
+        pass
+    except Exception as e:
+        print(f"Необработанная ошибка публикации: {e}")
+        events.error("worker", type(e).__name__, e, getattr(e, "error_class", None))
+        events.emit("finished", ok=False)
+
+
+def stop_hung_browser(profile_id):
+    """
+    Закрывает браузер зависшей публикации, чтобы освободить профиль AdsPower
+    """
+    try:
+        stop_browser(profile_id)
+    except Exception as e:
+        print(f"Не удалось закрыть браузер профиля {profile_id}: {e}")
+
+
+def release_dead_process(pid):
+    """
+    Убирает следы убитого процесса публикаций: закрывает браузеры, под которые он держал
+    слоты (в том числе браузеры пула других профилей), и освобождает слоты и аренды профилей
+    """
+    try:
+        for profile_id in release_process_slots(pid):
+            stop_hung_browser(profile_id)
+        release_process_leases(pid)
+    except Exception as e:
+        print(f"Не удалось освободить слоты браузера процесса {pid}: {e}")
+
+
+def _process_worker_main(task_queue, event_queue):
+    # Тяжёлые импорты (selenium, requests, pymongo) выполняются один раз на весь срок жизни воркера
+    import createpost  # noqa: F401
+    from browser_pool import close_browser_pool, get_browser_pool
+    stdout, stderr = sys.stdout, sys.stderr
+    while True:
+        job = task_queue.get()
+        if job is None:
+            break
+        with open(job.log_path, 'a', encoding='utf-8') as log_file:
+            sys.stdout = sys.stderr = log_file
+            try:
+                run_post_job(job, lambda payload: event_queue.put(("event", payload)))
+            finally:
+                sys.stdout, sys.stderr = stdout, stderr
+        # Планировщик отправляет следующие посты этих профилей сюда же, к их открытым браузерам
+        event_queue.put(("done", get_browser_pool().profiles()))
+    # atexit в дочернем процессе multiprocessing не вызывается: браузеры пула закрываем сами
+    close_browser_pool()
+
+
+class ProcessWorker:
+    """
+    Долгоживущий процесс, выполняющий публикации по одной
+    """
+    def __init__(self, context):
+        self.context = context
+        self.jobs_done = 0
+        # Профили, чьи браузеры остались открытыми в пуле этого воркера после последнего поста
+        self.pooled = set()
+        self.task_queue = context.Queue()
+        self.event_queue = context.Queue()
+        self.process = context.Process(
+            target=_process_worker_main, args=(self.task_queue, self.event_queue), daemon=True
+        )
+        self.process.start()
+
+    def run(self, job, on_event, watchdog=None):
+        self.task_queue.put(job)
+        while True:
+            if watchdog is not None and watchdog.hung_step:
+                raise JobHung(watchdog.hung_step)
+            try:
+                kind, payload = self.event_queue.get(timeout=1)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    raise WorkerCrashed(f"воркер {self.process.pid} завершился с кодом {self.process.exitcode}")
+                continue
+            if kind == "done":
+                self.jobs_done += 1
+                self.pooled = set(payload)
+                return
+            on_event(payload)
+
+    def stop(self):
+        try:
+            self.task_queue.put(None)
+            self.process.join(timeout=5)
+        finally:
+            if self.process.is_alive():
+                self.kill()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(timeout=5)
+        # Убитый воркер не успел закрыть свои браузеры, вернуть слоты и аренды профилей
+        release_dead_process(self.process.pid)
+
+
+class ThreadLogRouter:
+    """
+    Подменяет sys.stdout/sys.stderr: print из потока-воркера пишется в лог его публикации,
+    остальные потоки печатают как обычно
+    """
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
+
+    @property
+    def target(self):
+        return getattr(self.local, "target", None) or self.default
+
+    def write(self, data):
+        return self.target.write(data)
+
+    def flush(self):
+        return self.target.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.default, name)
+
+
+class PostWorkerPool:
+    """
+    Пул тёплых воркеров для публикаций. run() блокирует вызывающий поток до конца поста,
+    поэтому пул можно вызывать одновременно из нескольких потоков планировщика.
+    """
+    def __init__(self, mode=None, size=None, max_jobs_per_worker=None):
+        self.mode = mode or get_worker_mode()
+        self.size = size or int(os.getenv("POST_WORKERS", os.getenv("FLEET_WORKERS", "4")))
+        self.max_jobs_per_worker = max_jobs_per_worker or int(os.getenv("POST_WORKER_MAX_JOBS", "50"))
+        # Свободные воркеры, последний вернувшийся в конце
+        self.idle = []
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+        self.workers = set()
+        if self.mode == "process":
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self.context = multiprocessing.get_context(method)
+            if method == "forkserver":
+                self.context.set_forkserver_preload(["createpost"])
+        elif self.mode == "thread":
+            self.stdout_router = ThreadLogRouter(sys.stdout)
+            self.stderr_router = ThreadLogRouter(sys.stderr)
+            sys.stdout, sys.stderr = self.stdout_router, self.stderr_router
+
+    def _pick_idle(self, profile_id, affinity_expired):
+        """
+        Свободный воркер для поста профиля (под self.lock): воркер с открытым браузером
+        профиля, иначе (если такого нет или его ждали дольше AFFINITY_WAIT) свободный
+        воркер с наименьшим числом браузеров в пуле. None — ждать
+        """
+        for worker in self.idle:
+            if profile_id in worker.pooled:
+                self.idle.remove(worker)
+                return worker
+        holder_busy = any(profile_id in worker.pooled for worker in self.workers)
+        if holder_busy and not affinity_expired:
+            return None
+        if self.idle:
+            # При равенстве берётся последний вернувшийся: его процесс «теплее»
+            worker = min(reversed(self.idle), key=lambda worker: len(worker.pooled))
+            self.idle.remove(worker)
+            return worker
+        if len(self.workers) < self.size:
+            worker = ProcessWorker(self.context)
+            self.workers.add(worker)
+            return worker
+        return None
+
+    def _acquire(self, profile_id=None):
+        waited_from = time.monotonic()
+        with self.available:
+            while True:
+                worker = self._pick_idle(profile_id, time.monotonic() - waited_from > AFFINITY_WAIT)
+                if worker is not None:
+                    return worker
+                # Место в пуле может освободиться и без возврата воркера (падение, ротация)
+                self.available.wait(timeout=1)
+
+    def _release(self, worker):
+        with self.available:
+            self.idle.append(worker)
+            self.available.notify_all()
+
+    def _discard(self, worker, kill=False):
+        with self.available:
+            self.workers.discard(worker)
+            self.available.notify_all()
+        if kill:
+            worker.kill()
+        else:
+            worker.stop()
+
+    def run(self, job, on_event):
+        if self.mode == "thread":
+            # Поток нельзя убить: сторож закрывает браузер, и зависший вызов Selenium падает сам
+            watchdog = PostWatchdog(on_hang=lambda step: stop_hung_browser(job.profile_id))
+            watchdog.start()
+            try:
+                self._run_in_thread(job, watchdog, on_event)
+            finally:
+                watchdog.stop()
+            if watchdog.hung_step:
+                for event in hang_events(watchdog.hung_step, watchdog.hung_timeout):
+                    on_event(event)
+            return
+        # Сторож запускается, когда воркер уже получен: ожидание свободного воркера — не зависание
+        worker = self._acquire(job.profile_id)
+        watchdog = PostWatchdog().start()
+
+        def observe(event):
+            watchdog.observe(event)
+            on_event(event)
+
+        try:
+            worker.run(job, observe, watchdog)
+        except JobHung as e:
+            self._discard(worker, kill=True)
+            stop_hung_browser(job.profile_id)
+            for event in hang_events(e.step, watchdog.hung_timeout):
+                on_event(event)
+            return
+        except WorkerCrashed as e:
+            self._discard(worker, kill=True)
+            on_event({"event": "error", "step": "worker", "error_type": "WorkerCrashed",
+                      "error_class": "transient", "message": str(e)})
+            on_event({"event": "finished", "ok": False})
+            return
+        except BaseException:
+            self._discard(worker, kill=True)
+            raise
+        finally:
+            watchdog.stop()
+        if worker.jobs_done >= self.max_jobs_per_worker:
+            self._discard(worker)
+        else:
+            self._release(worker)
+
+    def _run_in_thread(self, job, watchdog, on_event):
+        routers = (self.stdout_router, self.stderr_router)
+
+        def sink(payload):
+            watchdog.observe(payload)
+            # Обработчик событий печатает в консоль, а не в лог публикации
+            for router in routers:
+                router.local.target = None
+            try:
+                on_event(payload)
+            finally:
+                for router in routers:
+                    router.local.target = log_file
+
+        with open(job.log_path, 'a', encoding='utf-8') as log_file:
+            for router in routers:
+                router.local.target = log_file
+            try:
+                run_post_job(job, sink)
+            finally:
+                for router in routers:
+                    router.local.target = None
+
+    def shutdown(self):
+        with self.lock:
+            workers = list(self.workers)
+            self.workers.clear()
+            self.idle.clear()
+        for worker in workers:
+            worker.stop()